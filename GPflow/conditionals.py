@@ -13,8 +13,8 @@
 # limitations under the License.
 
 
-from .tf_wraps import eye
 import tensorflow as tf
+from .linear_operators import Diagonal
 from .scoping import NameScoped
 from ._settings import settings
 
@@ -62,25 +62,34 @@ def conditional(Xnew, X, kern, f, full_cov=False, q_sqrt=None, whiten=False):
     # compute kernel stuff
     num_data = tf.shape(X)[0]
     Kmn = kern.K(X, Xnew)
-    Kmm = kern.K(X) + eye(num_data) * settings.numerics.jitter_level
-    Lm = tf.cholesky(Kmm)
-
-    # Compute the projection matrix A
-    A = tf.matrix_triangular_solve(Lm, Kmn, lower=True)
+    Kmm = kern.K_operator(X) + Diagonal(settings.numerics.jitter_level, num_data)
+
+    # Compute the projection matrix A, and the covariance due to the
+    # conditioning, Kmn^T Kmm^{-1} Kmn
+    if whiten:
+        # the whitened representation needs the Cholesky factor itself
+        Lm = tf.cholesky(Kmm.to_dense())
+        A = tf.matrix_triangular_solve(Lm, Kmn, lower=True)
+        if full_cov:
+            KnmKmmKmn = tf.matmul(A, A, transpose_a=True)
+        else:
+            KnmKmmKmn = tf.reduce_sum(tf.square(A), 0)
+    else:
+        # otherwise, solve using the structure of Kmm
+        A = Kmm.solve(Kmn)
+        if full_cov:
+            KnmKmmKmn = tf.matmul(Kmn, A, transpose_a=True)
+        else:
+            KnmKmmKmn = tf.reduce_sum(Kmn * A, 0)
 
-    # compute the covariance due to the conditioning
     if full_cov:
-        fvar = kern.K(Xnew) - tf.matmul(A, A, transpose_a=True)
+        fvar = kern.K(Xnew) - KnmKmmKmn
         shape = tf.pack([tf.shape(f)[1], 1, 1])
     else:
-        fvar = kern.Kdiag(Xnew) - tf.reduce_sum(tf.square(A), 0)
+        fvar = kern.Kdiag(Xnew) - KnmKmmKmn
         shape = tf.pack([tf.shape(f)[1], 1])
     fvar = tf.tile(tf.expand_dims(fvar, 0), shape)  # D x N x N or D x N
 
-    # another backsubstitution in the unwhitened case
-    if not whiten:
-        A = tf.matrix_triangular_solve(tf.transpose(Lm), A, lower=False)
-
     # construct the conditional mean
     fmean = tf.matmul(tf.transpose(A), f)
 
@@ -103,6 +112,45 @@ def conditional(Xnew, X, kern, f, full_cov=False, q_sqrt=None, whiten=False):
     return fmean, fvar
 
 
+@NameScoped("uncertain_conditional")
+def uncertain_conditional(Xmu, Xcov, Z, kern, alpha, B):
+    """
+    Moment match the prediction of a sparse GP at uncertain inputs
+    x ~ N(Xmu, Xcov). Given the prediction at a fixed point x,
+
+        f(x) ~ N(k_xZ alpha, k_xx - k_xZ B k_Zx),
+
+    the mean and variance of f(x) with respect to x are
+
+        E[f]   = psi1 alpha
+        Var[f] = psi0 - tr(B psi2) + alpha^T psi2 alpha - (psi1 alpha)^2
+
+    where psi0 = <k_xx>, psi1 = <k_xZ> and psi2 = <k_Zx k_xZ> are the kernel
+    expectations (see ekernels for the closed forms).
+
+     - Xmu is a data matrix, size N x D, of the means of the inputs
+     - Xcov are their covariances, size N x D x D, or N x D if diagonal
+     - Z is a matrix of inducing inputs, size M x D
+     - alpha is a matrix, size M x K, for K outputs
+     - B is a matrix, size M x M, or M x M x K for one matrix per output
+
+    Returns the means and the (marginal) variances, both of size N x K.
+    """
+    psi0 = kern.eKdiag(Xmu, Xcov)  # N
+    psi1 = kern.eKxz(Z, Xmu, Xcov)  # N x M
+    psi2 = kern.eKzxKxz(Z, Xmu, Xcov)  # N x M x M
+
+    fmean = tf.matmul(psi1, alpha)  # N x K
+    alpha_tiled = tf.tile(tf.expand_dims(alpha, 0), tf.pack([tf.shape(psi2)[0], 1, 1]))
+    second_moment = tf.reduce_sum(tf.batch_matmul(psi2, alpha_tiled) * alpha, 1)  # N x K
+    if B.get_shape().ndims == 2:
+        trace = tf.expand_dims(tf.reduce_sum(psi2 * B, [1, 2]), 1)  # N x 1
+    else:
+        trace = tf.reduce_sum(tf.expand_dims(psi2, 3) * B, [1, 2])  # N x K
+    fvar = tf.expand_dims(psi0, 1) - trace + second_moment - tf.square(fmean)
+    return fmean, fvar
+
+
 import warnings
 
 
@@ -1,7 +1,8 @@
 from functools import reduce
-import warnings
+import numpy as np
 import tensorflow as tf
-from . import kernels
+from scipy.special import comb, factorial
+from . import kernels, quadrature
 from .tf_wraps import eye
 from ._settings import settings
 
@@ -23,9 +24,27 @@ class RBF(kernels.RBF):
         Also known as phi_1: <K_{x, Z}>_{q(x)}.
         :param Z: MxD inducing inputs
         :param Xmu: X mean (NxD)
-        :param Xcov: NxDxD
+        :param Xcov: NxDxD or NxD
         :return: NxM
         """
+        return _on_diagonal(Xcov, lambda: self._eKxz_diag(Z, Xmu, Xcov), lambda: self._eKxz_full(Z, Xmu, Xcov))
+
+    def _eKxz_diag(self, Z, Xmu, Xvar):
+        """
+        psi_1 for diagonal covariances (NxD): the exponent
+        sum_d (mu_nd - z_md)^2 / (l_d^2 + Xvar_nd) is expanded into matrix
+        products, so there are no solves or determinants.
+        """
+        Z, Xmu = self._slice(Z, Xmu)
+        Xvar, _ = self._slice(Xvar, None)
+        lengthscales2 = self._lengthscales(Xmu) ** 2.0
+        a = 1. / (lengthscales2 + Xvar)  # NxD
+        q = tf.matmul(a, tf.square(Z), transpose_b=True) - 2. * tf.matmul(a * Xmu, Z, transpose_b=True) + \
+            tf.reduce_sum(a * tf.square(Xmu), 1, keep_dims=True)  # NxM
+        log_det = tf.reduce_sum(tf.log(1. + Xvar / lengthscales2), 1, keep_dims=True)  # Nx1
+        return self.variance * tf.exp(-0.5 * (q + log_det))
+
+    def _eKxz_full(self, Z, Xmu, Xcov):
         # use only active dimensions
         Xcov = self._slice_cov(Xcov)
         Z, Xmu = self._slice(Z, Xmu)
@@ -58,7 +77,6 @@ class RBF(kernels.RBF):
         ]):
             Xmu = tf.identity(Xmu)
 
-        M = tf.shape(Z)[0]
         N = tf.shape(Xmu)[0] - 1
         D = tf.shape(Xmu)[1]
         Xsigmb = tf.slice(Xcov, [0, 0, 0, 0], tf.pack([-1, N, -1, -1]))
@@ -73,17 +91,13 @@ class RBF(kernels.RBF):
             tf.expand_dims(eye(tf.shape(Xmu)[1]), 0) + tf.reshape(lengthscales ** -2.0, (1, 1, -1)) * Xsigm
         )  # N
 
-        vec = tf.expand_dims(Z, 0) - tf.expand_dims(Xmum, 1)  # NxMxD
-
-        rsm = tf.tile(tf.expand_dims(scalemat, 1), (1, M, 1, 1))  # Reshaped scalemat
-        smIvec = tf.matrix_solve(rsm, tf.expand_dims(vec, 3))[:, :, :, 0]  # NxMxDx1
-        q = tf.reduce_sum(smIvec * vec, [2])  # NxM
+        # One Cholesky factor per time step, rather than a DxD solve for every step and inducing point
+        vec = tf.transpose(tf.expand_dims(Z, 0) - tf.expand_dims(Xmum, 1), (0, 2, 1))  # NxDxM
+        smIvec = tf.cholesky_solve(tf.cholesky(scalemat), vec)  # NxDxM
+        q = tf.reduce_sum(smIvec * vec, [1])  # NxM
 
-        addvec = tf.batch_matmul(
-            tf.tile(tf.expand_dims(Xsigmc, 1), (1, M, 1, 1)),
-            tf.expand_dims(smIvec, 3),
-            adj_x=True
-        )[:, :, :, 0] + tf.expand_dims(Xmup, 1)  # NxMxD
+        addvec = tf.transpose(tf.batch_matmul(Xsigmc, smIvec, adj_x=True), (0, 2, 1)) + \
+            tf.expand_dims(Xmup, 1)  # NxMxD
 
         return self.variance * addvec * tf.reshape(det ** -0.5, (N, 1, 1)) * tf.expand_dims(tf.exp(-0.5 * q), 2)
 
@@ -92,9 +106,13 @@ class RBF(kernels.RBF):
         Also known as Phi_2.
         :param Z: MxD
         :param Xmu: X mean (NxD)
-        :param Xcov: X covariance matrices (NxDxD)
+        :param Xcov: X covariance matrices (NxDxD or NxD)
         :return: NxMxM
         """
+        return _on_diagonal(Xcov, lambda: self._eKzxKxz_diag(Z, Xmu, Xcov),
+                            lambda: self._eKzxKxz_full(Z, Xmu, Xcov))
+
+    def _eKzxKxz_full(self, Z, Xmu, Xcov):
         # use only active dimensions
         Xcov = self._slice_cov(Xcov)
         Z, Xmu = self._slice(Z, Xmu)
@@ -117,6 +135,78 @@ class RBF(kernels.RBF):
 
         return self.variance ** 2.0 * tf.expand_dims(Kmms, 0) * tf.exp(-0.5 * fs) * tf.reshape(det ** -0.5, [N, 1, 1])
 
+    def sum_eKzxKxz(self, Z, Xmu, Xcov):
+        """
+        Also known as Phi_2, summed over the data.
+        :param Z: MxD
+        :param Xmu: X mean (NxD)
+        :param Xcov: X covariance matrices (NxDxD or NxD)
+        :return: MxM
+        """
+        if Xcov.get_shape().ndims != 2:
+            return kernels.RBF.sum_eKzxKxz(self, Z, Xmu, Xcov)
+        M = tf.shape(Z)[0]
+        return self._sum_in_chunks(lambda Xmu, Xvar: tf.reduce_sum(self._eKzxKxz_diag(Z, Xmu, Xvar), 0),
+                                   Xmu, Xcov, tf.pack([M, M]), 4 * M * M)
+
+    def _eKzxKxz_diag(self, Z, Xmu, Xvar):
+        """
+        Phi_2 for diagonal covariances (NxD). The exponent of each term is
+        sum_d c_nd (zbar_mm'd - mu_nd)^2, with c = 1 / (2 Xvar + l^2) and
+        zbar the midpoints of the inducing inputs, which is expanded into
+        matrix products so that no NxMxMxD tensor is formed.
+        """
+        Z, Xmu = self._slice(Z, Xmu)
+        Xvar, _ = self._slice(Xvar, None)
+        M = tf.shape(Z)[0]
+        D = tf.shape(Xmu)[1]
+        lengthscales2 = self._lengthscales(Xmu) ** 2.0
+
+        Kmms = tf.sqrt(self.K(Z, presliced=True)) / self.variance ** 0.5
+        c = 1. / (2. * Xvar + lengthscales2)  # NxD
+        Zbar = tf.reshape(0.5 * (tf.expand_dims(Z, 1) + tf.expand_dims(Z, 0)), tf.pack([M * M, D]))  # MMxD
+        exponent = tf.matmul(c, tf.square(Zbar), transpose_b=True) - 2. * tf.matmul(c * Xmu, Zbar, transpose_b=True) + \
+            tf.reduce_sum(c * tf.square(Xmu), 1, keep_dims=True)  # NxMM
+        log_det = tf.reduce_sum(tf.log(1. + 2. * Xvar / lengthscales2), 1, keep_dims=True)  # Nx1
+        terms = tf.reshape(tf.exp(-exponent - 0.5 * log_det), tf.pack([-1, M, M]))
+        return self.variance ** 2.0 * tf.expand_dims(Kmms, 0) * terms
+
+    def _lengthscales(self, X):
+        D = tf.shape(X)[1]
+        return self.lengthscales if self.ARD else tf.zeros((D,), dtype=float_type) + self.lengthscales
+
+
+def _on_diagonal(Xcov, diagonal, full):
+    """
+    Select the computation of a kernel expectation for diagonal (NxD) or
+    full (NxDxD) covariances, statically if the rank of Xcov is known.
+    """
+    ndims = Xcov.get_shape().ndims
+    if ndims is None:
+        return tf.cond(tf.equal(tf.rank(Xcov), 2), diagonal, full)
+    return diagonal() if ndims == 2 else full()
+
+
+def _on_diagonal_or_quadrature(Xcov, diagonal, full):
+    """
+    As _on_diagonal, where full computes the expectation by quadrature. When
+    the rank of Xcov is only known at run time, both branches are built, so
+    a setting forbidding quadrature is checked when the full branch runs
+    rather than when it is built.
+    """
+    if Xcov.get_shape().ndims is not None or settings.numerics.ekern_quadrature != "error":
+        return _on_diagonal(Xcov, diagonal, full)
+
+    def checked_full():
+        config = settings.get_settings()
+        config.numerics.ekern_quadrature = "allow"
+        with settings.temp_settings(config):
+            result = full()
+        message = "Settings indicate that quadrature may not be used."
+        with tf.control_dependencies([tf.Assert(tf.constant(False), [message])]):
+            return tf.identity(result)
+    return tf.cond(tf.equal(tf.rank(Xcov), 2), diagonal, checked_full)
+
 
 class Linear(kernels.Linear):
     def eKdiag(self, X, Xcov):
@@ -165,6 +255,206 @@ class Linear(kernels.Linear):
         return self.variance ** 2.0 * tf.batch_matmul(tf.batch_matmul(eZ, mom2), eZ, adj_y=True)
 
 
+def _log_normal_cdf(x):
+    """
+    log Phi(x), with the asymptotic expansion of the lower tail where Phi
+    underflows.
+    """
+    lower, upper = tf.minimum(x, -20.), tf.maximum(x, -20.)
+    tail = -0.5 * tf.square(lower) - tf.log(-lower) - 0.5 * np.log(2 * np.pi) + \
+        tf.log(1. - 1. / tf.square(lower) + 3. / lower ** 4)
+    return tf.select(x < -20., tail, tf.log(0.5 * tf.erfc(-upper / np.sqrt(2.))))
+
+
+def _exponential_moments(mu, s, c, K, log_scale=0.):
+    """
+    The moments exp(log_scale) E[w^k exp(-c w) 1(w > 0)], k = 0, ..., K, for
+    w ~ N(mu, s^2). They are s^k phi(mu / s) I_k(a) with a = c s - mu / s and
+
+        I_k(a) = int_0^inf u^k exp(-a u - u^2 / 2) du,
+
+    which satisfy I_k = (k - 1) I_{k-2} - a I_{k-1}. The recursion loses
+    precision for large a, where the asymptotic series in 1 / a is used
+    instead.
+
+    Far from the inputs (mu / s >> 1), phi(mu / s) underflows and I_k(a)
+    overflows, so the recursion is run on S_k = phi(mu / s) I_k(a), with
+    S_0 = exp(c^2 s^2 / 2 - c mu) Phi(-a) computed in log space.
+    """
+    a = c * s - mu / s
+    lower, upper = tf.minimum(a, 10.), tf.maximum(a, 10.)
+    log_phi = log_scale - 0.5 * tf.square(mu / s) - 0.5 * np.log(2 * np.pi)
+    # log phi(mu / s) + a^2 / 2 + log(2 pi) / 2, finite in both branches so that the gradients are
+    log_phi_a = log_scale + tf.select(a < 10., 0.5 * tf.square(c * s) - c * mu,
+                                      0.5 * (tf.square(lower) - tf.square(mu / s)))
+    S = [tf.exp(log_phi_a + _log_normal_cdf(-lower)), None]
+    S[1] = tf.exp(log_phi) - lower * S[0]
+    for k in range(2, K + 1):
+        S.append((k - 1) * S[k - 2] - lower * S[k - 1])
+    moments = []
+    for k in range(K + 1):
+        series = reduce(tf.add, [(-1) ** j * factorial(k + 2 * j) / (2. ** j * factorial(j)) *
+                                 upper ** -(k + 2 * j + 1.) for j in range(16)])
+        moments.append(s ** k * tf.select(a > 10., tf.exp(log_phi) * series, S[k]))
+    return moments
+
+
+def _interval_moments(mu, s, delta, K, log_scale):
+    """
+    The moments exp(log_scale) E[y^k 1(0 < y < delta)], k = 0, ..., K, for
+    y ~ N(mu, s^2).
+    """
+    def density(y):
+        return tf.exp(log_scale - 0.5 * tf.square((y - mu) / s)) / (s * np.sqrt(2 * np.pi))
+
+    def cdf(y):
+        return 0.5 * tf.erfc((mu - y) / (s * np.sqrt(2.)))
+
+    p0, pd = density(0.), density(delta)
+    moments = [tf.exp(log_scale) * (cdf(delta) - cdf(0.))]
+    moments.append(mu * moments[0] + tf.square(s) * (p0 - pd))
+    for k in range(2, K + 1):
+        moments.append(mu * moments[k - 1] + (k - 1) * tf.square(s) * moments[k - 2] -
+                       tf.square(s) * _power(delta, k - 1) * pd)
+    return moments
+
+
+def _power(x, n):
+    # x ** 0 has a nan gradient at x = 0
+    return x ** n if n > 0 else 1.
+
+
+def _shift(p, delta, sign=1.):
+    # the coefficients of p(delta + sign * w) in w
+    return [sign ** k * reduce(tf.add, [p[j] * comb(j, k, exact=True) * _power(delta, j - k) for j in range(k, len(p))])
+            for k in range(len(p))]
+
+
+def _multiply(p, q):
+    # the coefficients of the product of the polynomials p and q
+    return [reduce(tf.add, [p[i] * q[k - i] for i in range(len(p)) if 0 <= k - i < len(q)])
+            for k in range(len(p) + len(q) - 1)]
+
+
+def _dot(p, moments):
+    return reduce(tf.add, [c * m for c, m in zip(p, moments)])
+
+
+class _MaternExpectations(object):
+    """
+    Closed-form expectations for the one-dimensional Matern kernels
+
+        k(x, z) = variance P(lam |x - z|) exp(-lam |x - z|),
+
+    with P a polynomial. Split at the inducing inputs, the integrands are
+    polynomials times exponentials, whose Gaussian expectations are given by
+    the moments of truncated Gaussians. Kernels on more than one dimension
+    are not separable, and fall back to quadrature (Prod of one-dimensional
+    Matern kernels is separable, see Prod).
+    """
+    _polynomial = None
+    _rate = None
+
+    def eKdiag(self, X, Xcov=None):
+        return self.Kdiag(X)
+
+    def eKxz(self, Z, Xmu, Xcov):
+        if self.input_dim != 1:
+            return kernels.Kern.eKxz(self, Z, Xmu, Xcov)
+        Z, Xmu = self._slice(Z, Xmu)
+        s = tf.sqrt(tf.reshape(self._slice_cov(Xcov), (-1, 1)))  # Nx1
+        lam = self._rate / tf.reshape(self.lengthscales, [])
+        p = [a * lam ** i for i, a in enumerate(self._polynomial)]
+        mu = Xmu - tf.transpose(Z)  # NxM
+        K = len(p) - 1
+        return self.variance * (_dot(p, _exponential_moments(mu, s, lam, K)) +
+                                _dot(p, _exponential_moments(-mu, s, lam, K)))
+
+    def eKzxKxz(self, Z, Xmu, Xcov):
+        """
+        With z <= z', delta = z' - z and y = x - z, the integrand is, on y < 0,
+        0 < y < delta and y > delta,
+
+            P(-lam y) P(lam (delta - y)) exp(2 lam y - lam delta)
+            P(lam y) P(lam (delta - y)) exp(-lam delta)
+            P(lam y) P(lam (y - delta)) exp(-2 lam y + lam delta)
+
+        and the outer two are the same polynomial Q(w) = P(lam w) P(lam (w + delta))
+        times exp(-2 lam w - lam delta), of w = -y and w = y - delta on w > 0.
+        """
+        if self.input_dim != 1:
+            return kernels.Kern.eKzxKxz(self, Z, Xmu, Xcov)
+        Z, Xmu = self._slice(Z, Xmu)
+        s = tf.sqrt(tf.reshape(self._slice_cov(Xcov), (-1, 1, 1)))  # Nx1x1
+        lam = self._rate / tf.reshape(self.lengthscales, [])
+        p = [a * lam ** i for i, a in enumerate(self._polynomial)]
+        delta = tf.expand_dims(tf.abs(Z - tf.transpose(Z)), 0)  # 1xMxM
+        mu = tf.reshape(Xmu, (-1, 1, 1)) - tf.expand_dims(tf.minimum(Z, tf.transpose(Z)), 0)  # NxMxM
+        K = 2 * len(p) - 2
+        Q = _multiply(p, _shift(p, delta))
+        R = _multiply(p, _shift(p, delta, -1.))
+        terms = _dot(Q, _exponential_moments(-mu, s, 2 * lam, K, -lam * delta)) + \
+            _dot(Q, _exponential_moments(mu - delta, s, 2 * lam, K, -lam * delta)) + \
+            _dot(R, _interval_moments(mu, s, delta, K, -lam * delta))
+        return tf.square(self.variance) * terms
+
+
+class Matern32(_MaternExpectations, kernels.Matern32):
+    _polynomial = [1., 1.]
+    _rate = np.sqrt(3.)
+
+
+class Matern52(_MaternExpectations, kernels.Matern52):
+    _polynomial = [1., 1., 1. / 3.]
+    _rate = np.sqrt(5.)
+
+
+class PeriodicKernel(kernels.PeriodicKernel):
+    """
+    The periodic kernel is a product over the input dimensions,
+
+        k(x, z) = variance prod_d exp(-sin^2(pi (x_d - z_d) / period) / (2 l^2)),
+
+    so for diagonal covariances its expectations are products of
+    one-dimensional expectations, which are computed by Gauss-Hermite
+    quadrature with num_gauss_hermite_points points per dimension, rather
+    than on the grid of H**D points. Full covariances fall back to the
+    quadrature of Kern.
+    """
+
+    def eKdiag(self, X, Xcov=None):
+        return self.Kdiag(X)
+
+    def _factors(self, Z, Xmu, Xvar):
+        """
+        The factors of the kernel for each dimension, at the Gauss-Hermite
+        nodes of each N(Xmu_nd, Xvar_nd): a list over d of NxMxH tensors, and
+        the weights (H).
+        """
+        Z, Xmu = self._slice(Z, Xmu)
+        Xvar, _ = self._slice(Xvar, None)
+        gh_x, gh_w = quadrature.gauss_hermite(self.num_gauss_hermite_points, 1)
+        X = tf.expand_dims(Xmu, 2) + tf.expand_dims(tf.sqrt(Xvar), 2) * gh_x[:, 0]  # NxDxH
+        factors = []
+        for d in range(self.input_dim):
+            r = 2 * np.pi * (tf.expand_dims(X[:, d, :], 1) - tf.reshape(Z[:, d], (1, -1, 1))) / self.period
+            factors.append(tf.exp(-(1. - tf.cos(r)) / (4 * tf.square(self.lengthscales))))
+        return factors, gh_w
+
+    def eKxz(self, Z, Xmu, Xcov):
+        def diagonal():
+            factors, gh_w = self._factors(Z, Xmu, Xcov)
+            return self.variance * reduce(tf.mul, [tf.reduce_sum(f * gh_w, 2) for f in factors])
+        return _on_diagonal_or_quadrature(Xcov, diagonal, lambda: kernels.PeriodicKernel.eKxz(self, Z, Xmu, Xcov))
+
+    def eKzxKxz(self, Z, Xmu, Xcov):
+        def diagonal():
+            factors, gh_w = self._factors(Z, Xmu, Xcov)
+            return tf.square(self.variance) * reduce(
+                tf.mul, [tf.reduce_sum(tf.expand_dims(f, 1) * tf.expand_dims(f * gh_w, 2), 3) for f in factors])
+        return _on_diagonal_or_quadrature(Xcov, diagonal, lambda: kernels.PeriodicKernel.eKzxKxz(self, Z, Xmu, Xcov))
+
+
 class Add(kernels.Add):
     """
     Add
@@ -188,31 +478,45 @@ class Add(kernels.Add):
         return reduce(tf.add, [k.exKxz(Z, Xmu, Xcov) for k in self.kern_list])
 
     def eKzxKxz(self, Z, Xmu, Xcov):
+        """
+        The sum of the eKzxKxz of the kernels, plus the cross terms
+        <K_zx1 K_x2z + K_zx2 K_x1z> of each pair. If the kernels are on
+        separate dimensions and the covariances diagonal, the cross terms are
+        the products of the eKxz; otherwise they have closed forms for some
+        pairs (see crossexp_funcs), and the covariances of the others are
+        computed by quadrature. The products of the eKxz of all the pairs
+        without a closed form are summed in one contraction.
+        """
         all_sum = reduce(tf.add, [k.eKzxKxz(Z, Xmu, Xcov) for k in self.kern_list])
+        num_kernels = len(self.kern_list)
+        if num_kernels == 1:
+            return all_sum
 
+        eKxzs = tf.pack([k.eKxz(Z, Xmu, Xcov) for k in self.kern_list], 2)  # NxMxK
+        pairs = np.zeros((num_kernels, num_kernels))
+        terms = [all_sum]
         if self.on_separate_dimensions and Xcov.get_shape().ndims == 2:
             # If we're on separate dimensions and the covariances are diagonal, we don't need Cov[Kzx1Kxz2].
-            crossmeans = []
-            eKxzs = [k.eKxz(Z, Xmu, Xcov) for k in self.kern_list]
-            for i, Ka in enumerate(eKxzs):
-                for Kb in eKxzs[i + 1:]:
-                    op = Ka[:, None, :] * Kb[:, :, None]
-                    ct = tf.transpose(op, [0, 2, 1]) + op
-                    crossmeans.append(ct)
-            crossmean = reduce(tf.add, crossmeans)
-            return all_sum + crossmean
+            pairs = 1. - np.eye(num_kernels)
         else:
-            crossexps = []
+            fallbacks = []
             for i, ka in enumerate(self.kern_list):
-                for kb in self.kern_list[i + 1:]:
+                for j in range(i + 1, num_kernels):
+                    kb = self.kern_list[j]
                     try:
                         crossexp_func = self.crossexp_funcs[frozenset([type(ka), type(kb)])]
-                        crossexp = crossexp_func(ka, kb, Z, Xmu, Xcov)
+                        terms.append(crossexp_func(ka, kb, Z, Xmu, Xcov))
                     except (KeyError, NotImplementedError) as e:
-                        print(str(e))
-                        crossexp = self.quad_eKzx1Kxz2(ka, kb, Z, Xmu, Xcov)
-                    crossexps.append(crossexp)
-            return all_sum + reduce(tf.add, crossexps)
+                        reason = str(e) if isinstance(e, NotImplementedError) else "no closed form"
+                        fallbacks.append("(%s, %s): %s" % (type(ka).__name__, type(kb).__name__, reason))
+                        pairs[i, j] = pairs[j, i] = 1.
+            if fallbacks:
+                self._check_quadrature("GPflow.ekernels.Add: Using numerical quadrature for the kernel expectation "
+                                       "cross terms of " + "; ".join(fallbacks))
+                terms.append(self._quad_cross_covariance(pairs, Z, Xmu, Xcov, eKxzs))
+        if np.any(pairs):
+            terms.append(_pair_contraction(tf.expand_dims(eKxzs, 0), pairs, tf.expand_dims(eKxzs, 0)))
+        return reduce(tf.add, terms)
 
     def Linear_RBF_eKxzKzx(self, Ka, Kb, Z, Xmu, Xcov):
         Xcov = self._slice_cov(Xcov)
@@ -251,50 +555,82 @@ class Add(kernels.Add):
         return a + tf.transpose(a, [0, 2, 1])
 
     def quad_eKzx1Kxz2(self, Ka, Kb, Z, Xmu, Xcov):
-        # Quadrature for Cov[(Kzx1 - eKzx1)(kxz2 - eKxz2)]
-        self._check_quadrature()
-        warnings.warn("GPflow.ekernels.Add: Using numerical quadrature for kernel expectation cross terms.")
+        # Quadrature for <K_zx1 K_x2z + K_zx2 K_x1z>, of the covariance and with the product of the means
+        self._check_quadrature("GPflow.ekernels.Add: Using numerical quadrature for kernel expectation cross terms.")
+        pairs = np.array([[0., 1.], [1., 0.]])
+        eKxzs = tf.pack([Ka.eKxz(Z, Xmu, Xcov), Kb.eKxz(Z, Xmu, Xcov)], 2)  # NxMx2
+        return self._quad_cross_covariance(pairs, Z, Xmu, Xcov, eKxzs, [Ka, Kb]) + \
+            _pair_contraction(tf.expand_dims(eKxzs, 0), pairs, tf.expand_dims(eKxzs, 0))
+
+    def _quad_cross_covariance(self, pairs, Z, Xmu, Xcov, eKxzs, kern_list=None):
+        """
+        sum_ij pairs_ij Cov[K_zxi K_xjz] by quadrature, for the kernels of
+        kern_list (default self.kern_list), whose eKxz are eKxzs (NxMxK).
+        All the kernels are evaluated on the same nodes, which are streamed
+        in blocks (see Kern._quadrature_sum), and the covariances are summed
+        in one contraction per node.
+        """
+        kern_list = self.kern_list if kern_list is None else kern_list
+        used = [i for i in range(len(kern_list)) if np.any(pairs[i])]
+        pairs = tf.constant(pairs[np.ix_(used, used)], float_type)
         Xmu, Z = self._slice(Xmu, Z)
         Xcov = self._slice_cov(Xcov)
-        N, M, HpowD = tf.shape(Xmu)[0], tf.shape(Z)[0], self.num_gauss_hermite_points ** self.input_dim
-        X, wn = kernels.mvhermgauss(Xmu, Xcov, self.num_gauss_hermite_points,
-                                    self.input_dim)  # (H**DxNxD, H**D)
+        N, M, D, K = tf.shape(Xmu)[0], tf.shape(Z)[0], self.input_dim, len(used)
+        eKxzs = tf.transpose(tf.gather(tf.transpose(eKxzs, [2, 0, 1]), used), [1, 2, 0])
+
+        def cross_covariance(X):  # BxNxD -> BxNxMxM
+            B = tf.shape(X)[0]
+            X = tf.reshape(X, (-1, D))
+            Kxzs = tf.pack([tf.reshape(kern_list[i].K(X, Z, presliced=False), tf.pack([B, N, M]))
+                            for i in used], 3)  # BxNxMxK
+            cKxzs = tf.reshape(Kxzs - tf.expand_dims(eKxzs, 0), tf.pack([-1, M, K]))  # Centred Kxz
+            cKW = tf.reshape(tf.matmul(tf.reshape(cKxzs, [-1, K]), pairs), tf.shape(cKxzs))
+            return tf.reshape(tf.batch_matmul(cKW, cKxzs, adj_y=True), tf.pack([B, N, M, M]))
+        return self._quadrature_sum(cross_covariance, Xmu, Xcov, D, tf.pack([N, M, M]), M * (M + K))
 
-        cKa, cKb = [tf.reshape(
-            k.K(tf.reshape(X, (-1, self.input_dim)), Z, presliced=False),
-            (HpowD, N, M)
-        ) - k.eKxz(Z, Xmu, Xcov)[None, :, :] for k in (Ka, Kb)]  # Centred Kxz
-        eKa, eKb = Ka.eKxz(Z, Xmu, Xcov), Kb.eKxz(Z, Xmu, Xcov)
 
-        cc = tf.reduce_sum(cKa[:, :, None, :] * cKb[:, :, :, None] * wn[:, None, None, None], 0)
-        cm = eKa[:, None, :] * eKb[:, :, None]
-        return cc + tf.transpose(cc, [0, 2, 1]) + cm + tf.transpose(cm, [0, 2, 1])
+def _pair_contraction(A, pairs, B):
+    """
+    sum_{p, i, j} pairs_ij A[p, :, :, i] B[p, :, :, j]^T for PxNxMxK tensors
+    A and B, as one batched matrix product: NxMxM.
+    """
+    K = pairs.shape[0]
+    shape = tf.shape(A)
+    AW = tf.reshape(tf.matmul(tf.reshape(A, [-1, K]), tf.constant(pairs, float_type)), shape)
+
+    def merge(T):
+        # PxNxMxK -> NxMxPK
+        return tf.reshape(tf.transpose(T, [1, 2, 0, 3]), tf.pack([shape[1], shape[2], -1]))
+
+    return tf.batch_matmul(merge(AW), merge(B), adj_y=True)
 
 
 class Prod(kernels.Prod):
-    def eKdiag(self, Xmu, Xcov):
+    """
+    Prod
+    For kernels on separate dimensions and diagonal covariances, the inputs
+    of the factors are independent, so the expectations are the products of
+    those of the factors, e.g. closed forms for products of one-dimensional
+    Matern kernels. Otherwise, this falls back to quadrature on the product.
+    """
+
+    def _factorised(self, Xcov, factor, fallback):
+        """
+        The product of factor(k) over the kernels if they are on separate
+        dimensions and Xcov is diagonal, and fallback() otherwise.
+        """
         if not self.on_separate_dimensions:
-            raise NotImplementedError("Prod currently needs to be defined on separate dimensions.")  # pragma: no cover
-        with tf.control_dependencies([
-            tf.assert_equal(tf.rank(Xcov), 2,
-                            message="Prod currently only supports diagonal Xcov.", name="assert_Xcov_diag"),
-        ]):
-            return reduce(tf.mul, [k.eKdiag(Xmu, Xcov) for k in self.kern_list])
+            return fallback()
+        return _on_diagonal_or_quadrature(Xcov, lambda: reduce(tf.mul, [factor(k) for k in self.kern_list]), fallback)
+
+    def eKdiag(self, Xmu, Xcov):
+        return self._factorised(Xcov, lambda k: k.eKdiag(Xmu, Xcov),
+                                lambda: kernels.Prod.eKdiag(self, Xmu, Xcov))
 
     def eKxz(self, Z, Xmu, Xcov):
-        if not self.on_separate_dimensions:
-            raise NotImplementedError("Prod currently needs to be defined on separate dimensions.")  # pragma: no cover
-        with tf.control_dependencies([
-            tf.assert_equal(tf.rank(Xcov), 2,
-                            message="Prod currently only supports diagonal Xcov.", name="assert_Xcov_diag"),
-        ]):
-            return reduce(tf.mul, [k.eKxz(Z, Xmu, Xcov) for k in self.kern_list])
+        return self._factorised(Xcov, lambda k: k.eKxz(Z, Xmu, Xcov),
+                                lambda: kernels.Prod.eKxz(self, Z, Xmu, Xcov))
 
     def eKzxKxz(self, Z, Xmu, Xcov):
-        if not self.on_separate_dimensions:
-            raise NotImplementedError("Prod currently needs to be defined on separate dimensions.")  # pragma: no cover
-        with tf.control_dependencies([
-            tf.assert_equal(tf.rank(Xcov), 2,
-                            message="Prod currently only supports diagonal Xcov.", name="assert_Xcov_diag"),
-        ]):
-            return reduce(tf.mul, [k.eKzxKxz(Z, Xmu, Xcov) for k in self.kern_list])
+        return self._factorised(Xcov, lambda k: k.eKzxKxz(Z, Xmu, Xcov),
+                                lambda: kernels.Prod.eKzxKxz(self, Z, Xmu, Xcov))
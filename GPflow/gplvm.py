@@ -2,12 +2,16 @@ import tensorflow as tf
 import numpy as np
 from .model import GPModel
 from .gpr import GPR
-from .param import Param
+from .param import Param, DataHolder
 from .mean_functions import Zero
 from . import likelihoods
 from .tf_wraps import eye
 from . import transforms
 from . import kernels
+from . import kullback_leiblers
+from .conditionals import conditional, uncertain_conditional
+from .sgpr import collapsed_predictor
+from .minibatch import MinibatchData
 from ._settings import settings
 
 float_type = settings.dtypes.float_type
@@ -116,7 +120,7 @@ class BayesianGPLVM(GPModel):
         num_inducing = tf.shape(self.Z)[0]
         psi0 = tf.reduce_sum(self.kern.eKdiag(self.X_mean, self.X_var), 0)
         psi1 = self.kern.eKxz(self.Z, self.X_mean, self.X_var)
-        psi2 = tf.reduce_sum(self.kern.eKzxKxz(self.Z, self.X_mean, self.X_var), 0)
+        psi2 = self.kern.sum_eKzxKxz(self.Z, self.X_mean, self.X_var)
         Kuu = self.kern.K(self.Z) + eye(num_inducing) * 1e-6
         L = tf.cholesky(Kuu)
         sigma2 = self.likelihood.variance
@@ -151,18 +155,15 @@ class BayesianGPLVM(GPModel):
         bound -= KL
         return bound
 
-    def build_predict(self, Xnew, full_cov=False):
+    def _build_posterior(self):
         """
-        Compute the mean and variance of the latent function at some new points.
-        Note that this is very similar to the SGPR prediction, for which
-        there are notes in the SGPR notebook.
-        :param Xnew: Point to predict at.
+        The terms L, LB and c of the optimal q(u), as in SGPR._build_posterior
+        with the kernel matrices replaced by their expectations under q(X).
         """
         num_inducing = tf.shape(self.Z)[0]
         psi1 = self.kern.eKxz(self.Z, self.X_mean, self.X_var)
-        psi2 = tf.reduce_sum(self.kern.eKzxKxz(self.Z, self.X_mean, self.X_var), 0)
+        psi2 = self.kern.sum_eKzxKxz(self.Z, self.X_mean, self.X_var)
         Kuu = self.kern.K(self.Z) + eye(num_inducing) * 1e-6
-        Kus = self.kern.K(self.Z, Xnew)
         sigma2 = self.likelihood.variance
         sigma = tf.sqrt(sigma2)
         L = tf.cholesky(Kuu)
@@ -173,6 +174,17 @@ class BayesianGPLVM(GPModel):
         B = AAT + eye(num_inducing)
         LB = tf.cholesky(B)
         c = tf.matrix_triangular_solve(LB, tf.matmul(A, self.Y), lower=True) / sigma
+        return L, LB, c
+
+    def build_predict(self, Xnew, full_cov=False):
+        """
+        Compute the mean and variance of the latent function at some new points.
+        Note that this is very similar to the SGPR prediction, for which
+        there are notes in the SGPR notebook.
+        :param Xnew: Point to predict at.
+        """
+        L, LB, c = self._build_posterior()
+        Kus = self.kern.K(self.Z, Xnew)
         tmp1 = tf.matrix_triangular_solve(L, Kus, lower=True)
         tmp2 = tf.matrix_triangular_solve(LB, tmp1, lower=True)
         mean = tf.matmul(tf.transpose(tmp2), c)
@@ -187,3 +199,142 @@ class BayesianGPLVM(GPModel):
             shape = tf.pack([1, tf.shape(self.Y)[1]])
             var = tf.tile(tf.expand_dims(var, 1), shape)
         return mean + self.mean_function(Xnew), var
+
+    def build_predict_uncertain(self, Xmu, Xcov):
+        """
+        Compute the mean and variance of the latent function at uncertain
+        latent points x ~ N(Xmu, Xcov), e.g. to propagate the posterior q(X)
+        of new points through the mapping.
+        """
+        alpha, B = collapsed_predictor(*self._build_posterior())
+        mean, var = uncertain_conditional(Xmu, Xcov, self.Z, self.kern, alpha, B)
+        return mean + self.mean_function(Xmu), var
+
+
+class StochasticBayesianGPLVM(GPModel):
+    """
+    A Bayesian GPLVM whose bound is a sum over the data, so that it can be
+    optimised on minibatches (e.g. with _optimize_tf) for large data sets.
+
+    Unlike BayesianGPLVM, the inducing outputs are not integrated out: there
+    is an explicit (whitened) Gaussian posterior q(v) = N(q_mu, q_sqrt
+    q_sqrt^T) for each output, with u = L v and L L^T = K(Z, Z), as in SVGP.
+    For a minibatch B of size b, the bound is
+
+        N / b sum_{n in B} (E_q[log p(y_n | f_n)] - KL[q(x_n) || p(x_n)]) - KL[q(v) || p(v)],
+
+    where the expected log likelihood only depends on the psi statistics of
+    the minibatch. At the optimal q(v), and with the full data as the
+    minibatch, it equals the bound of BayesianGPLVM. See
+
+    Hensman, J., Fusi, N. and Lawrence, N. D. Gaussian processes for big
+    data. UAI, 2013.
+
+    The rows of Y and the indices of the rows of X_mean, X_var and the prior
+    which are used are drawn by MinibatchData objects with the same random
+    state, so they always match.
+    """
+    def __init__(self, X_mean, X_var, Y, kern, M, Z=None, X_prior_mean=None, X_prior_var=None,
+                 minibatch_size=None):
+        """
+        Initialise the stochastic Bayesian GPLVM object. This method only works with a Gaussian likelihood.
+        :param X_mean: initial latent positions, size N (number of points) x Q (latent dimensions).
+        :param X_var: variance of latent positions (N x Q), for the initialisation of the latent space.
+        :param Y: data matrix, size N (number of points) x D (dimensions)
+        :param kern: kernel specification, by default RBF
+        :param M: number of inducing points
+        :param Z: matrix of inducing points, size M (inducing points) x Q (latent dimensions). By default
+        random permutation of X_mean.
+        :param X_prior_mean: prior mean used in KL term of bound. By default 0. Same size as X_mean.
+        :param X_prior_var: pripor variance used in KL term of bound. By default 1.
+        :param minibatch_size: number of data in each minibatch. By default N.
+        """
+        assert X_var.ndim == 2
+        assert np.all(X_mean.shape == X_var.shape)
+        assert X_mean.shape[0] == Y.shape[0], 'X mean and Y must be same size.'
+        self.num_data = X_mean.shape[0]
+        if minibatch_size is None:
+            minibatch_size = self.num_data
+        Y = MinibatchData(Y, minibatch_size, np.random.RandomState(0))
+        GPModel.__init__(self, X_mean, Y, kern, likelihood=likelihoods.Gaussian(), mean_function=Zero())
+        del self.X  # in GPLVM this is a Param
+        self.X_mean = Param(X_mean)
+        self.X_var = Param(X_var, transforms.positive)
+        self.batch_indices = MinibatchData(np.arange(self.num_data), minibatch_size, np.random.RandomState(0))
+        self.output_dim = Y.shape[1]
+
+        # inducing points
+        if Z is None:
+            # By default we initialize by subset of initial latent points
+            Z = np.random.permutation(X_mean.copy())[:M]
+        else:
+            assert Z.shape[0] == M
+        self.Z = Param(Z)
+        self.num_latent = Z.shape[1]
+        assert X_mean.shape[1] == self.num_latent
+
+        self.q_mu = Param(np.zeros((M, self.output_dim)))
+        self.q_sqrt = Param(np.array([np.eye(M) for _ in range(self.output_dim)]).swapaxes(0, 2))
+
+        # deal with parameters for the prior mean variance of X
+        if X_prior_mean is None:
+            X_prior_mean = np.zeros((self.num_data, self.num_latent))
+        if X_prior_var is None:
+            X_prior_var = np.ones((self.num_data, self.num_latent))
+        assert X_prior_mean.shape == X_mean.shape
+        assert X_prior_var.shape == X_mean.shape
+        self.X_prior_mean = DataHolder(X_prior_mean)
+        self.X_prior_var = DataHolder(X_prior_var)
+
+    def build_likelihood(self):
+        """
+        Construct a tensorflow function to compute the (minibatch estimate
+        of the) bound on the marginal likelihood.
+        """
+        X_mean = tf.gather(self.X_mean, self.batch_indices)
+        X_var = tf.gather(self.X_var, self.batch_indices)
+        X_prior_mean = tf.gather(self.X_prior_mean, self.batch_indices)
+        X_prior_var = tf.gather(self.X_prior_var, self.batch_indices)
+        num_inducing = tf.shape(self.Z)[0]
+        sigma2 = self.likelihood.variance
+
+        # the psi statistics of the minibatch
+        psi0 = tf.reduce_sum(self.kern.eKdiag(X_mean, X_var))
+        psi1 = self.kern.eKxz(self.Z, X_mean, X_var)
+        psi2 = self.kern.sum_eKzxKxz(self.Z, X_mean, X_var)
+        Kuu = self.kern.K(self.Z) + eye(num_inducing) * settings.numerics.jitter_level
+        L = tf.cholesky(Kuu)
+        A = tf.matrix_triangular_solve(L, tf.transpose(psi1), lower=True)  # M x b
+        tmp = tf.matrix_triangular_solve(L, psi2, lower=True)
+        P = tf.matrix_triangular_solve(L, tf.transpose(tmp), lower=True)  # L^-1 psi2 L^-T
+
+        # sum_n E[f_n] y_n and sum_n E[f_n^2], over the minibatch and the outputs
+        Lq = tf.matrix_band_part(tf.transpose(self.q_sqrt, (2, 0, 1)), -1, 0)  # D x M x M
+        Lq = tf.reshape(tf.transpose(Lq, (1, 0, 2)), tf.pack([num_inducing, -1]))  # M x DM
+        D = tf.cast(tf.shape(self.Y)[1], float_type)
+        Yf = tf.reduce_sum(self.Y * tf.matmul(A, self.q_mu, transpose_a=True))
+        f2 = D * (psi0 - tf.reduce_sum(tf.diag_part(P))) + tf.reduce_sum(self.q_mu * tf.matmul(P, self.q_mu)) + \
+            tf.reduce_sum(Lq * tf.matmul(P, Lq))
+
+        ND = tf.cast(tf.size(self.Y), float_type)
+        var_exp = -0.5 * ND * tf.log(2 * np.pi * sigma2) - 0.5 * (tf.reduce_sum(tf.square(self.Y)) - 2. * Yf + f2) / sigma2
+
+        # KL[q(x) || p(x)] for the minibatch
+        NQ = tf.cast(tf.size(X_mean), float_type)
+        KL = -0.5 * tf.reduce_sum(tf.log(X_var)) \
+             + 0.5 * tf.reduce_sum(tf.log(X_prior_var)) \
+             - 0.5 * NQ \
+             + 0.5 * tf.reduce_sum((tf.square(X_mean - X_prior_mean) + X_var) / X_prior_var)
+
+        # re-scale for minibatch size
+        scale = tf.cast(self.num_data, float_type) / tf.cast(tf.shape(self.Y)[0], float_type)
+        return scale * (var_exp - KL) - kullback_leiblers.gauss_kl_white(self.q_mu, self.q_sqrt)
+
+    def build_predict(self, Xnew, full_cov=False):
+        """
+        Compute the mean and variance of the latent function at some new points.
+        :param Xnew: Point to predict at.
+        """
+        mu, var = conditional(Xnew, self.Z, self.kern, self.q_mu, q_sqrt=self.q_sqrt, full_cov=full_cov,
+                              whiten=True)
+        return mu + self.mean_function(Xnew), var
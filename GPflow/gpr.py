@@ -14,13 +14,14 @@
 
 
 from __future__ import absolute_import
+import numpy as np
 import tensorflow as tf
 from .model import GPModel
-from .densities import multivariate_normal
 from .mean_functions import Zero
 from . import likelihoods
-from .tf_wraps import eye
+from .linear_operators import Diagonal
 from .param import DataHolder
+from .iterative import conjugate_gradient, gaussian_log_density, pivoted_cholesky, LowRankPreconditioner
 
 
 class GPR(GPModel):
@@ -30,6 +31,10 @@ class GPR(GPModel):
     This is a vanilla implementation of GP regression with a Gaussian
     likelihood.  Multiple columns of Y are treated independently.
 
+    The covariance K + sigma^2 I is built with kern.K_operator, so its
+    structure is used where the kernel has one: e.g. with a Linear kernel
+    on D inputs, the cost is O(N D^2) rather than O(N^3).
+
     The log likelihood i this models is sometimes referred to as the 'marginal log likelihood', and is given by
 
     .. math::
@@ -55,11 +60,100 @@ class GPR(GPModel):
             \log p(Y | theta).
 
         """
-        K = self.kern.K(self.X) + eye(tf.shape(self.X)[0]) * self.likelihood.variance
-        L = tf.cholesky(K)
-        m = self.mean_function(self.X)
+        K = self._K_operator()
+        return K.log_density(self.Y - self.mean_function(self.X))
+
+    def _K_operator(self):
+        """
+        The covariance of Y, K + sigma^2 I, as a linear operator.
+        """
+        return self.kern.K_operator(self.X) + Diagonal(self.likelihood.variance, tf.shape(self.X)[0])
+
+    def build_predict(self, Xnew, full_cov=False):
+        """
+        Xnew is a data matrix, point at which we want to predict
+
+        This method computes
 
-        return multivariate_normal(self.Y, m, L)
+            p(F* | Y )
+
+        where F* are points on the GP at Xnew, Y are noisy observations at X.
+
+        """
+        Kx = self.kern.K(self.X, Xnew)
+        R = tf.shape(self.Y)[1]
+        solve = self._K_operator().solve(tf.concat(1, [self.Y - self.mean_function(self.X), Kx]))
+        alpha, A = solve[:, :R], solve[:, R:]
+        fmean = tf.matmul(tf.transpose(Kx), alpha) + self.mean_function(Xnew)
+        if full_cov:
+            fvar = self.kern.K(Xnew) - tf.matmul(tf.transpose(Kx), A)
+            shape = tf.pack([1, 1, tf.shape(self.Y)[1]])
+            fvar = tf.tile(tf.expand_dims(fvar, 2), shape)
+        else:
+            fvar = self.kern.Kdiag(Xnew) - tf.reduce_sum(Kx * A, 0)
+            fvar = tf.tile(tf.reshape(fvar, (-1, 1)), [1, tf.shape(self.Y)[1]])
+        return fmean, fvar
+
+
+class IterativeGPR(GPR):
+    """
+    Gaussian Process Regression with iterative linear algebra, for data sets
+    too large for the Cholesky decomposition of GPR.
+
+    K + sigma^2 I is only accessed through products with it, which are
+    computed from tiles of block_size x block_size of the kernel matrix (see
+    Kern.K_matmul), so K is never held in memory. The likelihood is computed
+    with preconditioned conjugate gradients and stochastic Lanczos
+    quadrature (see GPflow.iterative), and the predictions with
+    preconditioned conjugate gradients. The preconditioner is a pivoted
+    Cholesky decomposition of K of rank `preconditioner_rank`, plus the
+    noise; a rank of zero disables it. See
+
+    Gardner, J. R., Pleiss, G., Bindel, D., Weinberger, K. Q. and Wilson,
+    A. G. GPyTorch: Blackbox matrix-matrix Gaussian process inference with
+    GPU acceleration. NeurIPS, 2018.
+
+    The log determinant is estimated with `num_probes` fixed Rademacher
+    vectors, so the objective is deterministic, but only approximately equal
+    to that of GPR, and the number of data is fixed. The backward pass keeps
+    the tiles of the product which is differentiated (see Kern.K_matmul).
+    """
+    def __init__(self, X, Y, kern, mean_function=Zero(), block_size=1024, max_iterations=1000,
+                 tolerance=1e-6, num_probes=10, lanczos_iterations=30, preconditioner_rank=10, seed=0):
+        """
+        X is a data matrix, size N x D
+        Y is a data matrix, size N x R
+        kern, mean_function are appropriate GPflow objects
+        """
+        GPR.__init__(self, X, Y, kern, mean_function)
+        self.probes = DataHolder(np.sign(np.random.RandomState(seed).rand(X.shape[0], num_probes) - 0.5))
+        self.block_size = block_size
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        self.lanczos_iterations = lanczos_iterations
+        self.preconditioner_rank = preconditioner_rank
+
+    def _matvec(self, V):
+        return self.kern.K_matmul(self.X, V, self.block_size) + self.likelihood.variance * V
+
+    def _preconditioner(self):
+        if self.preconditioner_rank == 0:
+            return None
+        L = pivoted_cholesky(self.kern.Kdiag(self.X),
+                             lambda i: tf.reshape(self.kern.K(self.X, tf.gather(self.X, tf.expand_dims(i, 0))), [-1]),
+                             self.preconditioner_rank)
+        return LowRankPreconditioner(tf.stop_gradient(L), tf.stop_gradient(self.likelihood.variance))
+
+    def build_likelihood(self):
+        """
+        Construct a tensorflow function to compute the likelihood.
+
+            \log p(Y | theta).
+
+        """
+        return gaussian_log_density(self._matvec, self.Y - self.mean_function(self.X), self.probes,
+                                    self.max_iterations, self.tolerance, self.lanczos_iterations,
+                                    self._preconditioner())
 
     def build_predict(self, Xnew, full_cov=False):
         """
@@ -73,16 +167,18 @@ class GPR(GPModel):
 
         """
         Kx = self.kern.K(self.X, Xnew)
-        K = self.kern.K(self.X) + eye(tf.shape(self.X)[0]) * self.likelihood.variance
-        L = tf.cholesky(K)
-        A = tf.matrix_triangular_solve(L, Kx, lower=True)
-        V = tf.matrix_triangular_solve(L, self.Y - self.mean_function(self.X))
-        fmean = tf.matmul(tf.transpose(A), V) + self.mean_function(Xnew)
+        R = tf.shape(self.Y)[1]
+        preconditioner = self._preconditioner()
+        solve = conjugate_gradient(self._matvec, tf.concat(1, [self.Y - self.mean_function(self.X), Kx]),
+                                   self.max_iterations, self.tolerance,
+                                   preconditioner.solve if preconditioner is not None else None)
+        alpha, A = solve[:, :R], solve[:, R:]
+        fmean = tf.matmul(tf.transpose(Kx), alpha) + self.mean_function(Xnew)
         if full_cov:
-            fvar = self.kern.K(Xnew) - tf.matmul(tf.transpose(A), A)
+            fvar = self.kern.K(Xnew) - tf.matmul(tf.transpose(Kx), A)
             shape = tf.pack([1, 1, tf.shape(self.Y)[1]])
             fvar = tf.tile(tf.expand_dims(fvar, 2), shape)
         else:
-            fvar = self.kern.Kdiag(Xnew) - tf.reduce_sum(tf.square(A), 0)
+            fvar = self.kern.Kdiag(Xnew) - tf.reduce_sum(Kx * A, 0)
             fvar = tf.tile(tf.reshape(fvar, (-1, 1)), [1, tf.shape(self.Y)[1]])
         return fmean, fvar
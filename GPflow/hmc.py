@@ -14,12 +14,116 @@
 
 
 from __future__ import division, print_function
+from timeit import default_timer
 import numpy as np
 
 
+class HMCTrace(object):
+    """
+    Per-iteration instrumentation of sample_HMC.
+
+    Pass an instance of this class as the `trace` argument of sample_HMC (or
+    Model.sample), and it records for every iteration
+
+      - the number of leapfrog steps taken,
+      - whether the proposal was accepted,
+      - whether the proposal was rejected early because of NaNs,
+      - the time spent evaluating the objective (e.g. in tensorflow),
+      - the total time taken by the iteration.
+
+    The difference between the last two is the time spent in the sampler
+    itself (python). Counters are available as properties, and histograms
+    of the recorded quantities through `histogram`. The same trace can be
+    passed to several runs, in which case the records are appended.
+    """
+
+    fields = ['leapfrog_steps', 'accepted', 'nan_rejected', 'objective_time', 'iteration_time']
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._records = dict((name, []) for name in self.fields)
+        self.objective_evaluations = 0
+
+    def record(self, leapfrog_steps, accepted, nan_rejected, objective_time, iteration_time):
+        for name, value in zip(self.fields,
+                               [leapfrog_steps, accepted, nan_rejected, objective_time, iteration_time]):
+            self._records[name].append(value)
+        # one evaluation per leapfrog step.
+        self.objective_evaluations += leapfrog_steps
+
+    def __getattr__(self, name):
+        if name in HMCTrace.fields:
+            return np.array(self._records[name])
+        raise AttributeError(name)
+
+    @property
+    def num_iterations(self):
+        return len(self._records['accepted'])
+
+    @property
+    def num_accepted(self):
+        return int(np.sum(self._records['accepted']))
+
+    @property
+    def num_nan_rejected(self):
+        return int(np.sum(self._records['nan_rejected']))
+
+    @property
+    def num_rejected(self):
+        return self.num_iterations - self.num_accepted
+
+    @property
+    def acceptance_rate(self):
+        return self.num_accepted / max(self.num_iterations, 1)
+
+    @property
+    def overhead_time(self):
+        """The time spent per iteration outside of the objective function."""
+        return self.iteration_time - self.objective_time
+
+    def histogram(self, name, bins=10):
+        """
+        Return a histogram (see np.histogram) of one of the recorded
+        quantities, or of 'overhead_time'.
+        """
+        return np.histogram(getattr(self, name), bins=bins)
+
+    def summary(self):
+        """
+        Return a dictionary of counters and total timings.
+        """
+        return dict(iterations=self.num_iterations,
+                    accepted=self.num_accepted,
+                    rejected=self.num_rejected,
+                    nan_rejected=self.num_nan_rejected,
+                    acceptance_rate=self.acceptance_rate,
+                    objective_evaluations=self.objective_evaluations,
+                    leapfrog_steps=int(np.sum(self._records['leapfrog_steps'])),
+                    objective_time=float(np.sum(self._records['objective_time'])),
+                    iteration_time=float(np.sum(self._records['iteration_time'])),
+                    overhead_time=float(np.sum(self.overhead_time)))
+
+
+class _TimedFunction(object):
+    """
+    Wrap a function, accumulating the time spent in it.
+    """
+    def __init__(self, f):
+        self._f = f
+        self.time = 0.
+
+    def __call__(self, *args):
+        tic = default_timer()
+        result = self._f(*args)
+        self.time += default_timer() - tic
+        return result
+
+
 def sample_HMC(f, num_samples, Lmin, Lmax, epsilon, x0, verbose=False,
                thin=1, burn=0, RNG=np.random.RandomState(0),
-               return_logprobs=False):
+               return_logprobs=False, trace=None, callback=None):
     """
     A straight-forward HMC implementation. The mass matrix is assumed to be the
     identity.
@@ -40,6 +144,13 @@ def sample_HMC(f, num_samples, Lmin, Lmax, epsilon, x0, verbose=False,
     - burn is an integer which specifies how many initial samples to discard.
     - RNG is a random number generator
     - return_logprobs is a boolean indicating whether to return the log densities alongside the samples.
+    - trace (optional) is an HMCTrace object, in which per-iteration timings
+      and accept/reject decisions are recorded.
+    - callback (optional) is a function which is called after every
+      iteration as callback(t, x, record), where record is a dictionary
+      containing the same quantities as are recorded in an HMCTrace, and the
+      current log density 'logprob'. x is a copy of the current state, which
+      the callback may keep.
 
     The total number of iterations is given by
 
@@ -49,33 +160,51 @@ def sample_HMC(f, num_samples, Lmin, Lmax, epsilon, x0, verbose=False,
 
     The leafrog (Verlet) integrator works by picking a random number of steps
     uniformly between Lmin and Lmax, and taking steps of length epsilon.
+
+    The chain runs in a fixed set of work buffers: the burn-in iterations
+    share the main loop (they are simply not recorded), and the current and
+    proposed states are swapped on acceptance rather than copied.
     """
+    D = x0.size
 
+    # the outputs. Only these grow with num_samples.
+    samples = np.empty((num_samples, D))
     # an array to store the logprobs in (even if the user doesn't want them)
     logprob_track = np.empty(num_samples)
 
-    # burn some samples if needed.
-    if burn > 0:
-        if verbose:
-            print("burn-in sampling started")
-        samples = sample_HMC(f, num_samples=burn, Lmin=Lmin, Lmax=Lmax,
-                             epsilon=epsilon, x0=x0,
-                             verbose=verbose, thin=1, burn=0, RNG=RNG)
-        if verbose:
-            print("burn-in sampling ended")
-        x0 = samples[-1]
+    # work buffers for the current and proposed states, the momentum, and a
+    # scratch vector for the leapfrog updates.
+    x = np.array(x0, dtype=np.float64).reshape(D)
+    x_prop = np.empty(D)
+    grad = np.empty(D)
+    grad_prop = np.empty(D)
+    p = np.empty(D)
+    step = np.empty(D)
 
-    D = x0.size
-    samples = np.zeros((num_samples, D))
-    samples[0] = x0.copy()
-    x = x0.copy()
-    logprob, grad = f(x0)
-    logprob, grad = -logprob, -grad
-    logprob_track[0] = logprob
+    # timing is only done if someone is listening.
+    instrument = trace is not None or callback is not None
+    if instrument:
+        f = _TimedFunction(f)
+
+    logprob, g = f(x)
+    logprob = -logprob
+    np.negative(g, out=grad)  # never hold on to an array owned by f
+
+    if burn > 0 and verbose:
+        print("burn-in sampling started")
+    if burn == 0:
+        samples[0] = x
+        logprob_track[0] = logprob
 
     accept_count_batch = 0
 
-    for t in range(1, num_samples * thin):
+    for t in range(1, burn + num_samples * thin):
+
+        if instrument:
+            tic, objective_time = default_timer(), f.time
+
+        if verbose and t == burn:
+            print("burn-in sampling ended")
 
         # Output acceptance rate every 100 iterations
         if(((t+1) % 100) == 0):
@@ -84,49 +213,332 @@ def sample_HMC(f, num_samples, Lmin, Lmax, epsilon, x0, verbose=False,
                       "\t Acc Rate: ", 1. * accept_count_batch, "%")
             accept_count_batch = 0
 
-        # make a copy of the old state.
-        x_old, logprob_old, grad_old = x.copy(), logprob, grad.copy()
+        # the proposal starts from the current state.
+        np.copyto(x_prop, x)
+        logprob_prop = logprob
         p_old = RNG.randn(D)
+        kinetic_old = 0.5 * p_old.dot(p_old)
 
         # Standard HMC - begin leapfrogging
         premature_reject = False
-        p = p_old + 0.5 * epsilon * grad
+        accepted = False
+        num_steps = 0
+        np.multiply(grad, 0.5 * epsilon, out=p)
+        p += p_old
+        g_prop = grad
         for l in range(RNG.randint(Lmin, Lmax)):
-            x += epsilon * p
-            logprob, grad = f(x)
-            logprob, grad = -logprob, -grad
-            if np.any(np.isnan(grad)):  # pragma: no cover
+            num_steps += 1
+            np.multiply(p, epsilon, out=step)
+            x_prop += step
+            logprob_prop, g = f(x_prop)
+            logprob_prop = -logprob_prop
+            np.negative(g, out=grad_prop)
+            g_prop = grad_prop
+            if np.isnan(np.sum(g_prop)):  # pragma: no cover
                 premature_reject = True
                 break
-            p += epsilon * grad
-        p -= 0.5*epsilon * grad
+            np.multiply(g_prop, epsilon, out=step)
+            p += step
+        np.multiply(g_prop, 0.5 * epsilon, out=step)
+        p -= step
         # leapfrogging done
 
         # reject the proposal if there are numerical errors.
         if premature_reject:  # pragma: no cover
             print("warning: numerical instability.\
                   Rejecting this proposal prematurely")
-            x, logprob, grad = x_old, logprob_old, grad_old
-            if t % thin == 0:
-                samples[t // thin] = x_old
-                logprob_track[t // thin] = logprob_old
-            continue
-
-        # work out whether to accept the proposal
-        log_accept_ratio = logprob - 0.5 * p.dot(p) -\
-            logprob_old + 0.5 * p_old.dot(p_old)
-        logu = np.log(RNG.rand())
-
-        if logu < log_accept_ratio:  # accept
-            if t % thin == 0:
-                samples[t // thin] = x
-                logprob_track[t // thin] = logprob
-            accept_count_batch += 1
-        else:  # reject
-            if t % thin == 0:
-                samples[t // thin] = x_old
-                logprob_track[t // thin] = logprob_old
-            x, logprob, grad = x_old, logprob_old, grad_old
+        else:
+            # work out whether to accept the proposal
+            log_accept_ratio = logprob_prop - 0.5 * p.dot(p) -\
+                logprob + kinetic_old
+            logu = np.log(RNG.rand())
+
+            if logu < log_accept_ratio:  # accept: swap the buffers
+                x, x_prop = x_prop, x
+                if g_prop is grad_prop:
+                    grad, grad_prop = grad_prop, grad
+                logprob = logprob_prop
+                accept_count_batch += 1
+                accepted = True
+
+        # record the state of the chain once we're past the burn-in
+        if t >= burn and (t - burn) % thin == 0:
+            samples[(t - burn) // thin] = x
+            logprob_track[(t - burn) // thin] = logprob
+
+        if instrument:
+            record = dict(leapfrog_steps=num_steps, accepted=accepted, nan_rejected=premature_reject,
+                          objective_time=f.time - objective_time, iteration_time=default_timer() - tic)
+            if trace is not None:
+                trace.record(**record)
+            if callback is not None:
+                record['logprob'] = logprob
+                callback(t, x.copy(), record)
+
+    if return_logprobs:
+        return samples, logprob_track
+    else:
+        return samples
+
+
+def elliptical_slice(x, loglik, cur_loglik, RNG=np.random.RandomState(0)):
+    """
+    A single elliptical slice sampling update, as described in
+
+      Murray, Adams and MacKay. Elliptical slice sampling. AISTATS 2010.
+
+    The variable x is assumed to have a N(0, I) prior, and loglik is a
+    python function returning the log likelihood (the log density, minus the
+    log prior of x, up to a constant)
+
+      loglik(x) = log L(x)
+
+    - x is the current state.
+    - cur_loglik is loglik(x), so that it need not be recomputed.
+    - RNG is a random number generator.
+
+    The update needs no tuning and no gradients. It returns the new state and
+    its log likelihood.
+    """
+    nu = RNG.randn(*x.shape)
+    log_y = cur_loglik + np.log(RNG.rand())
+
+    # draw an initial proposal, and define a bracket around it.
+    theta = RNG.uniform(0., 2. * np.pi)
+    theta_min, theta_max = theta - 2. * np.pi, theta
+    while True:
+        x_prop = x * np.cos(theta) + nu * np.sin(theta)
+        loglik_prop = loglik(x_prop)
+        if loglik_prop > log_y:
+            return x_prop, loglik_prop
+        # shrink the bracket towards the current state (theta = 0) and retry.
+        if theta < 0.:
+            theta_min = theta
+        else:
+            theta_max = theta
+        theta = RNG.uniform(theta_min, theta_max)
+
+
+def sample_ESS_HMC(f, loglik, num_samples, Lmin, Lmax, epsilon, x0, latent,
+                   verbose=False, thin=1, burn=0, RNG=np.random.RandomState(0),
+                   return_logprobs=False):
+    """
+    A Gibbs sampler which alternates elliptical slice sampling updates of a
+    block of latent variables with an N(0, I) prior with HMC updates of the
+    remaining variables.
+
+    f is a python function that returns the energy and its gradient (see
+    sample_HMC), and loglik is a python function returning the log
+    likelihood of the latent block, i.e. -E(x) minus the log prior of
+    x[latent], up to a constant. loglik is only evaluated, never
+    differentiated.
+
+    - latent is an integer array indexing the latent block in x.
+    - num_samples, Lmin, Lmax, epsilon, x0, verbose, thin, burn, RNG and
+      return_logprobs are as in sample_HMC.
+
+    Each iteration consists of one elliptical slice update of x[latent]
+    followed by one HMC transition of the other elements of x. The return
+    shape is always num_samples x D.
+    """
+    D = x0.size
+    latent = np.asarray(latent, dtype=np.int64)
+    others = np.setdiff1d(np.arange(D), latent)
+
+    samples = np.empty((num_samples, D))
+    logprob_track = np.empty(num_samples)
+
+    x = np.array(x0, dtype=np.float64).reshape(D)
+    logprob = -f(x)[0]
+    cur_loglik = loglik(x)
+
+    def latent_loglik(v):
+        x_prop = x.copy()
+        x_prop[latent] = v
+        return loglik(x_prop)
+
+    def other_energy(h):
+        x_prop = x.copy()
+        x_prop[others] = h
+        E, grad = f(x_prop)
+        return E, grad[others]
+
+    if burn > 0 and verbose:
+        print("burn-in sampling started")
+    if burn == 0:
+        samples[0] = x
+        logprob_track[0] = logprob
+
+    for t in range(1, burn + num_samples * thin):
+
+        if verbose and t == burn:
+            print("burn-in sampling ended")
+        if verbose and ((t+1) % 100) == 0:
+            print("Iteration: ", t+1)
+
+        # elliptical slice update of the latent block
+        x[latent], cur_loglik = elliptical_slice(x[latent], latent_loglik, cur_loglik, RNG)
+
+        # one HMC transition on the remaining variables.
+        if others.size > 0:
+            hs, logprobs = sample_HMC(other_energy, 2, Lmin, Lmax, epsilon, x[others],
+                                      RNG=RNG, return_logprobs=True)
+            if np.any(hs[1] != x[others]):
+                x[others] = hs[1]
+                cur_loglik = loglik(x)
+            logprob = logprobs[1]
+        elif return_logprobs:
+            logprob = -f(x)[0]
+
+        if t >= burn and (t - burn) % thin == 0:
+            samples[(t - burn) // thin] = x
+            logprob_track[(t - burn) // thin] = logprob
+
+    if return_logprobs:
+        return samples, logprob_track
+    else:
+        return samples
+
+
+def polynomial_decay(a, b=1., gamma=0.55):
+    """
+    A step size schedule for stochastic gradient MCMC,
+
+      epsilon_t = a * (b + t) ** -gamma
+
+    as suggested by Welling and Teh (2011). gamma should lie in (0.5, 1] for
+    the step sizes to satisfy the Robbins-Monro conditions.
+    """
+    return lambda t: a * (b + t) ** -gamma
+
+
+def _step_size(epsilon, t):
+    return epsilon(t) if callable(epsilon) else epsilon
+
+
+def sample_SGLD(f, num_samples, epsilon, x0, verbose=False, thin=1, burn=0,
+                RNG=np.random.RandomState(0), return_logprobs=False):
+    """
+    Stochastic gradient Langevin dynamics, as described in
+
+      Welling and Teh. Bayesian learning via stochastic gradient Langevin
+      dynamics. ICML 2011.
+
+    f is a python function that returns (an unbiased estimate of) the energy
+    and its gradient, for example computed on a minibatch of the data
+
+      f(x) = E(x), dE(x)/dx
+
+    and each iteration takes the step
+
+      x <- x - 0.5 * epsilon * dE(x)/dx + N(0, epsilon I).
+
+    There is no accept/reject step.
+
+    - epsilon is the step size: either a float, or a function of the
+      iteration number (see polynomial_decay).
+    - num_samples, x0, verbose, thin, burn, RNG and return_logprobs are as in
+      sample_HMC. The tracked log probabilities are the (stochastic) values
+      of -E(x).
+
+    The return shape is always num_samples x D.
+    """
+    D = x0.size
+    samples = np.empty((num_samples, D))
+    logprob_track = np.empty(num_samples)
+
+    x = np.array(x0, dtype=np.float64).reshape(D)
+    step = np.empty(D)
+    logprob, g = f(x)
+    logprob = -logprob
+
+    if burn == 0:
+        samples[0] = x
+        logprob_track[0] = logprob
+
+    for t in range(1, burn + num_samples * thin):
+        eps = _step_size(epsilon, t)
+        if verbose and ((t+1) % 100) == 0:
+            print("Iteration: ", t+1, "\t Step size: ", eps)
+
+        np.multiply(g, -0.5 * eps, out=step)
+        step += np.sqrt(eps) * RNG.randn(D)
+        x += step
+        E, g = f(x)
+        if np.isnan(np.sum(g)):  # pragma: no cover
+            raise ValueError("numerical instability in SGLD: try a smaller step size.")
+        logprob = -E
+
+        if t >= burn and (t - burn) % thin == 0:
+            samples[(t - burn) // thin] = x
+            logprob_track[(t - burn) // thin] = logprob
+
+    if return_logprobs:
+        return samples, logprob_track
+    else:
+        return samples
+
+
+def sample_SGHMC(f, num_samples, epsilon, x0, friction=0.1, verbose=False, thin=1,
+                 burn=0, RNG=np.random.RandomState(0), return_logprobs=False):
+    """
+    Stochastic gradient Hamiltonian Monte Carlo, as described in
+
+      Chen, Fox and Guestrin. Stochastic gradient Hamiltonian Monte Carlo.
+      ICML 2014.
+
+    f is a python function that returns (an unbiased estimate of) the energy
+    and its gradient (see sample_SGLD). Each iteration updates a velocity v
+    and the position x by
+
+      v <- (1 - friction) * v - epsilon * dE(x)/dx + N(0, 2 * friction * epsilon I)
+      x <- x + v
+
+    where epsilon plays the role of a learning rate. There is no
+    accept/reject step, and the velocity is not resampled.
+
+    - epsilon is the learning rate: either a float, or a function of the
+      iteration number (see polynomial_decay).
+    - friction is the momentum decay per iteration, in (0, 1].
+    - num_samples, x0, verbose, thin, burn, RNG and return_logprobs are as in
+      sample_HMC. The tracked log probabilities are the (stochastic) values
+      of -E(x).
+
+    The return shape is always num_samples x D.
+    """
+    D = x0.size
+    samples = np.empty((num_samples, D))
+    logprob_track = np.empty(num_samples)
+
+    x = np.array(x0, dtype=np.float64).reshape(D)
+    v = np.zeros(D)
+    step = np.empty(D)
+    logprob, g = f(x)
+    logprob = -logprob
+
+    if burn == 0:
+        samples[0] = x
+        logprob_track[0] = logprob
+
+    for t in range(1, burn + num_samples * thin):
+        eps = _step_size(epsilon, t)
+        if verbose and ((t+1) % 100) == 0:
+            print("Iteration: ", t+1, "\t Learning rate: ", eps)
+
+        v *= 1. - friction
+        np.multiply(g, eps, out=step)
+        v -= step
+        v += np.sqrt(2. * friction * eps) * RNG.randn(D)
+        x += v
+        E, g = f(x)
+        if np.isnan(np.sum(g)):  # pragma: no cover
+            raise ValueError("numerical instability in SGHMC: try a smaller learning rate.")
+        logprob = -E
+
+        if t >= burn and (t - burn) % thin == 0:
+            samples[(t - burn) // thin] = x
+            logprob_track[(t - burn) // thin] = logprob
+
     if return_logprobs:
         return samples, logprob_track
     else:
@@ -0,0 +1,212 @@
+# Copyright 2017 the GPflow authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Iterative (Krylov subspace) methods for symmetric positive definite
+matrices which are only accessed through matrix-vector products.
+
+The functions here take a `matvec` function, which computes K V for an
+N x P matrix V, so K is never formed.
+"""
+
+from __future__ import absolute_import
+import numpy as np
+import tensorflow as tf
+from ._settings import settings
+float_type = settings.dtypes.float_type
+
+_tiny = 1e-300 if float_type is tf.float64 else 1e-30
+
+
+def conjugate_gradient(matvec, B, max_iterations, tolerance=1e-6, preconditioner=None):
+    """
+    Solve K X = B by the method of conjugate gradients, for all the columns
+    of B at once. The iterations stop when the residual of every column,
+    relative to the norm of that column of B, is below `tolerance`, or after
+    `max_iterations` iterations.
+
+    If given, preconditioner is a function which computes P^{-1} V for a
+    matrix P close to K, which reduces the number of iterations.
+    """
+    if preconditioner is None:
+        preconditioner = tf.identity
+    B_norm = tf.sqrt(tf.reduce_sum(tf.square(B), 0))
+
+    def cond(i, X, R, P, rz):
+        residual = tf.sqrt(tf.reduce_sum(tf.square(R), 0))
+        return tf.logical_and(i < max_iterations, tf.reduce_max(residual / tf.maximum(B_norm, _tiny)) > tolerance)
+
+    def body(i, X, R, P, rz):
+        KP = matvec(P)
+        a = rz / tf.maximum(tf.reduce_sum(P * KP, 0), _tiny)
+        X = X + a * P
+        R = R - a * KP
+        Z = preconditioner(R)
+        rz_new = tf.reduce_sum(R * Z, 0)
+        P = Z + rz_new / tf.maximum(rz, _tiny) * P
+        return i + 1, X, R, P, rz_new
+
+    Z = preconditioner(B)
+    rz = tf.reduce_sum(B * Z, 0)
+    _, X, _, _, _ = tf.while_loop(cond, body, [tf.constant(0), tf.zeros_like(B), B, Z, rz])
+    return X
+
+
+def pivoted_cholesky(diag, column, rank):
+    """
+    The partial pivoted Cholesky decomposition of an N x N positive
+    definite matrix K, given its diagonal and a function column(i) which
+    computes its i-th column: an N x rank matrix L with K ~ L L^T, which
+    is exact on the `rank` pivots chosen greedily as the largest remaining
+    diagonal elements. The cost is O(N rank^2), plus `rank` columns of K.
+    See
+
+    Harbrecht, H., Peters, M. and Schneider, R. On the low-rank
+    approximation by the pivoted Cholesky decomposition. Applied Numerical
+    Mathematics, 2012.
+    """
+    d = diag
+    columns = []
+    for _ in range(rank):
+        i = tf.cast(tf.argmax(d, 0), tf.int32)
+        c = column(i)
+        if columns:
+            L = tf.pack(columns, 1)
+            c = c - tf.reshape(tf.matmul(L, tf.expand_dims(tf.gather(L, i), 1)), [-1])
+        c = c / tf.sqrt(tf.maximum(tf.gather(d, i), _tiny))
+        d = d - tf.square(c)
+        columns.append(c)
+    return tf.pack(columns, 1)
+
+
+class LowRankPreconditioner(object):
+    """
+    The preconditioner P = L L^T + s I, for an N x r matrix L (e.g. from
+    pivoted_cholesky) and a noise variance s. With L^T L = V diag(e) V^T,
+
+        P^{-1}   = s^{-1} I - L V diag(1 / (s (s + e))) V^T L^T
+        P^{-1/2} = s^{-1/2} I - L V diag(g) V^T L^T
+
+    with g = 1 / (sqrt(s (s + e)) (sqrt(s) + sqrt(s + e))), which are
+    applied in O(N r) per column.
+    """
+    def __init__(self, L, s):
+        self.L = L
+        self.s = tf.reshape(s, [])
+        e, self.V = tf.self_adjoint_eig(tf.matmul(L, L, transpose_a=True))
+        self.e = tf.maximum(e, 0.)
+        self.LV = tf.matmul(L, self.V)
+
+    def _apply(self, B, scale, g):
+        return scale * B - tf.matmul(self.LV, tf.expand_dims(g, 1) * tf.matmul(self.LV, B, transpose_a=True))
+
+    def solve(self, B):
+        return self._apply(B, 1. / self.s, 1. / (self.s * (self.s + self.e)))
+
+    def inv_sqrt_matmul(self, B):
+        root_s, root_se = tf.sqrt(self.s), tf.sqrt(self.s + self.e)
+        return self._apply(B, 1. / root_s, 1. / (root_s * root_se * (root_s + root_se)))
+
+    def logdet(self):
+        N, r = tf.shape(self.L)[0], tf.shape(self.L)[1]
+        return tf.cast(N - r, float_type) * tf.log(self.s) + tf.reduce_sum(tf.log(self.s + self.e))
+
+
+def lanczos(matvec, Z, num_iterations):
+    """
+    Run `num_iterations` steps of the Lanczos algorithm from each of the
+    columns of Z. Returns the diagonals (num_iterations x P) and the
+    off-diagonals (num_iterations - 1 x P) of the tridiagonal matrices.
+    """
+    def body(i, q, q_prev, beta_prev, alphas, betas):
+        v = matvec(q) - beta_prev * q_prev
+        alpha = tf.reduce_sum(q * v, 0)
+        v = v - alpha * q
+        beta = tf.sqrt(tf.reduce_sum(tf.square(v), 0))
+        q_next = v / tf.maximum(beta, _tiny)
+        return i + 1, q_next, q, beta, alphas.write(i, alpha), betas.write(i, beta)
+
+    q = Z / tf.sqrt(tf.reduce_sum(tf.square(Z), 0))
+    alphas = tf.TensorArray(float_type, size=num_iterations)
+    betas = tf.TensorArray(float_type, size=num_iterations)
+    _, _, _, _, alphas, betas = tf.while_loop(
+        lambda i, *args: i < num_iterations, body,
+        [tf.constant(0), q, tf.zeros_like(q), tf.zeros_like(q[0]), alphas, betas])
+    return alphas.pack(), betas.pack()[:-1]
+
+
+def stochastic_logdet(matvec, Z, num_iterations):
+    """
+    Estimate log det K by stochastic Lanczos quadrature, using the columns
+    of Z (e.g. Rademacher vectors) as probes:
+
+        log det K = E[z^T log(K) z] ~ 1/P sum_p |z_p|^2 sum_k tau_pk^2 log(theta_pk)
+
+    where theta_pk are the eigenvalues of the Lanczos tridiagonal matrix of
+    the p-th probe, and tau_pk the first elements of its eigenvectors. See
+
+    Ubaru, S., Chen, J. and Saad, Y. Fast estimation of tr(f(A)) via
+    stochastic Lanczos quadrature. SIAM Journal on Matrix Analysis and
+    Applications, 2017.
+    """
+    alphas, betas = lanczos(matvec, Z, num_iterations)
+    off = tf.pad(tf.matrix_diag(tf.transpose(betas)), [[0, 0], [1, 0], [0, 1]])
+    T = tf.matrix_diag(tf.transpose(alphas)) + off + tf.transpose(off, [0, 2, 1])
+    theta, V = tf.self_adjoint_eig(T)
+    tau = V[:, 0, :]
+    quad = tf.reduce_sum(tf.square(tau) * tf.log(tf.maximum(theta, _tiny)), 1)
+    return tf.reduce_mean(tf.reduce_sum(tf.square(Z), 0) * quad)
+
+
+def gaussian_log_density(matvec, Y, Z, max_iterations, tolerance=1e-6, lanczos_iterations=30,
+                         preconditioner=None):
+    """
+    Compute log N(Y | 0, K) for each of the columns of Y, summed, using
+    conjugate gradients for the quadratic term and stochastic Lanczos
+    quadrature (with the probes Z) for the log determinant.
+
+    The solves are not differentiated through. Instead, the result is a
+    surrogate with the right value and the right gradients (stochastic ones
+    for the log determinant): with alpha = K^{-1} Y and U = K^{-1} Z held
+    fixed,
+
+        d/dK (2 alpha^T Y - alpha^T K alpha) = -alpha alpha^T
+        d/dK 1/P tr(U^T K Z)                 ~ K^{-1}
+
+    which are the gradients of Y^T K^{-1} Y and log det K respectively.
+
+    If a preconditioner P is given (see LowRankPreconditioner), the solves
+    are preconditioned, and the log determinant is estimated as
+    log det P + log det(P^{-1/2} K P^{-1/2}), whose second term has a
+    smaller variance when P is close to K.
+    """
+    R = tf.shape(Y)[1]
+    solve = conjugate_gradient(matvec, tf.concat(1, [Y, Z]), max_iterations, tolerance,
+                               preconditioner.solve if preconditioner is not None else None)
+    solve = tf.stop_gradient(solve)
+    alpha, U = solve[:, :R], solve[:, R:]
+    KV = matvec(tf.concat(1, [alpha, Z]))
+    quad = 2 * tf.reduce_sum(alpha * Y) - tf.reduce_sum(alpha * KV[:, :R])
+    trace = tf.reduce_sum(U * KV[:, R:]) / tf.cast(tf.shape(Z)[1], float_type)
+    if preconditioner is None:
+        logdet = stochastic_logdet(matvec, Z, lanczos_iterations)
+    else:
+        W = preconditioner.inv_sqrt_matmul
+        logdet = preconditioner.logdet() + stochastic_logdet(lambda V: W(matvec(W(V))), Z, lanczos_iterations)
+    logdet = tf.stop_gradient(logdet) + trace - tf.stop_gradient(trace)
+
+    num_data = tf.cast(tf.shape(Y)[0], float_type)
+    num_columns = tf.cast(R, float_type)
+    return -0.5 * num_data * num_columns * np.log(2 * np.pi) - 0.5 * num_columns * logdet - 0.5 * quad
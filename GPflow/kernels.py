@@ -15,13 +15,15 @@
 
 from __future__ import print_function, absolute_import
 from functools import reduce
-import itertools
+from collections import OrderedDict
 import warnings
 
 import tensorflow as tf
 import numpy as np
+from scipy import stats
 from .param import Param, Parameterized, AutoFlow
-from . import transforms
+from . import transforms, quadrature
+from .linear_operators import Dense, Diagonal, LowRank, Sum
 from ._settings import settings
 
 float_type = settings.dtypes.float_type
@@ -30,9 +32,7 @@ np_float_type = np.float32 if float_type is tf.float32 else np.float64
 
 
 def hermgauss(n):
-    x, w = np.polynomial.hermite.hermgauss(n)
-    x, w = x.astype(np_float_type), w.astype(np_float_type)
-    return x, w
+    return quadrature.hermgauss(n)
 
 
 def mvhermgauss(means, covs, H, D):
@@ -45,14 +45,70 @@ def mvhermgauss(means, covs, H, D):
     :return: eval_locations (H**D*NxD), weights (H**D)
     """
     N = tf.shape(means)[0]
-    gh_x, gh_w = hermgauss(H)
-    xn = np.array(list(itertools.product(*(gh_x,) * D)))  # H**DxD
-    wn = np.prod(np.array(list(itertools.product(*(gh_w,) * D))), 1)  # H**D
+    xn, wn = quadrature.gauss_hermite(H, D)  # H**DxD, H**D
     cholXcov = tf.cholesky(covs)  # NxDxD
-    X = 2.0 ** 0.5 * tf.batch_matmul(cholXcov, tf.tile(xn[None, :, :], (N, 1, 1)),
-                                     adj_y=True) + tf.expand_dims(means, 2)  # NxDxH**D
+    X = tf.batch_matmul(cholXcov, tf.tile(xn[None, :, :], (N, 1, 1)),
+                        adj_y=True) + tf.expand_dims(means, 2)  # NxDxH**D
     Xr = tf.reshape(tf.transpose(X, [2, 0, 1]), (-1, D))  # (H**D*N)xD
-    return Xr, wn * np.pi ** (-D * 0.5)
+    return Xr, wn
+
+
+def _square_dist(X, X2):
+    """
+    The squared Euclidean distance between the rows of X and X2 (or X, if
+    X2 is None).
+    """
+    Xs = tf.reduce_sum(tf.square(X), 1)
+    if X2 is None:
+        return -2 * tf.matmul(X, tf.transpose(X)) + \
+               tf.reshape(Xs, (-1, 1)) + tf.reshape(Xs, (1, -1))
+    else:
+        X2s = tf.reduce_sum(tf.square(X2), 1)
+        return -2 * tf.matmul(X, tf.transpose(X2)) + \
+               tf.reshape(Xs, (-1, 1)) + tf.reshape(X2s, (1, -1))
+
+
+def _euclid_dist(r2):
+    return tf.sqrt(r2 + 1e-12)
+
+
+def _symmetric(K, X, depth=None):
+    """
+    Compute the symmetric matrix K(X, None) from its lower triangle. X is
+    split in two halves: the off-diagonal block K(X2, X1) is computed once
+    and mirrored, and the diagonal blocks are computed in the same way,
+    `depth` times (settings.numerics.kern_symmetric_depth by default). This
+    does a fraction 1/2 + 1/2^(depth+1) of the work (and gradient
+    computation) of K(X, X).
+    """
+    if depth is None:
+        depth = settings.numerics.kern_symmetric_depth
+    if depth <= 0:
+        return K(X, None)
+    half = tf.shape(X)[0] // 2
+    X1 = tf.slice(X, [0, 0], tf.pack([half, -1]))
+    X2 = tf.slice(X, tf.pack([half, 0]), [-1, -1])
+    K21 = K(X2, X1)
+    K11 = _symmetric(K, X1, depth - 1)
+    K22 = _symmetric(K, X2, depth - 1)
+    K = tf.concat(0, [tf.concat(1, [K11, tf.transpose(K21)]),
+                      tf.concat(1, [K21, K22])])
+    K.set_shape(X.get_shape()[:1].concatenate(X.get_shape()[:1]))
+    return K
+
+
+def _slice_rows(A, start, size):
+    """
+    The rows start to start + size of A, of any rank.
+    """
+    ndims = A.get_shape().ndims
+    if ndims is None:
+        rest = tf.rank(A) - 1
+        return tf.slice(A, tf.concat(0, [tf.pack([start]), tf.zeros(tf.pack([rest]), tf.int32)]),
+                        tf.concat(0, [tf.pack([size]), -tf.ones(tf.pack([rest]), tf.int32)]))
+    rows = tf.slice(A, tf.pack([start] + [0] * (ndims - 1)), tf.pack([size] + [-1] * (ndims - 1)))
+    rows.set_shape([None] + A.get_shape().as_list()[1:])
+    return rows
 
 
 class Kern(Parameterized):
@@ -135,6 +191,112 @@ class Kern(Parameterized):
                              tf.concat(0, [cov_shape[:-2], [len(self.active_dims), len(self.active_dims)]]))
         return cov
 
+    def K_blocked(self, X, X2=None, block_size=None):
+        """
+        Compute the covariance matrix K(X, X2) in square tiles of
+        block_size x block_size, so that the temporaries created by the
+        kernel computation are only ever the size of a tile, and only the
+        output is held in full. If X2 is None, the tiles on the diagonal are
+        computed with K(Xi), so that kernels like White are handled correctly.
+
+        If block_size is None, it is chosen so that a tile fits in the memory
+        budget settings.numerics.kern_block_memory (in MB). If the budget is
+        zero, K is computed in one go.
+        """
+        block_size = self._block_size(block_size)
+        if block_size is None:
+            return self.K(X, X2)
+
+        symmetric = X2 is None
+        if symmetric:
+            X2 = X
+        N, M = tf.shape(X)[0], tf.shape(X2)[0]
+
+        def num_blocks(n):
+            return (n + block_size - 1) // block_size
+
+        def block(A, i, n):
+            start = i * block_size
+            return tf.slice(A, tf.pack([start, 0]), tf.pack([tf.minimum(block_size, n - start), -1]))
+
+        def row(i, rows):
+            Xi = block(X, i, N)
+
+            def column(j, columns):
+                Xj = block(X2, j, M)
+                if symmetric:
+                    Kij = tf.cond(tf.equal(i, j), lambda: self.K(Xi), lambda: self.K(Xi, Xj))
+                else:
+                    Kij = self.K(Xi, Xj)
+                # the tiles of a row are stacked along the first axis, so store them transposed
+                return j + 1, columns.write(j, tf.transpose(Kij))
+
+            columns = tf.TensorArray(float_type, size=num_blocks(M), infer_shape=False)
+            _, columns = tf.while_loop(lambda j, _: j < num_blocks(M), column, [tf.constant(0), columns])
+            return i + 1, rows.write(i, tf.transpose(columns.concat()))
+
+        rows = tf.TensorArray(float_type, size=num_blocks(N), infer_shape=False)
+        _, rows = tf.while_loop(lambda i, _: i < num_blocks(N), row, [tf.constant(0), rows])
+        return rows.concat()
+
+    def K_matmul(self, X, V, block_size=None):
+        """
+        Compute K(X) V, where V is N x P, without holding K(X): the tiles of
+        K are computed as in K_blocked, multiplied by the rows of V and
+        discarded, so the memory used is that of a tile and of the result.
+
+        The loops keep the tiles for the backward pass if the product is
+        differentiated. They are allowed to swap to the host memory.
+        """
+        block_size = self._block_size(block_size)
+        if block_size is None:
+            return tf.matmul(self.K(X), V)
+
+        N = tf.shape(X)[0]
+        num_blocks = (N + block_size - 1) // block_size
+
+        def block(A, i):
+            start = i * block_size
+            return tf.slice(A, tf.pack([start, 0]), tf.pack([tf.minimum(block_size, N - start), -1]))
+
+        def row(i, rows):
+            Xi = block(X, i)
+
+            def column(j, KVi):
+                Xj = block(X, j)
+                Kij = tf.cond(tf.equal(i, j), lambda: self.K(Xi), lambda: self.K(Xi, Xj))
+                return j + 1, KVi + tf.matmul(Kij, block(V, j))
+
+            KVi = tf.zeros(tf.pack([tf.shape(Xi)[0], tf.shape(V)[1]]), float_type)
+            _, KVi = tf.while_loop(lambda j, _: j < num_blocks, column, [tf.constant(0), KVi], swap_memory=True)
+            return i + 1, rows.write(i, KVi)
+
+        rows = tf.TensorArray(float_type, size=num_blocks, infer_shape=False)
+        _, rows = tf.while_loop(lambda i, _: i < num_blocks, row, [tf.constant(0), rows], swap_memory=True)
+        return rows.concat()
+
+    def _block_size(self, block_size):
+        """
+        The size of the tiles for K_blocked and K_matmul: block_size if it is
+        given, otherwise the largest that fits in the memory budget
+        settings.numerics.kern_block_memory (in MB), or None if the budget
+        is zero.
+        """
+        if block_size is None:
+            memory = settings.numerics.kern_block_memory
+            if memory <= 0:
+                return None
+            block_size = int(np.sqrt(memory * 2 ** 20 / np.dtype(np_float_type).itemsize))
+        return max(int(block_size), 1)
+
+    def K_operator(self, X):
+        """
+        The covariance matrix K(X) as a linear operator (see
+        GPflow.linear_operators), so that models can solve with it using its
+        structure. By default, the matrix is dense.
+        """
+        return Dense(self.K(X))
+
     def __add__(self, other):
         return Add([self, other])
 
@@ -143,11 +305,11 @@ class Kern(Parameterized):
 
     @AutoFlow((float_type, [None, None]), (float_type, [None, None]))
     def compute_K(self, X, Z):
-        return self.K(X, Z)
+        return self.K_blocked(X, Z)
 
     @AutoFlow((float_type, [None, None]))
     def compute_K_symm(self, X):
-        return self.K(X)
+        return self.K_blocked(X)
 
     @AutoFlow((float_type, [None, None]))
     def compute_Kdiag(self, X):
@@ -165,17 +327,126 @@ class Kern(Parameterized):
     def compute_exKxz(self, Z, Xmu, Xcov):
         return self.exKxz(Z, Xmu, Xcov)
 
+    @AutoFlow((float_type, [None, None]), (float_type, [None, None]), (float_type, [None, None, None, None]))
+    def compute_sum_exKxz(self, Z, Xmu, Xcov):
+        return self.sum_exKxz(Z, Xmu, Xcov)
+
     @AutoFlow((float_type, [None, None]), (float_type, [None, None]), (float_type,))
     def compute_eKzxKxz(self, Z, Xmu, Xcov):
         return self.eKzxKxz(Z, Xmu, Xcov)
 
-    def _check_quadrature(self):
+    def sum_eKzxKxz(self, Z, Xmu, Xcov):
+        """
+        Computes sum_n <K_zx Kxz>_q(x_n), the psi2 statistic summed over the
+        data, from chunks of the data (see _sum_in_chunks), so that the
+        NxMxM tensor of eKzxKxz is never held in full.
+        :param Z: Fixed inputs (MxD).
+        :param Xmu: X means (NxD).
+        :param Xcov: X covariances (NxDxD or NxD).
+        :return: MxM
+        """
+        M = tf.shape(Z)[0]
+        return self._sum_in_chunks(lambda Xmu, Xcov: tf.reduce_sum(self.eKzxKxz(Z, Xmu, Xcov), 0),
+                                   Xmu, Xcov, tf.pack([M, M]), M * M * self.input_dim ** 2)
+
+    def sum_exKxz(self, Z, Xmu, Xcov):
+        """
+        Computes sum_t <x_{t-1} K_{x_t z}>_q(x), exKxz summed over the
+        sequence, from windows of the sequence (see _sum_in_chunks), so that
+        the TxMxD tensor of exKxz is never held in full.
+        :param Z: Fixed inputs (MxD).
+        :param Xmu: X means (T+1xD).
+        :param Xcov: 2xT+1xDxD, as in exKxz.
+        :return: MxD
+        """
+        M, D = tf.shape(Z)[0], tf.shape(Xmu)[1]
+        return self._sum_in_chunks(lambda Xmu, Xcov: tf.reduce_sum(self.exKxz(Z, Xmu, Xcov), 0),
+                                   Xmu, Xcov, tf.pack([M, D]), M * D * D, sequence=True)
+
+    def _sum_in_chunks(self, fn, Xmu, Xcov, shape, cost, sequence=False):
+        """
+        Computes the sum of fn(Xmu_c, Xcov_c) over chunks of the rows of Xmu
+        and Xcov. The size of the chunks is chosen so that `cost` floats per
+        row fit in settings.numerics.ekern_chunk_memory (in MB); if the
+        budget is zero, fn is applied to all the data at once.
+
+        If sequence is True, Xmu (T+1xD) and Xcov (2xT+1xDxD) describe a
+        sequence of T consecutive pairs, as in exKxz: the chunks are windows
+        of the pairs, and consecutive windows overlap by one time step.
+
+        The chunks are summed in a while loop, which keeps the temporaries
+        of all the chunks for the backward pass; they may be swapped to the
+        host memory.
+        """
+        memory = settings.numerics.ekern_chunk_memory
+        if memory <= 0:
+            return fn(Xmu, Xcov)
+        overlap = 1 if sequence else 0
+        N = tf.shape(Xmu)[0] - overlap
+        chunk = tf.maximum(int(memory * 2 ** 20 / np.dtype(np_float_type).itemsize) // cost, 1)
+        num_chunks = (N + chunk - 1) // chunk
+
+        def body(i, total):
+            start = i * chunk
+            size = tf.minimum(chunk, N - start) + overlap
+            if sequence:
+                Xcov_c = tf.slice(Xcov, tf.pack([0, start, 0, 0]), tf.pack([-1, size, -1, -1]))
+                if Xcov.get_shape().ndims is not None:
+                    Xcov_c.set_shape([2, None] + Xcov.get_shape().as_list()[2:])
+            else:
+                Xcov_c = _slice_rows(Xcov, start, size)
+            return i + 1, total + fn(_slice_rows(Xmu, start, size), Xcov_c)
+
+        _, total = tf.while_loop(lambda i, _: i < num_chunks, body,
+                                 [tf.constant(0), tf.zeros(shape, float_type)], swap_memory=True)
+        return total
+
+    def _check_quadrature(self, message=None):
         if settings.numerics.ekern_quadrature == "warn":
-            warnings.warn("Using numerical quadrature for kernel expectation of %s. Use GPflow.ekernels instead." %
-                          str(type(self)))
+            warnings.warn(message or "Using numerical quadrature for kernel expectation of %s. "
+                                     "Use GPflow.ekernels instead." % str(type(self)))
         if settings.numerics.ekern_quadrature == "error" or self.num_gauss_hermite_points == 0:
             raise RuntimeError("Settings indicate that quadrature may not be used.")
 
+    def _quadrature_sum(self, fn, Xmu, Xcov, D, shape, cost):
+        """
+        Computes sum_p w_p fn(X_p) for the quadrature rule of the settings
+        (see quadrature.rule), where X_p (NxD) are the p-th nodes of the
+        Gaussians N(Xmu[n], Xcov[n]), and fn maps a block of B nodes (BxNxD)
+        to a tensor whose leading dimension is B.
+
+        The nodes are streamed in blocks, whose size is chosen so that `cost`
+        floats per node and row fit in settings.numerics.ekern_chunk_memory
+        (in MB), so the memory does not grow with the number of nodes. If the
+        budget is zero, all the nodes are evaluated at once.
+        """
+        xn, wn = quadrature.rule(self.num_gauss_hermite_points, D)
+        cholXcov = tf.cholesky(Xcov)
+
+        def weighted_sum(xb, wb):
+            F = fn(quadrature.mvnnodes(Xmu, cholXcov, xb))
+            F = tf.reshape(F, tf.pack([tf.shape(F)[0], -1]))
+            return tf.reshape(tf.matmul(tf.expand_dims(wb, 0), F), shape)
+
+        memory = settings.numerics.ekern_chunk_memory
+        if memory <= 0:
+            return weighted_sum(xn, wn)
+        P = len(wn)
+        xn, wn = tf.constant(xn), tf.constant(wn)
+        block = tf.maximum(int(memory * 2 ** 20 / np.dtype(np_float_type).itemsize) // (tf.shape(Xmu)[0] * cost), 1)
+        num_blocks = (P + block - 1) // block
+
+        def body(i, total):
+            start = i * block
+            size = tf.minimum(block, P - start)
+            xb = tf.slice(xn, tf.pack([start, 0]), tf.pack([size, -1]))
+            wb = tf.slice(wn, tf.pack([start]), tf.pack([size]))
+            return i + 1, total + weighted_sum(xb, wb)
+
+        _, total = tf.while_loop(lambda i, _: i < num_blocks, body,
+                                 [tf.constant(0), tf.zeros(shape, float_type)], swap_memory=True)
+        return total
+
     def eKdiag(self, Xmu, Xcov):
         """
         Computes <K_xx>_q(x).
@@ -186,11 +457,19 @@ class Kern(Parameterized):
         self._check_quadrature()
         Xmu, _ = self._slice(Xmu, None)
         Xcov = self._slice_cov(Xcov)
-        X, wn = mvhermgauss(Xmu, Xcov, self.num_gauss_hermite_points, self.input_dim)  # (H**DxNxD, H**D)
-        Kdiag = tf.reshape(self.Kdiag(X, presliced=True),
-                           (self.num_gauss_hermite_points ** self.input_dim, tf.shape(Xmu)[0]))
-        eKdiag = tf.reduce_sum(Kdiag * wn[:, None], 0)
-        return eKdiag  # N
+        N, D = tf.shape(Xmu)[0], self.input_dim
+
+        def Kdiag(X):  # BxNxD -> BxN
+            return tf.reshape(self.Kdiag(tf.reshape(X, (-1, D)), presliced=True), tf.pack([-1, N]))
+        return self._quadrature_sum(Kdiag, Xmu, Xcov, D, tf.pack([N]), D)
+
+    def _quadrature_Kxz(self, Z, N, D):
+        """
+        The function mapping a block of quadrature nodes (BxNxD) to K_xz
+        (BxNxM), for presliced inputs.
+        """
+        M = tf.shape(Z)[0]
+        return lambda X: tf.reshape(self.K(tf.reshape(X, (-1, D)), Z, presliced=True), tf.pack([-1, N, M]))
 
     def eKxz(self, Z, Xmu, Xcov):
         """
@@ -203,13 +482,8 @@ class Kern(Parameterized):
         self._check_quadrature()
         Xmu, Z = self._slice(Xmu, Z)
         Xcov = self._slice_cov(Xcov)
-        N = tf.shape(Xmu)[0]
-        M = tf.shape(Z)[0]
-        HpowD = self.num_gauss_hermite_points ** self.input_dim
-        X, wn = mvhermgauss(Xmu, Xcov, self.num_gauss_hermite_points, self.input_dim)  # (H**DxNxD, H**D)
-        Kxz = tf.reshape(self.K(tf.reshape(X, (-1, self.input_dim)), Z, presliced=True), (HpowD, N, M))
-        eKxz = tf.reduce_sum(Kxz * wn[:, None, None], 0)
-        return eKxz
+        N, M, D = tf.shape(Xmu)[0], tf.shape(Z)[0], self.input_dim
+        return self._quadrature_sum(self._quadrature_Kxz(Z, N, D), Xmu, Xcov, D, tf.pack([N, M]), M * D)
 
     def exKxz(self, Z, Xmu, Xcov):
         """
@@ -231,7 +505,6 @@ class Kern(Parameterized):
         N = tf.shape(Xmu)[0] - 1
         M = tf.shape(Z)[0]
         D = self.input_size if hasattr(self, 'input_size') else self.input_dim  # Number of actual input dimensions
-        Hpow2D = self.num_gauss_hermite_points ** (2 * D)
 
         with tf.control_dependencies([
             tf.assert_equal(tf.shape(Xmu)[1], tf.constant(D, dtype=int_type),
@@ -244,12 +517,11 @@ class Kern(Parameterized):
         fXcovt = tf.concat(2, (Xcov[0, :-1, :, :], Xcov[1, :-1, :, :]))  # NxDx2D
         fXcovb = tf.concat(2, (tf.transpose(Xcov[1, :-1, :, :], (0, 2, 1)), Xcov[0, 1:, :, :]))
         fXcov = tf.concat(1, (fXcovt, fXcovb))  # Confirmed correct
-        X, wn = mvhermgauss(fXmu, fXcov, self.num_gauss_hermite_points, D * 2)  # (H**2DxNx2D, H**2D)
-        Kxz = tf.reshape(self.K(X[:, :D], Z), (Hpow2D, N, M))
-        exKxz = tf.reduce_sum(
-            tf.expand_dims(tf.reshape(X[:, D:], (Hpow2D, N, D)), 2) * tf.expand_dims(Kxz, 3) * wn[:, None, None, None],
-            0)
-        return exKxz
+
+        def xKxz(X):  # BxNx2D -> BxNxMxD
+            Kxz = tf.reshape(self.K(tf.reshape(X[:, :, :D], (-1, D)), Z), tf.pack([-1, N, M]))
+            return tf.expand_dims(X[:, :, D:], 2) * tf.expand_dims(Kxz, 3)
+        return self._quadrature_sum(xKxz, fXmu, fXcov, D * 2, tf.pack([N, M, D]), M * D)
 
     def eKzxKxz(self, Z, Xmu, Xcov):
         """
@@ -262,14 +534,13 @@ class Kern(Parameterized):
         self._check_quadrature()
         Xmu, Z = self._slice(Xmu, Z)
         Xcov = self._slice_cov(Xcov)
-        N = tf.shape(Xmu)[0]
-        M = tf.shape(Z)[0]
-        HpowD = self.num_gauss_hermite_points ** self.input_dim
-        X, wn = mvhermgauss(Xmu, Xcov, self.num_gauss_hermite_points, self.input_dim)  # (H**DxNxD, H**D)
-        Kxz = tf.reshape(self.K(tf.reshape(X, (-1, self.input_dim)), Z, presliced=True), (HpowD, N, M))
-        KzxKxz = tf.expand_dims(Kxz, 3) * tf.expand_dims(Kxz, 2)
-        eKzxKxz = tf.reduce_sum(KzxKxz * wn[:, None, None, None], 0)
-        return eKzxKxz
+        N, M, D = tf.shape(Xmu)[0], tf.shape(Z)[0], self.input_dim
+        Kxz = self._quadrature_Kxz(Z, N, D)
+
+        def KzxKxz(X):  # BxNxD -> BxNxMxM
+            K = Kxz(X)
+            return tf.expand_dims(K, 3) * tf.expand_dims(K, 2)
+        return self._quadrature_sum(KzxKxz, Xmu, Xcov, D, tf.pack([N, M, M]), M * M)
 
 
 class Static(Kern):
@@ -299,6 +570,9 @@ class White(Static):
             shape = tf.pack([tf.shape(X)[0], tf.shape(X2)[0]])
             return tf.zeros(shape, float_type)
 
+    def K_operator(self, X):
+        return Diagonal(self.variance, tf.shape(X)[0])
+
 
 class Constant(Static):
     """
@@ -312,6 +586,9 @@ class Constant(Static):
             shape = tf.pack([tf.shape(X)[0], tf.shape(X2)[0]])
         return tf.fill(shape, tf.squeeze(self.variance))
 
+    def K_operator(self, X):
+        return LowRank(tf.ones(tf.pack([tf.shape(X)[0], 1]), float_type) * tf.sqrt(tf.squeeze(self.variance)))
+
 
 class Bias(Constant):
     """
@@ -362,33 +639,63 @@ class Stationary(Kern):
 
     def square_dist(self, X, X2):
         X = X / self.lengthscales
-        Xs = tf.reduce_sum(tf.square(X), 1)
-        if X2 is None:
-            return -2 * tf.matmul(X, tf.transpose(X)) + \
-                   tf.reshape(Xs, (-1, 1)) + tf.reshape(Xs, (1, -1))
-        else:
+        if X2 is not None:
             X2 = X2 / self.lengthscales
-            X2s = tf.reduce_sum(tf.square(X2), 1)
-            return -2 * tf.matmul(X, tf.transpose(X2)) + \
-                   tf.reshape(Xs, (-1, 1)) + tf.reshape(X2s, (1, -1))
+        return _square_dist(X, X2)
 
     def euclid_dist(self, X, X2):
         r2 = self.square_dist(X, X2)
-        return tf.sqrt(r2 + 1e-12)
+        return _euclid_dist(r2)
 
     def Kdiag(self, X, presliced=False):
         return tf.fill(tf.pack([tf.shape(X)[0]]), tf.squeeze(self.variance))
 
+    def K(self, X, X2=None, presliced=False):
+        if not presliced:
+            X, X2 = self._slice(X, X2)
+        if X2 is None:
+            return _symmetric(lambda A, B: self.K_r2(self.square_dist(A, B)), X)
+        return self.K_r2(self.square_dist(X, X2))
+
+    def K_r2(self, r2):
+        """
+        The kernel as a function of the scaled squared distance
+            r2 = sum_d (x_d - x'_d)^2 / l_d^2 .
+        Inheriting classes must implement this.
+        """
+        raise NotImplementedError
+
+    def spectral_frequencies(self, U):
+        """
+        Map the points U, uniform on the unit cube of dimension
+        input_dim + 1 (one per row), to samples from the spectral density of
+        the kernel with unit lengthscales, normalised to a probability
+        density. Used by RandomFourierFeatures; kernels whose spectral
+        density is known implement this.
+        """
+        raise NotImplementedError
+
+
+def _student_t_frequencies(U, nu):
+    """
+    Samples from the spectral density of a Matern kernel of order nu: a
+    multivariate Student-t with 2 nu degrees of freedom.
+    """
+    z = stats.norm.ppf(U[:, :-1])
+    g = stats.chi2.ppf(U[:, -1], 2 * nu)
+    return z * np.sqrt(2 * nu / g)[:, None]
+
 
 class RBF(Stationary):
     """
     The radial basis function (RBF) or squared exponential kernel
     """
 
-    def K(self, X, X2=None, presliced=False):
-        if not presliced:
-            X, X2 = self._slice(X, X2)
-        return self.variance * tf.exp(-self.square_dist(X, X2) / 2)
+    def K_r2(self, r2):
+        return self.variance * tf.exp(-r2 / 2)
+
+    def spectral_frequencies(self, U):
+        return stats.norm.ppf(U[:, :-1])
 
 
 class Linear(Kern):
@@ -418,7 +725,7 @@ class Linear(Kern):
         if not presliced:
             X, X2 = self._slice(X, X2)
         if X2 is None:
-            return tf.matmul(X * self.variance, tf.transpose(X))
+            return _symmetric(lambda A, B: tf.matmul(A * self.variance, tf.transpose(A if B is None else B)), X)
         else:
             return tf.matmul(X * self.variance, tf.transpose(X2))
 
@@ -427,6 +734,11 @@ class Linear(Kern):
             X, _ = self._slice(X, None)
         return tf.reduce_sum(tf.square(X) * self.variance, 1)
 
+    def K_operator(self, X):
+        # K = (X sqrt(v)) (X sqrt(v))^T has rank at most input_dim
+        X, _ = self._slice(X, None)
+        return LowRank(X * tf.sqrt(self.variance))
+
 
 class Polynomial(Linear):
     """
@@ -453,66 +765,72 @@ class Polynomial(Linear):
     def Kdiag(self, X, presliced=False):
         return (Linear.Kdiag(self, X, presliced=presliced) + self.offset) ** self.degree
 
+    def K_operator(self, X):
+        return Kern.K_operator(self, X)
+
 
 class Exponential(Stationary):
     """
     The Exponential kernel
     """
 
-    def K(self, X, X2=None, presliced=False):
-        if not presliced:
-            X, X2 = self._slice(X, X2)
-        r = self.euclid_dist(X, X2)
+    def K_r2(self, r2):
+        r = _euclid_dist(r2)
         return self.variance * tf.exp(-0.5 * r)
 
+    def spectral_frequencies(self, U):
+        # a Matern12 kernel with twice the lengthscale
+        return 0.5 * _student_t_frequencies(U, 0.5)
+
 
 class Matern12(Stationary):
     """
     The Matern 1/2 kernel
     """
 
-    def K(self, X, X2=None, presliced=False):
-        if not presliced:
-            X, X2 = self._slice(X, X2)
-        r = self.euclid_dist(X, X2)
+    def K_r2(self, r2):
+        r = _euclid_dist(r2)
         return self.variance * tf.exp(-r)
 
+    def spectral_frequencies(self, U):
+        return _student_t_frequencies(U, 0.5)
+
 
 class Matern32(Stationary):
     """
     The Matern 3/2 kernel
     """
 
-    def K(self, X, X2=None, presliced=False):
-        if not presliced:
-            X, X2 = self._slice(X, X2)
-        r = self.euclid_dist(X, X2)
+    def K_r2(self, r2):
+        r = _euclid_dist(r2)
         return self.variance * (1. + np.sqrt(3.) * r) * \
                tf.exp(-np.sqrt(3.) * r)
 
+    def spectral_frequencies(self, U):
+        return _student_t_frequencies(U, 1.5)
+
 
 class Matern52(Stationary):
     """
     The Matern 5/2 kernel
     """
 
-    def K(self, X, X2=None, presliced=False):
-        if not presliced:
-            X, X2 = self._slice(X, X2)
-        r = self.euclid_dist(X, X2)
+    def K_r2(self, r2):
+        r = _euclid_dist(r2)
         return self.variance * (1.0 + np.sqrt(5.) * r + 5. / 3. * tf.square(r)) \
                * tf.exp(-np.sqrt(5.) * r)
 
+    def spectral_frequencies(self, U):
+        return _student_t_frequencies(U, 2.5)
+
 
 class Cosine(Stationary):
     """
     The Cosine kernel
     """
 
-    def K(self, X, X2=None, presliced=False):
-        if not presliced:
-            X, X2 = self._slice(X, X2)
-        r = self.euclid_dist(X, X2)
+    def K_r2(self, r2):
+        r = _euclid_dist(r2)
         return self.variance * tf.cos(r)
 
 
@@ -542,14 +860,21 @@ class PeriodicKernel(Kern):
         if not presliced:
             X, X2 = self._slice(X, X2)
         if X2 is None:
-            X2 = X
+            return _symmetric(self._periodic_K, X)
+        return self._periodic_K(X, X2)
 
-        # Introduce dummy dimension so we can use broadcasting
-        f = tf.expand_dims(X, 1)  # now N x 1 x D
-        f2 = tf.expand_dims(X2, 0)  # now 1 x M x D
+    def _periodic_K(self, X, X2):
+        if X2 is None:
+            X2 = X
 
-        r = np.pi * (f - f2) / self.period
-        r = tf.reduce_sum(tf.square(tf.sin(r) / self.lengthscales), 2)
+        # sin^2(pi (x - x') / period) = (1 - cos(a) cos(a') - sin(a) sin(a')) / 2,
+        # with a = 2 pi x / period, so the sum over the dimensions is a
+        # product of NxD and DxM matrices, rather than an NxMxD tensor.
+        a = 2 * np.pi * X / self.period
+        a2 = 2 * np.pi * X2 / self.period
+        r = tf.cast(tf.shape(X)[1], float_type) - \
+            tf.matmul(tf.cos(a), tf.transpose(tf.cos(a2))) - tf.matmul(tf.sin(a), tf.transpose(tf.sin(a2)))
+        r = tf.maximum(r, 0.) / (2 * tf.square(self.lengthscales))
 
         return self.variance * tf.exp(-0.5 * r)
 
@@ -587,15 +912,23 @@ class Coregion(Kern):
         self.W = Param(np.zeros((self.output_dim, self.rank)))
         self.kappa = Param(np.ones(self.output_dim), transforms.positive)
 
-    def K(self, X, X2=None):
-        X, X2 = self._slice(X, X2)
+    def build_B(self):
+        """
+        The coregionalization matrix B = W W^T + diag(kappa).
+        """
+        return tf.matmul(self.W, tf.transpose(self.W)) + tf.diag(self.kappa)
+
+    def K(self, X, X2=None, presliced=False):
+        if not presliced:
+            X, X2 = self._slice(X, X2)
         X = tf.cast(X[:, 0], tf.int32)
         if X2 is None:
             X2 = X
         else:
             X2 = tf.cast(X2[:, 0], tf.int32)
-        B = tf.matmul(self.W, tf.transpose(self.W)) + tf.diag(self.kappa)
-        return tf.gather(tf.transpose(tf.gather(B, X2)), X)
+        # index the flattened B with all the pairs at once
+        index = tf.expand_dims(X, 1) * self.output_dim + tf.expand_dims(X2, 0)
+        return tf.gather(tf.reshape(self.build_B(), [-1]), index)
 
     def Kdiag(self, X):
         X, _ = self._slice(X, None)
@@ -682,18 +1015,182 @@ class Combination(Kern):
                         overlapping = True
             return not overlapping
 
+    def _Ks(self, X, X2=None):
+        """
+        Compute the covariance matrices of all the kernels in the combination.
+
+        Stationary kernels which act on the same dimensions share the
+        dominant part of the computation of the distances (the X X2^T product
+        and the norms). Isotropic kernels share the unscaled squared distance,
+        which is divided by each kernel's lengthscale, whilst ARD kernels
+        share the scaled squared distance if their lengthscales are the same
+        Param.
+        """
+        groups = OrderedDict()
+        for i, k in enumerate(self.kern_list):
+            if _shares_distances(k):
+                key = (_active_dims_key(k.active_dims), id(k.lengthscales) if k.ARD else None)
+                groups.setdefault(key, []).append(i)
+
+        Ks = [None] * len(self.kern_list)
+        for (_, tied), members in groups.items():
+            if len(members) < 2:
+                continue
+            first = self.kern_list[members[0]]
+            Xs, X2s = first._slice(X, X2)
+            square_dist = _square_dist if tied is None else first.square_dist
+            # as in Stationary.K, only the lower triangle of a symmetric r2 is computed
+            r2 = _symmetric(square_dist, Xs) if X2 is None else square_dist(Xs, X2s)
+            if tied is None:
+                for i in members:
+                    k = self.kern_list[i]
+                    Ks[i] = k.K_r2(r2 / tf.square(k.lengthscales))
+            else:
+                for i in members:
+                    Ks[i] = self.kern_list[i].K_r2(r2)
+        return [k.K(X, X2) if Kc is None else Kc for Kc, k in zip(Ks, self.kern_list)]
+
+
+def _shares_distances(k):
+    """
+    Whether the kernel k is a Stationary kernel whose covariance is computed
+    by Stationary.K, i.e. from its K_r2 method.
+    """
+    if not isinstance(k, Stationary):
+        return False
+    K = type(k).K
+    return getattr(K, '__func__', K) is getattr(Stationary.K, '__func__', Stationary.K)
+
+
+def _active_dims_key(active_dims):
+    """
+    A hashable representation of a kernel's active_dims.
+    """
+    if isinstance(active_dims, slice):
+        return 'slice', active_dims.start, active_dims.stop, active_dims.step
+    return ('array',) + tuple(int(d) for d in active_dims)
+
 
 class Add(Combination):
     def K(self, X, X2=None, presliced=False):
-        return reduce(tf.add, [k.K(X, X2) for k in self.kern_list])
+        return reduce(tf.add, self._Ks(X, X2))
 
     def Kdiag(self, X, presliced=False):
         return reduce(tf.add, [k.Kdiag(X) for k in self.kern_list])
 
+    def K_operator(self, X):
+        operators = [k.K_operator(X) for k in self.kern_list]
+        if all(isinstance(op, Dense) for op in operators):
+            # nothing to gain from the structure, so share the distances
+            return Dense(self.K(X))
+        return Sum(operators)
+
 
 class Prod(Combination):
     def K(self, X, X2=None, presliced=False):
-        return reduce(tf.mul, [k.K(X, X2) for k in self.kern_list])
+        return reduce(tf.mul, self._Ks(X, X2))
 
     def Kdiag(self, X, presliced=False):
         return reduce(tf.mul, [k.Kdiag(X) for k in self.kern_list])
+
+
+def halton(num_points, dim, skip=20):
+    """
+    The first num_points points (after skipping `skip`) of the Halton
+    sequence in dim dimensions, a low-discrepancy sequence on the unit cube.
+    """
+    primes = []
+    candidate = 2
+    while len(primes) < dim:
+        if all(candidate % p for p in primes):
+            primes.append(candidate)
+        candidate += 1
+    points = np.zeros((num_points, dim))
+    for j, base in enumerate(primes):
+        for i in range(num_points):
+            n, f = i + skip + 1, 1.
+            while n > 0:
+                f /= base
+                points[i, j] += f * (n % base)
+                n //= base
+    return points
+
+
+class RandomFourierFeatures(Kern):
+    """
+    A finite feature approximation of a stationary kernel, by Bochner's
+    theorem: the kernel is the Fourier transform of its spectral density, so
+
+        k(x, x') ~ variance / F sum_f cos(w_f^T (x - x') / l)
+                 = phi(x)^T phi(x'),
+
+    with frequencies w_f sampled from the (normalised) spectral density and
+    phi(x) = sqrt(variance / F) [cos(W x / l), sin(W x / l)], of size 2F.
+
+    The frequencies are sampled once, for unit lengthscales, and rescaled by
+    the lengthscales of the kernel, so the hyperparameters of the wrapped
+    kernel remain free. `sampling` is one of
+
+     - 'random': Monte Carlo samples (Rahimi and Recht, 2007),
+     - 'orthogonal': samples whose directions are orthogonal in blocks of
+       input_dim (Yu et al., Orthogonal random features, 2016),
+     - 'quasi': quasi-Monte Carlo samples from the Halton sequence (Yang et
+       al., Quasi-Monte Carlo feature maps for shift-invariant kernels,
+       2014).
+    """
+
+    def __init__(self, kern, num_features, sampling='random', seed=0):
+        if not isinstance(kern, Stationary):
+            raise ValueError("Random Fourier features need a stationary kernel.")
+        Kern.__init__(self, kern.input_dim, kern.active_dims)
+        self.kern = kern
+        self.num_features = num_features
+        self.sampling = sampling
+        rng = np.random.RandomState(seed)
+        if sampling == 'quasi':
+            U = halton(num_features, kern.input_dim + 1)
+        elif sampling in ('random', 'orthogonal'):
+            U = rng.rand(num_features, kern.input_dim + 1)
+        else:
+            raise ValueError("Unknown sampling: " + str(sampling))
+        W = kern.spectral_frequencies(U)
+        if sampling == 'orthogonal':
+            W = _orthogonalise(W, rng)
+        self.frequencies = W
+
+    def feature_map(self, X, presliced=False):
+        """
+        The features phi(X), of size N x 2F.
+        """
+        if not presliced:
+            X, _ = self._slice(X, None)
+        XW = tf.matmul(X / self.kern.lengthscales, self.frequencies.astype(np_float_type), transpose_b=True)
+        scale = tf.sqrt(self.kern.variance / self.num_features)
+        return scale * tf.concat(1, [tf.cos(XW), tf.sin(XW)])
+
+    def K(self, X, X2=None, presliced=False):
+        Phi = self.feature_map(X, presliced)
+        Phi2 = Phi if X2 is None else self.feature_map(X2, presliced)
+        return tf.matmul(Phi, Phi2, transpose_b=True)
+
+    def Kdiag(self, X, presliced=False):
+        # cos^2 + sin^2 = 1, so the diagonal is exact
+        return self.kern.Kdiag(X)
+
+    @AutoFlow((float_type, [None, None]))
+    def compute_feature_map(self, X):
+        return self.feature_map(X)
+
+
+def _orthogonalise(W, rng):
+    """
+    Keep the norms of the rows of W, but replace their directions by
+    blocks of random orthonormal vectors.
+    """
+    F, D = W.shape
+    norms = np.sqrt(np.sum(np.square(W), 1))
+    directions = []
+    while len(directions) * D < F:
+        Q, _ = np.linalg.qr(rng.randn(D, D))
+        directions.append(Q)
+    return np.vstack(directions)[:F] * norms[:, None]
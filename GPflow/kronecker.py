@@ -0,0 +1,310 @@
+# Copyright 2017 the GPflow authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import
+import numpy as np
+import tensorflow as tf
+from .model import GPModel
+from .mean_functions import Zero
+from . import likelihoods, kernels
+from .param import DataHolder
+from .iterative import conjugate_gradient, gaussian_log_density
+from .linear_operators import kron_mvprod, kron_vec, kron_rows, kron_rows_dot
+from ._settings import settings
+float_type = settings.dtypes.float_type
+np_float_type = np.float32 if float_type is tf.float32 else np.float64
+
+
+def kernel_factors(kern):
+    """
+    The kernels whose product is kern: the elements of a Prod kernel, or the
+    kernel itself.
+    """
+    if isinstance(kern, kernels.Prod):
+        return list(kern.kern_list)
+    return [kern]
+
+
+def _rows_as_void(X):
+    # view each row of X as a single element, so that np.unique works on rows
+    X = np.ascontiguousarray(X)
+    return X.view(np.dtype((np.void, X.dtype.itemsize * X.shape[1]))).ravel()
+
+
+def grid_structure(X, kern):
+    """
+    Check whether the inputs X form a grid that matches the product
+    structure of the kernel kern, i.e. the kernel is a product of kernels
+    acting on disjoint sets of dimensions, and X contains every combination
+    of the distinct values taken on each set of dimensions exactly once.
+
+    If so, return (order, indices): X[order] is X sorted so that its
+    covariance is the Kronecker product of the covariances of the factors
+    (the first factor varying slowest), and X[order][indices[d]] are the
+    distinct points of the d-th factor. Otherwise, return None.
+    """
+    X = np.asarray(X)
+    N, D = X.shape
+    dims = [np.arange(D)[k.active_dims] for k in kernel_factors(kern)]
+    all_dims = np.concatenate(dims)
+    if len(np.unique(all_dims)) != len(all_dims):
+        return None
+
+    codes, sizes = [], []
+    for d in dims:
+        _, code = np.unique(_rows_as_void(X[:, d]), return_inverse=True)
+        codes.append(code)
+        sizes.append(code.max() + 1)
+    if np.prod(sizes) != N:
+        return None
+    position = np.ravel_multi_index(codes, sizes)
+    if len(np.unique(position)) != N:
+        return None
+
+    order = np.argsort(position)
+    strides = [int(np.prod(sizes[i + 1:])) for i in range(len(sizes))]
+    indices = [np.arange(n) * s for n, s in zip(sizes, strides)]
+    return order, indices
+
+
+class KroneckerGPR(GPModel):
+    """
+    Gaussian process regression for inputs on a grid.
+
+    If the kernel is a product of kernels acting on disjoint sets of
+    dimensions (kernels.Prod, see Combination.on_separate_dimensions), and X
+    is the Cartesian product of a set of points for each of them, then the
+    covariance of the data is the Kronecker product
+
+        K = K_1 kron K_2 kron ... kron K_D.
+
+    The eigendecomposition of K follows from the eigendecompositions of the
+    (small) K_d, so that the likelihood and predictions can be computed in
+    O(N sum(n_d)) time and O(N) memory, rather than the O(N^3) time and
+    O(N^2) memory of the GPR model, which this model otherwise matches. See
+
+    Saatci, Y. Scalable Inference for Structured Gaussian Process Models.
+    PhD thesis, University of Cambridge, 2011.
+
+    The data are stored sorted in the Kronecker order, so self.X and self.Y
+    are permuted versions of the X and Y passed in.
+    """
+    def __init__(self, X, Y, kern, mean_function=Zero()):
+        """
+        X is a data matrix, size N x D, which must be a grid (see
+        grid_structure)
+        Y is a data matrix, size N x R
+        kern, mean_function are appropriate GPflow objects
+        """
+        structure = grid_structure(X, kern)
+        if structure is None:
+            raise ValueError("X is not a grid matching the product structure of the kernel.")
+        order, grid_indices = structure
+        likelihood = likelihoods.Gaussian()
+        X = DataHolder(X[order])
+        Y = DataHolder(Y[order])
+        GPModel.__init__(self, X, Y, kern, likelihood, mean_function)
+        self.grid_indices = grid_indices
+        self.num_latent = Y.shape[1]
+
+    def _factors(self):
+        """
+        The kernels of each factor, their grid points and the
+        eigendecomposition of their covariance matrices.
+        """
+        kerns = kernel_factors(self.kern)
+        grids = [tf.gather(self.X, i) for i in self.grid_indices]
+        eigs = [tf.self_adjoint_eig(k.K(G)) for k, G in zip(kerns, grids)]
+        return kerns, grids, [e for e, _ in eigs], [Q for _, Q in eigs]
+
+    def build_likelihood(self):
+        """
+        Construct a tensorflow function to compute the likelihood.
+
+            \log p(Y | theta).
+
+        """
+        _, _, es, Qs = self._factors()
+        S = kron_vec(es) + self.likelihood.variance
+        alpha = kron_mvprod([tf.transpose(Q) for Q in Qs], self.Y - self.mean_function(self.X))
+        num_data = tf.cast(tf.shape(self.Y)[0], float_type)
+        R = tf.cast(tf.shape(self.Y)[1], float_type)
+        return -0.5 * num_data * R * np.log(2 * np.pi) - 0.5 * R * tf.reduce_sum(tf.log(S)) \
+            - 0.5 * tf.reduce_sum(tf.square(alpha) / tf.expand_dims(S, 1))
+
+    def build_predict(self, Xnew, full_cov=False):
+        """
+        Xnew is a data matrix, point at which we want to predict
+
+        This method computes
+
+            p(F* | Y )
+
+        where F* are points on the GP at Xnew, Y are noisy observations at X.
+
+        The cross-covariance between Xnew and the grid is the row-wise
+        Kronecker product of the cross-covariances of the factors, so
+        neither it nor K is formed.
+        """
+        kerns, grids, es, Qs = self._factors()
+        S = kron_vec(es) + self.likelihood.variance
+        alpha = kron_mvprod([tf.transpose(Q) for Q in Qs], self.Y - self.mean_function(self.X))
+        # the cross-covariances of the factors, rotated to the eigenbases
+        Us = [tf.matmul(k.K(Xnew, G), Q) for k, G, Q in zip(kerns, grids, Qs)]
+        fmean = kron_rows_dot(Us, alpha / tf.expand_dims(S, 1)) + self.mean_function(Xnew)
+        if full_cov:
+            U = kron_rows(Us)
+            fvar = self.kern.K(Xnew) - tf.matmul(U / S, tf.transpose(U))
+            shape = tf.pack([1, 1, tf.shape(self.Y)[1]])
+            fvar = tf.tile(tf.expand_dims(fvar, 2), shape)
+        else:
+            fvar = self.kern.Kdiag(Xnew) - tf.reshape(kron_rows_dot([tf.square(U) for U in Us],
+                                                                    tf.expand_dims(1. / S, 1)), [-1])
+            fvar = tf.tile(tf.reshape(fvar, (-1, 1)), [1, tf.shape(self.Y)[1]])
+        return fmean, fvar
+
+
+class ICMGPR(GPModel):
+    """
+    Multi-output Gaussian process regression with the intrinsic
+    coregionalization model (ICM),
+
+        cov(f_p(x), f_q(x')) = k(x, x') B[p, q],
+
+    where B = W W^T + diag(kappa) is held by a kernels.Coregion object. This
+    is the model of GPR with the kernel k * Coregion on inputs augmented with
+    the output index, but the covariance of the N x P outputs is never formed.
+
+    Y is N x P, with one column per output, observed at the inputs X. If every
+    output is observed at every input, the covariance is the Kronecker
+    product K kron B, and the likelihood and predictions are computed from
+    the eigendecompositions of K and B, as in KroneckerGPR. Missing outputs
+    are marked by NaNs in Y: the covariance of the observed outputs is then a
+    submatrix of K kron B, whose products are computed through the Kronecker
+    structure, and the likelihood and predictions use the iterative methods
+    of GPflow.iterative, as in ToeplitzGPR.
+    """
+    def __init__(self, X, Y, kern, rank=1, mean_function=Zero(), max_iterations=1000,
+                 tolerance=1e-6, num_probes=10, lanczos_iterations=30, seed=0):
+        """
+        X is a data matrix, size N x D
+        Y is a data matrix, size N x P, with NaNs for missing outputs
+        kern, mean_function are appropriate GPflow objects
+        rank is the number of columns of W
+        """
+        observed = ~np.isnan(Y)
+        likelihood = likelihoods.Gaussian()
+        rng = np.random.RandomState(seed)
+        probes = np.sign(rng.rand(np.sum(observed), num_probes) - 0.5)
+        X = DataHolder(X)
+        Y = DataHolder(np.where(observed, Y, 0.))
+        GPModel.__init__(self, X, Y, kern, likelihood, mean_function)
+        self.num_latent = Y.shape[1]
+        self.coregion = kernels.Coregion(1, Y.shape[1], rank)
+        # avoid the symmetric local minimum at W = 0
+        self.coregion.W = rng.randn(Y.shape[1], rank)
+        self.complete = bool(np.all(observed))
+        self.observed_indices = np.flatnonzero(observed).astype(np.int32)
+        self.probes = DataHolder(probes)
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        self.lanczos_iterations = lanczos_iterations
+
+    def _eig(self):
+        """
+        The eigendecomposition of K + sigma^2 I = (Q_K kron Q_B) diag(S) (Q_K kron Q_B)^T.
+        """
+        e_K, Q_K = tf.self_adjoint_eig(self.kern.K(self.X))
+        e_B, Q_B = tf.self_adjoint_eig(self.coregion.build_B())
+        S = kron_vec([e_K, e_B]) + self.likelihood.variance
+        return S, Q_K, Q_B
+
+    def _observed_matvec(self):
+        """
+        The product with the covariance of the observed outputs, through the
+        Kronecker product of the covariance of all the outputs.
+        """
+        K = self.kern.K(self.X)
+        B = self.coregion.build_B()
+        size = tf.size(self.Y)
+
+        def matvec(V):
+            V_full = tf.unsorted_segment_sum(V, self.observed_indices, size)
+            return tf.gather(kron_mvprod([K, B], V_full), self.observed_indices) + self.likelihood.variance * V
+        return matvec
+
+    def _residuals(self):
+        return tf.reshape(self.Y - self.mean_function(self.X), [-1, 1])
+
+    def build_likelihood(self):
+        """
+        Construct a tensorflow function to compute the likelihood.
+
+            \log p(Y | theta).
+
+        """
+        if not self.complete:
+            return gaussian_log_density(self._observed_matvec(),
+                                        tf.gather(self._residuals(), self.observed_indices),
+                                        self.probes, self.max_iterations, self.tolerance,
+                                        self.lanczos_iterations)
+        S, Q_K, Q_B = self._eig()
+        alpha = kron_mvprod([tf.transpose(Q_K), tf.transpose(Q_B)], self._residuals())
+        num_data = tf.cast(tf.size(self.Y), float_type)
+        return -0.5 * num_data * np.log(2 * np.pi) - 0.5 * tf.reduce_sum(tf.log(S)) \
+            - 0.5 * tf.reduce_sum(tf.square(alpha) / tf.expand_dims(S, 1))
+
+    def build_predict(self, Xnew, full_cov=False):
+        """
+        Xnew is a data matrix, point at which we want to predict
+
+        This method computes
+
+            p(F* | Y )
+
+        where F* are the outputs at Xnew, Y are noisy observations at X.
+
+        Only the marginal variances are available.
+        """
+        if full_cov:
+            raise NotImplementedError("The ICM model only computes marginal variances.")
+        B = self.coregion.build_B()
+        num_new, P = tf.shape(Xnew)[0], tf.shape(self.Y)[1]
+        shape = tf.pack([num_new, P])
+        prior_var = tf.expand_dims(self.kern.Kdiag(Xnew), 1) * tf.expand_dims(tf.diag_part(B), 0)
+        Kx = self.kern.K(Xnew, self.X)
+
+        if self.complete:
+            S, Q_K, Q_B = self._eig()
+            alpha = kron_mvprod([tf.transpose(Q_K), tf.transpose(Q_B)], self._residuals())
+            # the rows of kron(K(Xnew, X), B), one per new point and output,
+            # are kron(K(x, X), B[p]), rotated to the eigenbases
+            point, output = tf.range(num_new * P) // P, tf.range(num_new * P) % P
+            Us = [tf.gather(tf.matmul(Kx, Q_K), point), tf.gather(tf.matmul(B, Q_B), output)]
+            fmean = tf.reshape(kron_rows_dot(Us, alpha / tf.expand_dims(S, 1)), shape)
+            fvar = prior_var - tf.reshape(kron_rows_dot([tf.square(U) for U in Us], tf.expand_dims(1. / S, 1)),
+                                          shape)
+        else:
+            # the covariances between the observed outputs and all the new ones
+            C = tf.reshape(tf.expand_dims(tf.expand_dims(tf.transpose(Kx), 1), 3) *
+                           tf.expand_dims(tf.expand_dims(B, 0), 2),
+                           tf.pack([tf.size(self.Y), num_new * P]))
+            C = tf.gather(C, self.observed_indices)
+            y = tf.gather(self._residuals(), self.observed_indices)
+            solve = conjugate_gradient(self._observed_matvec(), tf.concat(1, [y, C]),
+                                       self.max_iterations, self.tolerance)
+            fmean = tf.reshape(tf.matmul(tf.transpose(C), solve[:, :1]), shape)
+            fvar = prior_var - tf.reshape(tf.reduce_sum(C * solve[:, 1:], 0), shape)
+        return fmean + self.mean_function(Xnew), fvar
@@ -14,7 +14,7 @@
 
 
 from __future__ import absolute_import
-from . import densities, transforms
+from . import densities, transforms, quadrature
 import tensorflow as tf
 import numpy as np
 from .param import Parameterized, Param, ParamList
@@ -24,9 +24,7 @@ np_float_type = np.float32 if float_type is tf.float32 else np.float64
 
 
 def hermgauss(n):
-    x, w = np.polynomial.hermite.hermgauss(n)
-    x, w = x.astype(np_float_type), w.astype(np_float_type)
-    return x, w
+    return quadrature.hermgauss(n)
 
 
 class Likelihood(Parameterized):
@@ -95,8 +93,7 @@ class Likelihood(Parameterized):
         likelihoods (e.g. Gaussian) will implement specific cases.
         """
         gh_x, gh_w = hermgauss(self.num_gauss_hermite_points)
-        gh_w /= np.sqrt(np.pi)
-        gh_w = gh_w.reshape(-1, 1)
+        gh_w = gh_w.reshape(-1, 1) / np.sqrt(np.pi)
         shape = tf.shape(Fmu)
         Fmu, Fvar = [tf.reshape(e, (-1, 1)) for e in (Fmu, Fvar)]
         X = gh_x[None, :] * tf.sqrt(2.0 * Fvar) + Fmu
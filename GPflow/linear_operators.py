@@ -0,0 +1,420 @@
+# Copyright 2017 the GPflow authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Lazy representations of symmetric positive (semi-)definite matrices, such
+as covariance matrices, which keep their structure (diagonal, low rank,
+Kronecker, sums of these) so that products, solves and log determinants can
+be computed without forming and factorising the dense matrix.
+
+Kernels return these from Kern.K_operator.
+"""
+
+from __future__ import absolute_import
+from functools import reduce
+import numpy as np
+import tensorflow as tf
+from .densities import multivariate_normal
+from .tf_wraps import eye
+from ._settings import settings
+float_type = settings.dtypes.float_type
+
+
+def _kron_apply(fns, sizes, B):
+    """
+    Apply (F_1 kron F_2 kron ... kron F_D) to B, where each F_d is a linear
+    map on n_d x P matrices, given as a function, and sizes are the n_d.
+    """
+    R = tf.shape(B)[1]
+    X = B
+    for fn, n in zip(fns, sizes):
+        X = tf.transpose(fn(tf.reshape(X, tf.pack([n, -1]))))
+    return tf.transpose(tf.reshape(X, tf.pack([R, -1])))
+
+
+def kron_mvprod(As, B):
+    """
+    Compute (A_1 kron A_2 kron ... kron A_D) B without forming the Kronecker
+    product. The A_d are square matrices of size n_d x n_d and B has
+    prod(n_d) rows.
+
+    The rows of B are ordered with the first factor varying slowest. Each
+    step multiplies by one factor and rotates the dimensions of the
+    (reshaped) result, so the cost is O(N sum(n_d)) rather than O(N^2).
+    """
+    return _kron_apply([lambda V, A=A: tf.matmul(A, V) for A in As], [tf.shape(A)[0] for A in As], B)
+
+
+def kron_vec(vs):
+    """
+    The Kronecker product of the vectors vs, as a vector.
+    """
+    v = vs[0]
+    for vd in vs[1:]:
+        v = tf.reshape(tf.expand_dims(v, 1) * tf.expand_dims(vd, 0), [-1])
+    return v
+
+
+def kron_rows(Us):
+    """
+    Given matrices U_d of size M x n_d, compute the M x prod(n_d) matrix
+    whose i-th row is the Kronecker product of the i-th rows of the U_d.
+    """
+    U = Us[0]
+    M = tf.shape(U)[0]
+    for Ud in Us[1:]:
+        U = tf.reshape(tf.expand_dims(U, 2) * tf.expand_dims(Ud, 1), tf.pack([M, -1]))
+    return U
+
+
+def kron_rows_dot(Us, B):
+    """
+    Compute kron_rows(Us) B without forming kron_rows(Us). The largest
+    temporary is of size M x prod(n_d) / n_1.
+    """
+    M = tf.shape(Us[0])[0]
+    T = tf.matmul(Us[0], tf.reshape(B, tf.pack([tf.shape(Us[0])[1], -1])))
+    for U in Us[1:]:
+        T = tf.reshape(T, tf.pack([M, tf.shape(U)[1], -1]))
+        T = tf.reshape(tf.batch_matmul(tf.expand_dims(U, 1), T), tf.pack([M, -1]))
+    return T
+
+
+def _cholesky_solve(L, B):
+    return tf.matrix_triangular_solve(tf.transpose(L), tf.matrix_triangular_solve(L, B, lower=True), lower=False)
+
+
+class LinearOperator(object):
+    """
+    The base class of the operators, which represent an N x N symmetric
+    matrix K. Subclasses implement to_dense, and override the other methods
+    where their structure allows something cheaper than the dense
+    computation, which is the default.
+    """
+
+    def to_dense(self):
+        raise NotImplementedError
+
+    def num_rows(self):
+        return tf.shape(self.to_dense())[0]
+
+    def matmul(self, B):
+        """
+        The product K B.
+        """
+        return tf.matmul(self.to_dense(), B)
+
+    def diag(self):
+        """
+        The diagonal of K, as a vector.
+        """
+        return tf.diag_part(self.to_dense())
+
+    def solve(self, B):
+        """
+        The solution of K X = B.
+        """
+        return Dense(self.to_dense()).solve(B)
+
+    def logdet(self):
+        """
+        The log determinant of K.
+        """
+        return Dense(self.to_dense()).logdet()
+
+    def log_density(self, Y):
+        """
+        log N(Y | 0, K), summed over the (independent) columns of Y.
+        """
+        num_data = tf.cast(tf.shape(Y)[0], float_type)
+        num_columns = tf.cast(tf.shape(Y)[1], float_type)
+        return -0.5 * num_data * num_columns * np.log(2 * np.pi) - 0.5 * num_columns * self.logdet() \
+            - 0.5 * tf.reduce_sum(Y * self.solve(Y))
+
+    def __add__(self, other):
+        return Sum([self, other])
+
+
+class Dense(LinearOperator):
+    """
+    A matrix without structure, which is solved through its Cholesky
+    decomposition in O(N^3).
+    """
+
+    def __init__(self, A):
+        self.A = A
+        self._cholesky = None
+
+    def to_dense(self):
+        return self.A
+
+    def matmul(self, B):
+        return tf.matmul(self.A, B)
+
+    def cholesky(self):
+        if self._cholesky is None:
+            self._cholesky = tf.cholesky(self.A)
+        return self._cholesky
+
+    def solve(self, B):
+        return _cholesky_solve(self.cholesky(), B)
+
+    def logdet(self):
+        return 2. * tf.reduce_sum(tf.log(tf.diag_part(self.cholesky())))
+
+    def log_density(self, Y):
+        return multivariate_normal(Y, tf.zeros_like(Y), self.cholesky())
+
+
+class Diagonal(LinearOperator):
+    """
+    A diagonal matrix. If N is given, d is a single variance and the matrix
+    is d I, of size N x N; otherwise d is the vector of the diagonal.
+    """
+
+    def __init__(self, d, N=None):
+        self.isotropic = N is not None
+        if self.isotropic:
+            self.d = tf.reshape(tf.cast(d, float_type), [])
+            self.N = N
+        else:
+            self.d = d
+            self.N = tf.shape(d)[0]
+
+    def num_rows(self):
+        return self.N
+
+    def diag(self):
+        if self.isotropic:
+            return tf.fill(tf.pack([self.N]), self.d)
+        return self.d
+
+    def to_dense(self):
+        return tf.diag(self.diag())
+
+    def matmul(self, B):
+        return B * (self.d if self.isotropic else tf.expand_dims(self.d, 1))
+
+    def solve(self, B):
+        return B / (self.d if self.isotropic else tf.expand_dims(self.d, 1))
+
+    def logdet(self):
+        if self.isotropic:
+            return tf.cast(self.N, float_type) * tf.log(self.d)
+        return tf.reduce_sum(tf.log(self.d))
+
+
+class LowRank(LinearOperator):
+    """
+    The matrix U U^T, for an N x r matrix U. It is singular when r < N, so
+    it is only solved as part of a Sum with a Diagonal.
+    """
+
+    def __init__(self, U):
+        self.U = U
+
+    def num_rows(self):
+        return tf.shape(self.U)[0]
+
+    def to_dense(self):
+        return tf.matmul(self.U, self.U, transpose_b=True)
+
+    def matmul(self, B):
+        return tf.matmul(self.U, tf.matmul(self.U, B, transpose_a=True))
+
+    def diag(self):
+        return tf.reduce_sum(tf.square(self.U), 1)
+
+
+class Kronecker(LinearOperator):
+    """
+    The Kronecker product of the square matrices `factors`, with the first
+    factor varying slowest (see kron_mvprod). It is solved through the
+    Cholesky decompositions of the factors, at a cost of O(sum(n_d^3)).
+    """
+
+    def __init__(self, factors):
+        self.factors = [Dense(A) for A in factors]
+
+    def _sizes(self):
+        return [tf.shape(A.A)[0] for A in self.factors]
+
+    def num_rows(self):
+        return reduce(tf.mul, self._sizes())
+
+    def to_dense(self):
+        K = self.factors[0].A
+        for A in self.factors[1:]:
+            n, m = tf.shape(K)[0], tf.shape(A.A)[0]
+            K = tf.reshape(tf.expand_dims(tf.expand_dims(K, 1), 3) * tf.expand_dims(tf.expand_dims(A.A, 0), 2),
+                           tf.pack([n * m, n * m]))
+        return K
+
+    def matmul(self, B):
+        return kron_mvprod([A.A for A in self.factors], B)
+
+    def diag(self):
+        return kron_vec([tf.diag_part(A.A) for A in self.factors])
+
+    def solve(self, B):
+        return _kron_apply([A.solve for A in self.factors], self._sizes(), B)
+
+    def logdet(self):
+        N = tf.cast(self.num_rows(), float_type)
+        return reduce(tf.add, [N / tf.cast(n, float_type) * A.logdet()
+                               for A, n in zip(self.factors, self._sizes())])
+
+
+class _LowRankPlusDiagonal(LinearOperator):
+    """
+    D + U U^T, for a diagonal D and an N x r matrix U, which is solved with
+    the Woodbury identity and the matrix determinant lemma in O(N r^2):
+
+        (D + U U^T)^{-1} = D^{-1} - D^{-1} U C^{-1} U^T D^{-1},
+        log det(D + U U^T) = log det D + log det C,
+
+    with C = I + U^T D^{-1} U, of size r x r.
+    """
+
+    def __init__(self, D, U):
+        self.D = D
+        self.U = U
+        self.DinvU = D.solve(U)
+        C = eye(tf.shape(U)[1]) + tf.matmul(U, self.DinvU, transpose_a=True)
+        self.L = tf.cholesky(C)
+
+    def num_rows(self):
+        return self.D.num_rows()
+
+    def to_dense(self):
+        return self.D.to_dense() + tf.matmul(self.U, self.U, transpose_b=True)
+
+    def matmul(self, B):
+        return self.D.matmul(B) + tf.matmul(self.U, tf.matmul(self.U, B, transpose_a=True))
+
+    def diag(self):
+        return self.D.diag() + tf.reduce_sum(tf.square(self.U), 1)
+
+    def solve(self, B):
+        DinvB = self.D.solve(B)
+        return DinvB - tf.matmul(self.DinvU, _cholesky_solve(self.L, tf.matmul(self.U, DinvB, transpose_a=True)))
+
+    def logdet(self):
+        return self.D.logdet() + 2. * tf.reduce_sum(tf.log(tf.diag_part(self.L)))
+
+
+class _KroneckerPlusIsotropic(LinearOperator):
+    """
+    K + s I, for a Kronecker product K, which is solved through the
+    eigendecompositions of the factors: K = Q diag(e) Q^T with Q and e the
+    Kronecker products of the factors' eigenvectors and eigenvalues.
+    """
+
+    def __init__(self, K, s):
+        self.K = K
+        self.s = s
+        eigs = [tf.self_adjoint_eig(A.A) for A in K.factors]
+        self.Q = [Q for _, Q in eigs]
+        self.e = kron_vec([e for e, _ in eigs]) + s
+
+    def num_rows(self):
+        return self.K.num_rows()
+
+    def to_dense(self):
+        return self.K.to_dense() + self.s * eye(self.num_rows())
+
+    def matmul(self, B):
+        return self.K.matmul(B) + self.s * B
+
+    def diag(self):
+        return self.K.diag() + self.s
+
+    def solve(self, B):
+        QtB = kron_mvprod([tf.transpose(Q) for Q in self.Q], B)
+        return kron_mvprod(self.Q, QtB / tf.expand_dims(self.e, 1))
+
+    def logdet(self):
+        return tf.reduce_sum(tf.log(self.e))
+
+
+class Sum(LinearOperator):
+    """
+    A sum of operators. Products and diagonals are computed term by term.
+    Solves and log determinants use the structure of the sum where there is
+    one:
+
+     - diagonal terms are added together,
+     - a diagonal plus low rank terms is solved with the Woodbury identity,
+     - a Kronecker product plus an isotropic diagonal is solved through the
+       eigendecompositions of the factors,
+
+    and otherwise the sum is formed and solved densely.
+    """
+
+    def __init__(self, operators):
+        self.operators = []
+        for op in operators:
+            if isinstance(op, Sum):
+                self.operators.extend(op.operators)
+            else:
+                self.operators.append(op)
+        self._solver = None
+
+    def num_rows(self):
+        return self.operators[0].num_rows()
+
+    def to_dense(self):
+        return reduce(tf.add, [op.to_dense() for op in self.operators])
+
+    def matmul(self, B):
+        return reduce(tf.add, [op.matmul(B) for op in self.operators])
+
+    def diag(self):
+        return reduce(tf.add, [op.diag() for op in self.operators])
+
+    def _diagonal(self, diagonals):
+        if all(D.isotropic for D in diagonals):
+            return Diagonal(reduce(tf.add, [D.d for D in diagonals]), diagonals[0].N)
+        return Diagonal(reduce(tf.add, [D.diag() for D in diagonals]))
+
+    def solver(self):
+        """
+        An operator equal to the sum, whose solve and logdet exploit its
+        structure.
+        """
+        if self._solver is None:
+            diagonals = [op for op in self.operators if isinstance(op, Diagonal)]
+            others = [op for op in self.operators if not isinstance(op, Diagonal)]
+            if not diagonals:
+                self._solver = others[0] if len(others) == 1 else Dense(self.to_dense())
+            elif not others:
+                self._solver = self._diagonal(diagonals)
+            elif all(isinstance(op, LowRank) for op in others):
+                U = tf.concat(1, [op.U for op in others])
+                self._solver = _LowRankPlusDiagonal(self._diagonal(diagonals), U)
+            elif len(others) == 1 and isinstance(others[0], Kronecker) and all(D.isotropic for D in diagonals):
+                self._solver = _KroneckerPlusIsotropic(others[0], self._diagonal(diagonals).d)
+            else:
+                self._solver = Dense(self.to_dense())
+        return self._solver
+
+    def solve(self, B):
+        return self.solver().solve(B)
+
+    def logdet(self):
+        return self.solver().logdet()
+
+    def log_density(self, Y):
+        return self.solver().log_density(Y)
@@ -14,11 +14,11 @@
 
 
 from __future__ import print_function, absolute_import
-from .param import Parameterized, AutoFlow, DataHolder
+from .param import Parameterized, AutoFlow, DataHolder, Param
 from scipy.optimize import minimize, OptimizeResult
 import numpy as np
 import tensorflow as tf
-from . import hmc, tf_wraps
+from . import hmc, tf_wraps, transforms, priors
 from ._settings import settings
 import sys
 float_type = settings.dtypes.float_type
@@ -173,16 +173,90 @@ class Model(Parameterized):
         return self.build_likelihood()
 
     def sample(self, num_samples, Lmin=5, Lmax=20, epsilon=0.01, thin=1, burn=0,
-               verbose=False, return_logprobs=False, RNG=np.random.RandomState(0)):
+               verbose=False, return_logprobs=False, RNG=np.random.RandomState(0),
+               elliptical=None, method='hmc', friction=0.1, trace=None, callback=None):
         """
         Use Hamiltonian Monte Carlo to draw samples from the model posterior.
+
+        elliptical (optional) is a Param, or a list of Params, with a N(0, 1)
+        prior and no transform, such as the whitened latent variables `V` of
+        GPMC and SGPMC. If given, these parameters are updated by elliptical
+        slice sampling (which uses only evaluations of the likelihood, no
+        gradients), alternating with HMC on the remaining free parameters.
+
+        method is one of
+            - 'hmc': Hamiltonian Monte Carlo (default)
+            - 'sgld': stochastic gradient Langevin dynamics
+            - 'sghmc': stochastic gradient HMC, with the given friction
+        The stochastic gradient methods are intended for models whose data are
+        MinibatchData, so that every evaluation of the objective uses a new
+        minibatch (the likelihood must be rescaled to the full data set, as
+        in SVGP). For these methods, Lmin and Lmax are ignored, and epsilon
+        may be a function of the iteration number (see hmc.polynomial_decay).
+
+        trace (optional) is a hmc.HMCTrace object, which records per-iteration
+        timings (time spent in the tensorflow objective and in total), numbers
+        of leapfrog steps and accept/reject decisions. callback (optional) is
+        called after every HMC iteration, see hmc.sample_HMC. Both are only
+        available with method='hmc', without elliptical slice sampling.
         """
+        if (trace is not None or callback is not None) and (method != 'hmc' or elliptical is not None):
+            raise ValueError("trace and callback are only available for plain HMC sampling.")
         if self._needs_recompile:
             self._compile()
-        return hmc.sample_HMC(self._objective, num_samples,
-                              Lmin=Lmin, Lmax=Lmax, epsilon=epsilon, thin=thin, burn=burn,
-                              x0=self.get_free_state(), verbose=verbose,
-                              return_logprobs=return_logprobs, RNG=RNG)
+        if method in ('sgld', 'sghmc'):
+            if elliptical is not None:
+                raise ValueError("elliptical slice sampling is only available with method='hmc'.")
+            if method == 'sgld':
+                return hmc.sample_SGLD(self._objective, num_samples, epsilon=epsilon,
+                                       x0=self.get_free_state(), verbose=verbose, thin=thin,
+                                       burn=burn, RNG=RNG, return_logprobs=return_logprobs)
+            return hmc.sample_SGHMC(self._objective, num_samples, epsilon=epsilon,
+                                    x0=self.get_free_state(), friction=friction, verbose=verbose,
+                                    thin=thin, burn=burn, RNG=RNG, return_logprobs=return_logprobs)
+        elif method != 'hmc':
+            raise ValueError("unknown sampling method: %s" % method)
+
+        if elliptical is None:
+            return hmc.sample_HMC(self._objective, num_samples,
+                                  Lmin=Lmin, Lmax=Lmax, epsilon=epsilon, thin=thin, burn=burn,
+                                  x0=self.get_free_state(), verbose=verbose,
+                                  return_logprobs=return_logprobs, RNG=RNG,
+                                  trace=trace, callback=callback)
+
+        latent = self._elliptical_indices(elliptical)
+
+        def loglik(x):
+            # the log density, with the N(0, I) prior on the latent block removed.
+            feed_dict = {self._free_vars: x}
+            self.update_feed_dict(self._feed_dict_keys, feed_dict)
+            minusF = self._session.run(self._minusF, feed_dict=feed_dict)
+            return -np.float64(minusF) + 0.5 * np.sum(np.square(x[latent]))
+
+        return hmc.sample_ESS_HMC(self._objective, loglik, num_samples,
+                                  Lmin=Lmin, Lmax=Lmax, epsilon=epsilon, thin=thin, burn=burn,
+                                  x0=self.get_free_state(), latent=latent, verbose=verbose,
+                                  return_logprobs=return_logprobs, RNG=RNG)
+
+    def _elliptical_indices(self, params):
+        """
+        Return the positions on the free-state vector of the given Param
+        objects, checking that they are suitable for elliptical slice sampling.
+        """
+        if isinstance(params, Param):
+            params = [params]
+        indices = []
+        for p in params:
+            start, found = self.get_param_index(p)
+            if not found or p.fixed:
+                raise ValueError("%s is not a free parameter of this model." % p.name)
+            if not isinstance(p.transform, transforms.Identity):
+                raise ValueError("elliptical slice sampling requires untransformed parameters.")
+            if not (isinstance(p.prior, priors.Gaussian) and
+                    np.all(p.prior.mu == 0.) and np.all(p.prior.var == 1.)):
+                raise ValueError("elliptical slice sampling requires a N(0, 1) prior.")
+            indices.append(np.arange(start, start + p.size))
+        return np.hstack(indices)
 
     def optimize(self, method='L-BFGS-B', tol=None, callback=None,
                  maxiter=1000, **kw):
@@ -373,6 +447,22 @@ class GPModel(Model):
         """
         return self.build_predict(Xnew, full_cov=True)
 
+    def build_predict_uncertain(self, Xmu, Xcov):
+        raise NotImplementedError("Prediction at uncertain inputs is not implemented for this model.")
+
+    @AutoFlow((float_type, [None, None]), (float_type,))
+    def predict_f_uncertain(self, Xmu, Xcov):
+        """
+        Compute the mean and variance of the latent function(s) at uncertain
+        inputs x ~ N(Xmu, Xcov), by moment matching with the kernel
+        expectations (see conditionals.uncertain_conditional). Xcov is of
+        size N x D x D, or N x D for diagonal covariances.
+
+        The mean function is evaluated at Xmu, which is exact for the Zero and
+        Constant mean functions.
+        """
+        return self.build_predict_uncertain(Xmu, Xcov)
+
     @AutoFlow((float_type, [None, None]), (tf.int32, []))
     def predict_f_samples(self, Xnew, num_samples):
         """
@@ -389,6 +479,50 @@ class GPModel(Model):
             samples.append(mu[:, i:i + 1] + tf.matmul(L, V))
         return tf.transpose(tf.pack(samples))
 
+    @AutoFlow((float_type, [None, None]), (float_type, [None, None]))
+    def _predict_f_over_samples(self, samples, Xnew):
+        """
+        Compute the mean and variance of the latent function(s) at the points
+        Xnew, for every free-state vector in (the rows of) samples, in a single
+        graph. Returns an S x 2 x N x R array, stacking the means and variances.
+        """
+        def predict_one(free_state):
+            # rebuild the free parameters from this row of samples. Fixed
+            # parameters and data keep their placeholders.
+            self.make_free_tf_array(free_state)
+            mu, var = self.build_predict(Xnew)
+            return tf.pack([mu, var])
+        return tf.map_fn(predict_one, samples, dtype=float_type)
+
+    def predict_f_samples_over_posterior(self, samples, Xnew, chunk_size=100,
+                                         return_mixture=False):
+        """
+        Compute predictions of the latent function(s) at the points Xnew,
+        averaged over a set of posterior samples of the free state (e.g. the
+        output of self.sample()).
+
+        The predictions for all samples are computed in one graph, which is
+        evaluated over chunks of at most chunk_size samples to bound the
+        memory used.
+
+        If return_mixture is False (default), this returns the mean and
+        variance of the mixture of Gaussians defined by the samples, each of
+        size N x R. If return_mixture is True, the means and variances of the
+        mixture components are returned instead, each of size S x N x R.
+
+        The state of the model is not changed.
+        """
+        samples = np.atleast_2d(samples)
+        results = [self._predict_f_over_samples(samples[i:i + chunk_size], Xnew)
+                   for i in range(0, samples.shape[0], chunk_size)]
+        results = np.concatenate(results, 0)
+        mus, variances = results[:, 0], results[:, 1]
+        if return_mixture:
+            return mus, variances
+        mean = np.mean(mus, 0)
+        var = np.mean(variances + np.square(mus), 0) - np.square(mean)
+        return mean, var
+
     @AutoFlow((float_type, [None, None]))
     def predict_y(self, Xnew):
         """
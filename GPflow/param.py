@@ -228,6 +228,17 @@ class Param(Parentable):
             # do not consider log jacobian for parameters that are fixed.
             self._log_jacobian = 0.0
             return 0
+        return self.make_free_tf_array(free_array)
+
+    def make_free_tf_array(self, free_array):
+        """
+        As make_tf_array, but fixed parameters are left untouched: their
+        placeholders are not rebuilt. This allows a parameter to be
+        re-represented from a different free-state vector (e.g. inside a
+        tf.map_fn over samples) whilst the feed_dict remains valid.
+        """
+        if self.fixed:
+            return 0
         free_size = self.transform.free_state_size(self.shape)
         x_free = free_array[:free_size]
         mapped_array = self.transform.tf_forward(x_free)
@@ -709,6 +720,17 @@ class Parameterized(Parentable):
             count += p.make_tf_array(X[count:])
         return count
 
+    def make_free_tf_array(self, X):
+        """
+        Distribute a flat tensorflow array amongst the free (non-fixed)
+        parameters of this instance, without rebuilding the placeholders for
+        data and fixed parameters. See Param.make_free_tf_array.
+        """
+        count = 0
+        for p in self.sorted_params:
+            count += p.make_free_tf_array(X[count:])
+        return count
+
     def get_param_index(self, param_to_index):
         """
         Given a parameter, compute the position of that parameter on the free-state vector.
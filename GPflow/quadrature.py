@@ -0,0 +1,227 @@
+# Copyright 2017 the GPflow authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Quadrature rules for expectations under multivariate Gaussians, which are
+used by the numerical fallbacks of the kernel expectations.
+
+Each rule returns nodes x (P x D) and weights w (P) such that
+
+    E_{N(0, I)}[f(x)] ~ sum_p w_p f(x_p),
+
+and mvnquad maps them to the Gaussians N(mu_n, Sigma_n). The rule is chosen
+with settings.numerics.ekern_quadrature_rule:
+
+ - gauss_hermite: the tensor product of H-point Gauss-Hermite rules, with
+   H**D nodes, exact for polynomials of degree 2H-1 in each variable;
+ - smolyak: the Smolyak sparse grid of Gauss-Hermite rules, exact for
+   polynomials of total degree 2L-1 for L = ekern_quadrature_level, whose
+   size grows polynomially rather than exponentially with D;
+ - unscented: the 2D+1 sigma points of the unscented transform;
+ - cubature: the 2D points of the third-degree spherical-radial rule;
+ - monte_carlo: ekern_quadrature_samples samples with a fixed seed.
+
+The rules are computed once for each set of arguments and float type, and
+the (read-only) arrays are shared by every graph built afterwards, including
+the one-dimensional Gauss-Hermite rules of the likelihoods (see hermgauss).
+"""
+
+from __future__ import absolute_import
+import functools
+import itertools
+import numpy as np
+import tensorflow as tf
+from scipy.special import comb
+from ._settings import settings
+
+_grids = {}
+
+
+def _cached(rule):
+    """
+    Memoise a quadrature rule on its arguments and the float type of the
+    settings. The arrays are cast to the float type and made read-only, as
+    they are shared by all the callers.
+    """
+    @functools.wraps(rule)
+    def cached_rule(*args, **kwargs):
+        dtype = np.float32 if settings.dtypes.float_type is tf.float32 else np.float64
+        key = (rule.__name__, args, tuple(sorted(kwargs.items())), dtype)
+        if key not in _grids:
+            arrays = tuple(np.array(a, dtype=dtype) for a in rule(*args, **kwargs))
+            for a in arrays:
+                a.setflags(write=False)
+            _grids[key] = arrays
+        return _grids[key]
+    return cached_rule
+
+
+@_cached
+def hermgauss(H):
+    """
+    The H-point Gauss-Hermite rule for the weight exp(-x^2), as in
+    np.polynomial.hermite.hermgauss.
+    """
+    return np.polynomial.hermite.hermgauss(H)
+
+
+@_cached
+def gauss_hermite(H, D):
+    """
+    The tensor product of H-point Gauss-Hermite rules, with H**D nodes.
+    """
+    x, w = hermgauss(H)
+    x, w = x * np.sqrt(2.), w / np.sqrt(np.pi)
+    xn = np.array(list(itertools.product(*(x,) * D)))  # H**DxD
+    wn = np.prod(np.array(list(itertools.product(*(w,) * D))), 1)  # H**D
+    return xn, wn
+
+
+def _compositions(total, D):
+    """
+    All the tuples of D positive integers which sum to total.
+    """
+    if D == 1:
+        yield (total,)
+        return
+    for first in range(1, total - D + 2):
+        for rest in _compositions(total - first, D - 1):
+            yield (first,) + rest
+
+
+@_cached
+def smolyak(level, D):
+    """
+    The Smolyak sparse grid of level `level` built from the (2i - 1)-point
+    Gauss-Hermite rules Q_i, i = 1, ..., level, which is exact for
+    polynomials of total degree 2 level - 1 (and of degree 4 level - 3 in a
+    single variable):
+
+        sum_{level <= |i| <= level + D - 1} (-1)^(level + D - 1 - |i|) C(D - 1, level + D - 1 - |i|)
+            Q_{i_1} x ... x Q_{i_D},
+
+    whose coinciding nodes are merged. Some weights are negative. See
+
+    Gerstner, T. and Griebel, M. Numerical integration using sparse grids.
+    Numerical Algorithms, 1998.
+    """
+    rules = [gauss_hermite(2 * i - 1, 1) for i in range(1, level + 1)]
+    top = level + D - 1
+    nodes = {}
+    for total in range(max(level, D), top + 1):
+        coefficient = (-1) ** (top - total) * comb(D - 1, top - total, exact=True)
+        for index in _compositions(total, D):
+            xs = [rules[i - 1][0][:, 0] for i in index]
+            ws = [rules[i - 1][1] for i in index]
+            for x, w in zip(itertools.product(*xs), itertools.product(*ws)):
+                key = tuple(np.round(x, 12))
+                nodes[key] = nodes.get(key, 0.) + coefficient * np.prod(w)
+    xn = np.array(list(nodes.keys()))
+    wn = np.array(list(nodes.values()))
+    keep = np.abs(wn) > 1e-15
+    return xn[keep], wn[keep]
+
+
+@_cached
+def unscented(D, kappa=None):
+    """
+    The 2D+1 sigma points of the unscented transform, at 0 and
+    +-sqrt(D + kappa) along the axes, exact for polynomials of degree 3. By
+    default kappa = 3 - D, which also matches the fourth moments of a 1-D
+    Gaussian, and gives a negative central weight for D > 3.
+    """
+    if kappa is None:
+        kappa = 3. - D
+    axes = np.sqrt(D + kappa) * np.eye(D)
+    xn = np.vstack([np.zeros((1, D)), axes, -axes])
+    wn = np.hstack([[kappa / (D + kappa)], np.ones(2 * D) / (2. * (D + kappa))])
+    return xn, wn
+
+
+@_cached
+def cubature(D):
+    """
+    The 2D points of the third-degree spherical-radial cubature rule, at
+    +-sqrt(D) along the axes, with equal weights. See
+
+    Arasaratnam, I. and Haykin, S. Cubature Kalman filters. IEEE
+    Transactions on Automatic Control, 2009.
+    """
+    axes = np.sqrt(D) * np.eye(D)
+    return np.vstack([axes, -axes]), np.ones(2 * D) / (2. * D)
+
+
+@_cached
+def monte_carlo(num_samples, D, seed=0):
+    """
+    num_samples samples from N(0, I), drawn with a fixed seed so that the
+    objective of a model is deterministic, with equal weights.
+    """
+    return np.random.RandomState(seed).randn(num_samples, D), np.ones(num_samples) / num_samples
+
+
+def rule(H, D):
+    """
+    The nodes and weights of the quadrature rule selected by
+    settings.numerics.ekern_quadrature_rule, for dimension D. H is the
+    number of points per dimension of the Gauss-Hermite rule.
+    """
+    name = settings.numerics.ekern_quadrature_rule
+    if name == 'gauss_hermite':
+        xn, wn = gauss_hermite(H, D)
+    elif name == 'smolyak':
+        xn, wn = smolyak(settings.numerics.ekern_quadrature_level, D)
+    elif name == 'unscented':
+        xn, wn = unscented(D)
+    elif name == 'cubature':
+        xn, wn = cubature(D)
+    elif name == 'monte_carlo':
+        xn, wn = monte_carlo(settings.numerics.ekern_quadrature_samples, D)
+    else:
+        raise ValueError("Unknown quadrature rule: " + str(name))
+    return xn, wn
+
+
+def mvnquad(means, covs, H, D):
+    """
+    Return the evaluation locations, and weights, of the quadrature rule
+    selected in the settings (see rule) for each of the Gaussians
+    N(means[n], covs[n]).
+    :param means: NxD
+    :param covs: NxDxD
+    :param H: Number of Gauss-Hermite evaluation points per dimension.
+    :param D: Number of input dimensions. Needs to be known at call-time.
+    :return: eval_locations (P*NxD), weights (P), for a rule of P points.
+    """
+    xn, wn = rule(H, D)
+    X = mvnnodes(means, tf.cholesky(covs), xn)  # PxNxD
+    Xr = tf.reshape(X, (-1, D))  # (P*N)xD
+    return Xr, wn
+
+
+def mvnnodes(means, cholcovs, xn):
+    """
+    Map the nodes xn (PxD) of a rule for N(0, I) to the Gaussians
+    N(means[n], L_n L_n^T), given the Cholesky factors L_n.
+    :param means: NxD
+    :param cholcovs: NxDxD
+    :param xn: PxD, an array or a tensor (e.g. a block of the nodes of a rule)
+    :return: PxNxD
+    """
+    N = tf.shape(means)[0]
+    xn = tf.convert_to_tensor(xn, dtype=settings.dtypes.float_type)
+    X = tf.batch_matmul(cholcovs, tf.tile(tf.expand_dims(xn, 0), tf.pack([N, 1, 1])),
+                        adj_y=True) + tf.expand_dims(means, 2)  # NxDxP
+    return tf.transpose(X, [2, 0, 1])
@@ -21,9 +21,27 @@ from .param import Param, DataHolder
 from .mean_functions import Zero
 from . import likelihoods
 from .tf_wraps import eye
+from .conditionals import uncertain_conditional
 from ._settings import settings
 
 
+def collapsed_predictor(L, LB, c):
+    """
+    The prediction of the collapsed bound at a point x is
+
+        f(x) ~ N(k_xZ alpha, k_xx - k_xZ B k_Zx)
+
+    with alpha = W c and B = Kuu^{-1} - W W^T, where W = L^{-T} LB^{-T}, for
+    the terms L, LB and c of SGPR._build_posterior. Returns alpha and B.
+    """
+    num_inducing = tf.shape(L)[0]
+    Linv = tf.matrix_triangular_solve(L, eye(num_inducing), lower=True)
+    WT = tf.matrix_triangular_solve(LB, Linv, lower=True)
+    alpha = tf.matmul(WT, c, transpose_a=True)
+    B = tf.matmul(Linv, Linv, transpose_a=True) - tf.matmul(WT, WT, transpose_a=True)
+    return alpha, B
+
+
 class SGPR(GPModel):
     """
     Sparse Variational GP regression. The key reference is
@@ -97,17 +115,15 @@ class SGPR(GPModel):
 
         return bound
 
-    def build_predict(self, Xnew, full_cov=False):
+    def _build_posterior(self):
         """
-        Compute the mean and variance of the latent function at some new points
-        Xnew. For a derivation of the terms in here, see the associated SGPR
-        notebook.
+        The terms of the optimal q(u): the Cholesky factors L of Kuu and LB of
+        I + L^{-1} Kuf Kfu L^{-T} / sigma^2, and c = LB^{-1} L^{-1} Kuf err / sigma^2.
         """
         num_inducing = tf.shape(self.Z)[0]
         err = self.Y - self.mean_function(self.X)
         Kuf = self.kern.K(self.Z, self.X)
         Kuu = self.kern.K(self.Z) + eye(num_inducing) * settings.numerics.jitter_level
-        Kus = self.kern.K(self.Z, Xnew)
         sigma = tf.sqrt(self.likelihood.variance)
         L = tf.cholesky(Kuu)
         A = tf.matrix_triangular_solve(L, Kuf, lower=True) / sigma
@@ -115,6 +131,16 @@ class SGPR(GPModel):
         LB = tf.cholesky(B)
         Aerr = tf.matmul(A, err)
         c = tf.matrix_triangular_solve(LB, Aerr, lower=True) / sigma
+        return L, LB, c
+
+    def build_predict(self, Xnew, full_cov=False):
+        """
+        Compute the mean and variance of the latent function at some new points
+        Xnew. For a derivation of the terms in here, see the associated SGPR
+        notebook.
+        """
+        L, LB, c = self._build_posterior()
+        Kus = self.kern.K(self.Z, Xnew)
         tmp1 = tf.matrix_triangular_solve(L, Kus, lower=True)
         tmp2 = tf.matrix_triangular_solve(LB, tmp1, lower=True)
         mean = tf.matmul(tf.transpose(tmp2), c)
@@ -130,6 +156,16 @@ class SGPR(GPModel):
             var = tf.tile(tf.expand_dims(var, 1), shape)
         return mean + self.mean_function(Xnew), var
 
+    def build_predict_uncertain(self, Xmu, Xcov):
+        """
+        Compute the mean and variance of the latent function at uncertain
+        inputs x ~ N(Xmu, Xcov), by moment matching (see
+        conditionals.uncertain_conditional).
+        """
+        alpha, B = collapsed_predictor(*self._build_posterior())
+        mean, var = uncertain_conditional(Xmu, Xcov, self.Z, self.kern, alpha, B)
+        return mean + self.mean_function(Xmu), var
+
 
 class GPRFITC(GPModel):
 
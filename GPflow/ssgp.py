@@ -0,0 +1,113 @@
+# Copyright 2017 the GPflow authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import
+import tensorflow as tf
+import numpy as np
+from .param import Param
+from .model import GPModel
+from . import transforms, kernels, kullback_leiblers
+from .mean_functions import Zero
+from ._settings import settings
+from .minibatch import MinibatchData
+
+
+class SSGP(GPModel):
+    """
+    The Sparse Spectrum GP: Bayesian linear regression on random Fourier
+    features (see kernels.RandomFourierFeatures),
+
+        f(x) = phi(x)^T w,   w ~ N(0, I),
+
+    with a Gaussian variational posterior q(w) = N(q_mu, q_sqrt q_sqrt^T),
+    as in SVGP. The bound is a sum over the data, so it can be computed on
+    minibatches, at a cost of O(B F^2) per minibatch of size B, for 2F
+    features. With a Gaussian likelihood, the optimal q(w) is the exact
+    posterior and the bound is the marginal likelihood of the feature model.
+    See
+
+    Lazaro-Gredilla, M., Quinonero-Candela, J., Rasmussen, C. E. and
+    Figueiras-Vidal, A. R. Sparse spectrum Gaussian process regression.
+    JMLR, 2010.
+    """
+    def __init__(self, X, Y, kern, likelihood, num_features=100, sampling='random',
+                 mean_function=Zero(), num_latent=None, q_diag=False, minibatch_size=None, seed=0):
+        """
+        - X is a data matrix, size N x D
+        - Y is a data matrix, size N x R
+        - kern is a kernels.RandomFourierFeatures object, or a stationary
+          kernel which is approximated with num_features frequencies sampled
+          as specified by `sampling` (see kernels.RandomFourierFeatures)
+        - likelihood, mean_function are appropriate GPflow objects
+        - num_latent is the number of latent process to use, default to
+          Y.shape[1]
+        - q_diag is a boolean. If True, the covariance is approximated by a
+          diagonal matrix.
+        """
+        if not isinstance(kern, kernels.RandomFourierFeatures):
+            kern = kernels.RandomFourierFeatures(kern, num_features, sampling, seed)
+        if minibatch_size is None:
+            minibatch_size = X.shape[0]
+        self.num_data = X.shape[0]
+        X = MinibatchData(X, minibatch_size, np.random.RandomState(0))
+        Y = MinibatchData(Y, minibatch_size, np.random.RandomState(0))
+
+        GPModel.__init__(self, X, Y, kern, likelihood, mean_function)
+        self.q_diag = q_diag
+        self.num_latent = num_latent or Y.shape[1]
+        self.num_features = 2 * kern.num_features
+
+        self.q_mu = Param(np.zeros((self.num_features, self.num_latent)))
+        if self.q_diag:
+            self.q_sqrt = Param(np.ones((self.num_features, self.num_latent)),
+                                transforms.positive)
+        else:
+            q_sqrt = np.array([np.eye(self.num_features)
+                               for _ in range(self.num_latent)]).swapaxes(0, 2)
+            self.q_sqrt = Param(q_sqrt)
+
+    def build_prior_KL(self):
+        if self.q_diag:
+            return kullback_leiblers.gauss_kl_white_diag(self.q_mu, self.q_sqrt)
+        return kullback_leiblers.gauss_kl_white(self.q_mu, self.q_sqrt)
+
+    def build_likelihood(self):
+        """
+        This gives a variational bound on the model likelihood.
+        """
+        KL = self.build_prior_KL()
+        fmean, fvar = self.build_predict(self.X, full_cov=False)
+        var_exp = self.likelihood.variational_expectations(fmean, fvar, self.Y)
+
+        # re-scale for minibatch size
+        scale = tf.cast(self.num_data, settings.dtypes.float_type) /\
+            tf.cast(tf.shape(self.X)[0], settings.dtypes.float_type)
+
+        return tf.reduce_sum(var_exp) * scale - KL
+
+    def build_predict(self, Xnew, full_cov=False):
+        Phi = self.kern.feature_map(Xnew)  # N x F
+        fmean = tf.matmul(Phi, self.q_mu) + self.mean_function(Xnew)
+        if self.q_diag:
+            LTA = tf.expand_dims(tf.transpose(Phi), 0) * tf.expand_dims(tf.transpose(self.q_sqrt), 2)  # R x F x N
+        else:
+            L = tf.matrix_band_part(tf.transpose(self.q_sqrt, (2, 0, 1)), -1, 0)  # R x F x F
+            Phi_tiled = tf.tile(tf.expand_dims(tf.transpose(Phi), 0), tf.pack([self.num_latent, 1, 1]))
+            LTA = tf.batch_matmul(L, Phi_tiled, adj_x=True)  # R x F x N
+        if full_cov:
+            fvar = tf.batch_matmul(LTA, LTA, adj_x=True)  # R x N x N
+        else:
+            fvar = tf.reduce_sum(tf.square(LTA), 1)  # R x N
+        return fmean, tf.transpose(fvar)
@@ -0,0 +1,266 @@
+# Copyright 2017 the GPflow authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import
+from functools import reduce
+import numpy as np
+import tensorflow as tf
+from .model import GPModel
+from .mean_functions import Zero
+from . import likelihoods, kernels
+from .param import DataHolder
+from .tf_wraps import eye
+from ._settings import settings
+float_type = settings.dtypes.float_type
+
+_sde_kernels = (kernels.Matern12, kernels.Matern32, kernels.Matern52)
+
+
+def is_markovian(kern):
+    """
+    Whether the kernel has an exact state-space representation here: a
+    Matern kernel of order 1/2, 3/2 or 5/2, or a sum of them.
+    """
+    if isinstance(kern, kernels.Add):
+        return all(is_markovian(k) for k in kern.kern_list)
+    return isinstance(kern, _sde_kernels)
+
+
+def _flatten(kern):
+    """
+    The Matern kernels of a Matern kernel or of a (nested) sum of them.
+    """
+    if isinstance(kern, kernels.Add):
+        return [k for child in kern.kern_list for k in _flatten(child)]
+    if isinstance(kern, _sde_kernels):
+        return [kern]
+    raise ValueError("The kernel must be a Matern12, Matern32 or Matern52 kernel, or a sum of them, not %s."
+                     % type(kern).__name__)
+
+
+def _matern_sde(kern):
+    """
+    The state-space representation of a Matern kernel, as (lam, N, Pinf, d).
+
+    The feedback matrix of the SDE is F = N - lam I, where N is nilpotent,
+    and Pinf is the stationary covariance of the state, whose first element
+    is the function value. d is the dimension of the state.
+    """
+    variance = tf.reshape(kern.variance, [])
+    lengthscale = tf.reshape(kern.lengthscales, [])
+    zero = tf.zeros([], float_type)
+    one = tf.ones([], float_type)
+    if isinstance(kern, kernels.Matern12):
+        d = 1
+        lam = 1. / lengthscale
+        N = tf.zeros((1, 1), float_type)
+        Pinf = tf.reshape(variance, (1, 1))
+    elif isinstance(kern, kernels.Matern32):
+        d = 2
+        lam = np.sqrt(3.) / lengthscale
+        N = tf.pack([tf.pack([lam, one]), tf.pack([-tf.square(lam), -lam])])
+        Pinf = tf.diag(tf.pack([variance, tf.square(lam) * variance]))
+    else:
+        d = 3
+        lam = np.sqrt(5.) / lengthscale
+        lam2 = tf.square(lam)
+        N = tf.pack([tf.pack([lam, one, zero]),
+                     tf.pack([zero, lam, one]),
+                     tf.pack([-lam2 * lam, -3. * lam2, -2. * lam])])
+        kappa = lam2 * variance / 3.
+        Pinf = tf.pack([tf.pack([variance, zero, -kappa]),
+                        tf.pack([zero, kappa, zero]),
+                        tf.pack([-kappa, zero, tf.square(lam2) * variance])])
+    return lam, N, Pinf, d
+
+
+def _block_diag(blocks, sizes):
+    D = sum(sizes)
+    offsets = np.cumsum([0] + sizes)
+    return reduce(tf.add, [tf.pad(B, [[int(o), int(D - o - d)], [int(o), int(D - o - d)]])
+                           for B, o, d in zip(blocks, offsets, sizes)])
+
+
+class StateSpace(object):
+    """
+    The state-space representation of a sum of Matern kernels: the
+    components of the sum are independent, so the state is the
+    concatenation of their states, and the matrices are block diagonal.
+
+    The transition matrices have a closed form: since N is nilpotent with
+    N^d = 0,
+
+        A(dt) = expm(F dt) = exp(-lam dt) sum_{k<d} (N dt)^k / k! ,
+
+    and the process noise is Q(dt) = Pinf - A(dt) Pinf A(dt)^T. See
+
+    Hartikainen, J. and Sarkka, S. Kalman filtering and smoothing solutions
+    to temporal Gaussian process regression models. MLSP, 2010.
+    """
+    def __init__(self, kern):
+        self.components = [_matern_sde(k) for k in _flatten(kern)]
+        self.sizes = [d for _, _, _, d in self.components]
+        self.Pinf = _block_diag([Pinf for _, _, Pinf, _ in self.components], self.sizes)
+        self.H = np.hstack([np.eye(1, d) for d in self.sizes])
+
+    def transition(self, dt):
+        """
+        The transition matrix and process noise for a time step dt.
+        """
+        blocks = []
+        for lam, N, _, d in self.components:
+            S, Nk = eye(d), eye(d)
+            for k in range(1, d):
+                Nk = tf.matmul(Nk, N) * dt / k
+                S = S + Nk
+            blocks.append(tf.exp(-lam * dt) * S)
+        A = _block_diag(blocks, self.sizes)
+        return A, self.Pinf - tf.matmul(tf.matmul(A, self.Pinf), tf.transpose(A))
+
+
+def kalman_filter(ss, dt, Y, mask, noise_variance):
+    """
+    Run the Kalman filter of the state-space model ss, on the observations
+    Y (T x R), at time intervals dt (T, with dt[0] = 0). The columns of Y
+    share the same state covariance. Steps where mask is zero are not
+    observed.
+
+    Returns the predicted and filtered means and covariances of the state,
+    the transition matrices, and the log likelihood of each step.
+    """
+    H = tf.constant(ss.H, float_type)
+    R = tf.shape(Y)[1]
+
+    def step(state, elems):
+        _, _, m, P, _, _ = state
+        dt_t, y_t, mask_t = elems
+        A, Q = ss.transition(dt_t)
+        m_pred = tf.matmul(A, m)
+        P_pred = tf.matmul(tf.matmul(A, P), tf.transpose(A)) + Q
+        S = tf.matmul(tf.matmul(H, P_pred), tf.transpose(H)) + noise_variance  # 1 x 1
+        v = tf.expand_dims(y_t, 0) - tf.matmul(H, m_pred)  # 1 x R
+        K = tf.matmul(P_pred, tf.transpose(H)) / S * mask_t  # D x 1
+        m_filt = m_pred + tf.matmul(K, v)
+        P_filt = P_pred - tf.matmul(K, tf.transpose(K)) * S
+        loglik = -0.5 * mask_t * (tf.cast(R, float_type) * tf.log(2 * np.pi * S[0, 0]) +
+                                  tf.reduce_sum(tf.square(v)) / S[0, 0])
+        return m_pred, P_pred, m_filt, P_filt, A, loglik
+
+    D = sum(ss.sizes)
+    m0 = tf.zeros(tf.pack([D, R]), float_type)
+    initializer = (m0, ss.Pinf, m0, ss.Pinf, eye(D), tf.zeros([], float_type))
+    return tf.scan(step, (dt, Y, mask), initializer=initializer)
+
+
+def rts_smoother(m_pred, P_pred, m_filt, P_filt, A):
+    """
+    Run the Rauch-Tung-Striebel smoother on the output of kalman_filter.
+    Returns the smoothed means and covariances of the state.
+    """
+    def step(state, elems):
+        m_next, P_next = state
+        m_f, P_f, m_p, P_p, A_next = elems
+        G = tf.transpose(tf.matrix_solve(P_p, tf.matmul(A_next, P_f)))
+        m_s = m_f + tf.matmul(G, m_next - m_p)
+        P_s = P_f + tf.matmul(tf.matmul(G, P_next - P_p), tf.transpose(G))
+        return m_s, P_s
+
+    def reverse(x):
+        return tf.reverse(x, [True, False, False])
+
+    elems = tuple(reverse(x) for x in (m_filt[:-1], P_filt[:-1], m_pred[1:], P_pred[1:], A[1:]))
+    m_s, P_s = tf.scan(step, elems, initializer=(m_filt[-1], P_filt[-1]))
+    return (tf.concat(0, [reverse(m_s), m_filt[-1:]]),
+            tf.concat(0, [reverse(P_s), P_filt[-1:]]))
+
+
+class StateSpaceGPR(GPModel):
+    """
+    Gaussian process regression on 1-D (time) inputs for Matern kernels, by
+    Kalman filtering and Rauch-Tung-Striebel smoothing.
+
+    Matern kernels of order 1/2, 3/2 and 5/2, and sums of them, are the
+    covariances of linear SDEs (see StateSpace), so the likelihood of GPR
+    can be computed in O(N) time by Kalman filtering, and differentiated
+    through the filter. Predictions at arbitrary times are made by merging
+    them into the sequence as unobserved steps and smoothing.
+
+    The data are stored sorted by time.
+    """
+    def __init__(self, X, Y, kern, mean_function=Zero()):
+        """
+        X is a data matrix, size N x 1, of times
+        Y is a data matrix, size N x R
+        kern is a Matern kernel or a sum of them, mean_function is an
+        appropriate GPflow object
+        """
+        if X.ndim != 2 or X.shape[1] != 1:
+            raise ValueError("X must be N x 1.")
+        if not is_markovian(kern):
+            raise ValueError("The kernel must be a Matern12, Matern32 or Matern52 kernel, or a sum of them.")
+        order = np.argsort(X[:, 0], kind='mergesort')
+        likelihood = likelihoods.Gaussian()
+        X = DataHolder(X[order])
+        Y = DataHolder(Y[order])
+        GPModel.__init__(self, X, Y, kern, likelihood, mean_function)
+        self.num_latent = Y.shape[1]
+
+    def _filter(self, t, Y, mask):
+        dt = tf.concat(0, [tf.zeros([1], float_type), t[1:] - t[:-1]])
+        return kalman_filter(StateSpace(self.kern), dt, Y, mask, self.likelihood.variance)
+
+    def build_likelihood(self):
+        """
+        Construct a tensorflow function to compute the likelihood.
+
+            \log p(Y | theta).
+
+        """
+        t = tf.reshape(self.X, [-1])
+        mask = tf.ones_like(t)
+        loglik = self._filter(t, self.Y - self.mean_function(self.X), mask)[-1]
+        return tf.reduce_sum(loglik)
+
+    def build_predict(self, Xnew, full_cov=False):
+        """
+        Xnew is a data matrix, point at which we want to predict
+
+        This method computes
+
+            p(F* | Y )
+
+        where F* are points on the GP at Xnew, Y are noisy observations at X.
+
+        Only the marginal variances are available.
+        """
+        if full_cov:
+            raise NotImplementedError("The state-space model only computes marginal variances.")
+        num_data, num_new = tf.shape(self.X)[0], tf.shape(Xnew)[0]
+        t = tf.concat(0, [tf.reshape(self.X, [-1]), tf.reshape(Xnew, [-1])])
+        _, order = tf.nn.top_k(-t, k=tf.shape(t)[0])
+        Y = tf.concat(0, [self.Y - self.mean_function(self.X),
+                          tf.zeros(tf.pack([num_new, tf.shape(self.Y)[1]]), float_type)])
+        mask = tf.concat(0, [tf.ones(tf.pack([num_data]), float_type), tf.zeros(tf.pack([num_new]), float_type)])
+
+        m_pred, P_pred, m_filt, P_filt, A, _ = self._filter(tf.gather(t, order), tf.gather(Y, order),
+                                                            tf.gather(mask, order))
+        m_s, P_s = rts_smoother(m_pred, P_pred, m_filt, P_filt, A)
+
+        # the positions of Xnew in the sorted sequence
+        position = tf.slice(tf.invert_permutation(order), tf.pack([num_data]), [-1])
+        fmean = tf.gather(m_s[:, 0, :], position) + self.mean_function(Xnew)
+        fvar = tf.gather(P_s[:, 0, 0], position)
+        fvar = tf.tile(tf.reshape(fvar, (-1, 1)), [1, tf.shape(self.Y)[1]])
+        return fmean, fvar
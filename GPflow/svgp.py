@@ -115,3 +115,33 @@ class SVGP(GPModel):
         mu, var = conditionals.conditional(Xnew, self.Z, self.kern, self.q_mu,
                                            q_sqrt=self.q_sqrt, full_cov=full_cov, whiten=self.whiten)
         return mu + self.mean_function(Xnew), var
+
+    def build_predict_uncertain(self, Xmu, Xcov):
+        """
+        Compute the mean and variance of the latent function at uncertain
+        inputs x ~ N(Xmu, Xcov), by moment matching (see
+        conditionals.uncertain_conditional). With q(u) = N(m, S), the
+        prediction at a point x has
+
+            alpha = Kuu^{-1} m,   B_k = Kuu^{-1} - Kuu^{-1} S_k Kuu^{-1}
+
+        and, if whitened, q(v) = N(m, S) with u = L v, so that
+        alpha = L^{-T} m and B_k = Kuu^{-1} - L^{-T} S_k L^{-1}.
+        """
+        L = tf.cholesky(self.kern.K(self.Z) + eye(self.num_inducing) * settings.numerics.jitter_level)
+        Linv = tf.matrix_triangular_solve(L, eye(self.num_inducing), lower=True)
+        Kinv = tf.matmul(Linv, Linv, transpose_a=True)
+        P = tf.transpose(Linv) if self.whiten else Kinv
+        alpha = tf.matmul(P, self.q_mu)  # M x K
+
+        # T_k = P q_sqrt_k, so that B_k = Kuu^{-1} - T_k T_k^T
+        if self.q_diag:
+            T = tf.expand_dims(P, 0) * tf.expand_dims(tf.transpose(self.q_sqrt), 1)  # K x M x M
+        else:
+            Lq = tf.matrix_band_part(tf.transpose(self.q_sqrt, (2, 0, 1)), -1, 0)  # K x M x M
+            P_tiled = tf.tile(tf.expand_dims(P, 0), tf.pack([tf.shape(Lq)[0], 1, 1]))
+            T = tf.batch_matmul(P_tiled, Lq)
+        B = tf.expand_dims(Kinv, 0) - tf.batch_matmul(T, T, adj_y=True)
+        mean, var = conditionals.uncertain_conditional(Xmu, Xcov, self.Z, self.kern, alpha,
+                                                       tf.transpose(B, (1, 2, 0)))
+        return mean + self.mean_function(Xmu), var
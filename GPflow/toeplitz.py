@@ -0,0 +1,150 @@
+# Copyright 2017 the GPflow authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import
+import numpy as np
+import tensorflow as tf
+from .model import GPModel
+from .mean_functions import Zero
+from . import likelihoods, kernels
+from .param import DataHolder
+from .iterative import conjugate_gradient, gaussian_log_density
+from ._settings import settings
+float_type = settings.dtypes.float_type
+
+
+def toeplitz_matvec(c, V):
+    """
+    Compute T V, where T is the symmetric Toeplitz matrix whose first column
+    is c, in O(N log N) time per column of V.
+
+    T is embedded in a circulant matrix of size 2N, whose products are
+    computed with the FFT. TensorFlow's FFT works in single precision
+    (complex64), so the result is accurate to around 1e-7 relative to |c||V|
+    whatever the float type.
+    """
+    N = tf.shape(c)[0]
+    circulant = tf.concat(0, [c, tf.zeros([1], float_type), tf.reverse(c[1:], [True])])
+    V = tf.pad(tf.transpose(V), tf.pack([[0, 0], tf.pack([0, N])]))
+
+    def fft(x):
+        x = tf.cast(x, tf.float32)
+        return tf.fft(tf.complex(x, tf.zeros_like(x)))
+
+    TV = tf.cast(tf.real(tf.ifft(fft(circulant) * fft(V))), float_type)
+    return tf.transpose(tf.slice(TV, [0, 0], tf.pack([-1, N])))
+
+
+def is_regular(X):
+    """
+    Whether the 1-D inputs X are evenly spaced (in either direction).
+    """
+    X = np.asarray(X)
+    if X.ndim != 2 or X.shape[1] != 1 or X.shape[0] < 2:
+        return False
+    step = np.diff(X[:, 0])
+    return step[0] != 0 and np.allclose(step, step[0])
+
+
+def is_stationary(kern):
+    """
+    Whether the covariance of the kernel only depends on x - x', so that it
+    is Toeplitz on evenly spaced inputs.
+    """
+    if isinstance(kern, kernels.Combination):
+        return all(is_stationary(k) for k in kern.kern_list)
+    return isinstance(kern, (kernels.Stationary, kernels.PeriodicKernel, kernels.Constant))
+
+
+class ToeplitzGPR(GPModel):
+    """
+    Gaussian process regression for evenly spaced 1-D inputs.
+
+    The covariance of a stationary kernel on evenly spaced inputs is a
+    Toeplitz matrix, which is represented by its first column. Products with
+    it cost O(N log N) using the FFT, so the likelihood is computed with
+    conjugate gradients and stochastic Lanczos quadrature (see
+    GPflow.iterative), and the predictions with conjugate gradients, rather
+    than the O(N^3) Cholesky decomposition of the GPR model.
+
+    The log determinant is estimated with `num_probes` fixed Rademacher
+    vectors, so the objective is deterministic, but only approximately equal
+    to that of GPR; the accuracy of the solves is set by `tolerance`.
+    """
+    def __init__(self, X, Y, kern, mean_function=Zero(), max_iterations=1000,
+                 tolerance=1e-6, num_probes=10, lanczos_iterations=30, seed=0):
+        """
+        X is a data matrix, size N x 1, of evenly spaced points
+        Y is a data matrix, size N x R
+        kern, mean_function are appropriate GPflow objects
+        """
+        if not is_regular(X):
+            raise ValueError("X must be N x 1 and evenly spaced.")
+        if not is_stationary(kern):
+            raise ValueError("The kernel must be stationary.")
+        likelihood = likelihoods.Gaussian()
+        probes = np.sign(np.random.RandomState(seed).rand(X.shape[0], num_probes) - 0.5)
+        X = DataHolder(X)
+        Y = DataHolder(Y)
+        GPModel.__init__(self, X, Y, kern, likelihood, mean_function)
+        self.probes = DataHolder(probes)
+        self.num_latent = Y.shape[1]
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        self.lanczos_iterations = lanczos_iterations
+
+    def _matvec(self):
+        """
+        The product with K + sigma^2 I, from the first column of K.
+        """
+        c = tf.reshape(self.kern.K(self.X[:1], self.X), [-1])
+        c = c + tf.concat(0, [tf.reshape(self.likelihood.variance, [1]), tf.zeros_like(c[1:])])
+        return lambda V: toeplitz_matvec(c, V)
+
+    def build_likelihood(self):
+        """
+        Construct a tensorflow function to compute the likelihood.
+
+            \log p(Y | theta).
+
+        """
+        return gaussian_log_density(self._matvec(), self.Y - self.mean_function(self.X), self.probes,
+                                    self.max_iterations, self.tolerance, self.lanczos_iterations)
+
+    def build_predict(self, Xnew, full_cov=False):
+        """
+        Xnew is a data matrix, point at which we want to predict
+
+        This method computes
+
+            p(F* | Y )
+
+        where F* are points on the GP at Xnew, Y are noisy observations at X.
+
+        """
+        Kx = self.kern.K(self.X, Xnew)
+        R = tf.shape(self.Y)[1]
+        solve = conjugate_gradient(self._matvec(), tf.concat(1, [self.Y - self.mean_function(self.X), Kx]),
+                                   self.max_iterations, self.tolerance)
+        alpha, A = solve[:, :R], solve[:, R:]
+        fmean = tf.matmul(tf.transpose(Kx), alpha) + self.mean_function(Xnew)
+        if full_cov:
+            fvar = self.kern.K(Xnew) - tf.matmul(tf.transpose(Kx), A)
+            shape = tf.pack([1, 1, tf.shape(self.Y)[1]])
+            fvar = tf.tile(tf.expand_dims(fvar, 2), shape)
+        else:
+            fvar = self.kern.Kdiag(Xnew) - tf.reduce_sum(Kx * A, 0)
+            fvar = tf.tile(tf.reshape(fvar, (-1, 1)), [1, tf.shape(self.Y)[1]])
+        return fmean, fvar
@@ -0,0 +1,67 @@
+"""
+Benchmark for the covariance of sums and products of stationary kernels.
+
+Stationary kernels which act on the same dimensions share the computation of
+the squared distances when they are combined in an Add or Prod kernel. This
+script compares the time taken to compute K for such a combination with the
+time taken by summing (or multiplying) the kernels computed separately, which
+forms one N x N distance matrix per kernel. Run with
+
+    python -m testing.benchmark_combination
+"""
+from __future__ import print_function, division
+import argparse
+import sys
+import timeit
+from functools import reduce
+import numpy as np
+import tensorflow as tf
+import GPflow
+
+
+def make_kernels(D):
+    return [GPflow.kernels.RBF(D, lengthscales=0.5),
+            GPflow.kernels.Matern32(D, lengthscales=1.),
+            GPflow.kernels.Matern52(D, lengthscales=2.)]
+
+
+def time_graph(K, feed_dict, repeats=5):
+    sess = tf.Session()
+    sess.run(K, feed_dict=feed_dict)
+    return min(timeit.repeat(lambda: sess.run(K, feed_dict=feed_dict), number=1, repeat=repeats))
+
+
+def run(N=5000, D=3, combination='add', repeats=5):
+    """
+    Return (seconds for the separate kernels, seconds for the combination).
+    """
+    tf.reset_default_graph()
+    op = {'add': tf.add, 'prod': tf.mul}[combination]
+    kern_list = make_kernels(D)
+    kern = {'add': GPflow.kernels.Add, 'prod': GPflow.kernels.Prod}[combination](kern_list)
+    x_free = tf.placeholder(tf.float64)
+    X = tf.placeholder(tf.float64, [None, D])
+    kern.make_tf_array(x_free)
+    with kern.tf_mode():
+        K_separate = reduce(op, [k.K(X) for k in kern_list])
+        K_shared = kern.K(X)
+    feed_dict = {x_free: kern.get_free_state(), X: np.random.RandomState(0).randn(N, D)}
+    return time_graph(K_separate, feed_dict, repeats), time_graph(K_shared, feed_dict, repeats)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--num-data', type=int, default=5000)
+    parser.add_argument('--input-dim', type=int, default=3)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print("{:>8} {:>12} {:>12} {:>8}".format('', 'separate/s', 'shared/s', 'speedup'))
+    for combination in ['add', 'prod']:
+        separate, shared = run(args.num_data, args.input_dim, combination, args.repeats)
+        print("{:>8} {:>12.4f} {:>12.4f} {:>8.2f}".format(combination, separate, shared, separate / shared))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
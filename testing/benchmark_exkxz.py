@@ -0,0 +1,88 @@
+"""
+Time and memory of the summed exKxz statistic of GP state-space models on
+long sequences.
+
+For each sequence length T, this reports the time taken to evaluate
+sum_t <x_{t-1} K_{x_t z}> for an RBF kernel (ekernels.RBF) and the peak
+memory of the TensorFlow allocator, both with the whole sequence at once
+(a chunk budget of 0) and in windows of the sequence (see
+Kern.sum_exKxz). Evaluations which run out of memory are reported as such.
+Run with
+
+    python -m testing.benchmark_exkxz
+"""
+from __future__ import print_function, division
+import argparse
+import sys
+import timeit
+import numpy as np
+import tensorflow as tf
+import GPflow
+
+LENGTHS = [1000, 10000, 100000]
+
+
+def make_data(T, M, D, seed=0):
+    rng = np.random.RandomState(seed)
+    Xmu = np.cumsum(rng.randn(T + 1, D) * 0.1, 0)
+    A = rng.randn(T + 1, D, D) * 0.1
+    Xcov = np.einsum('nij,nkj->nik', A, A) + np.eye(D) * 0.01
+    # cross covariances of consecutive steps
+    Xcovc = np.concatenate([Xcov[:-1] * 0.5, np.zeros((1, D, D))], 0)
+    return rng.rand(M, D), Xmu, np.array([Xcov, Xcovc])
+
+
+def peak_bytes(run_metadata):
+    peak = 0
+    for device in run_metadata.step_stats.dev_stats:
+        for node in device.node_stats:
+            for memory in node.memory:
+                peak = max(peak, memory.peak_bytes)
+    return peak
+
+
+def measure(T, M, D, memory):
+    Z, Xmu, Xcov = make_data(T, M, D)
+    config = GPflow.settings.get_settings()
+    config.numerics.ekern_chunk_memory = memory
+    tf.reset_default_graph()
+    kern = GPflow.ekernels.RBF(D)
+    free_vars = tf.placeholder(GPflow.settings.dtypes.float_type)
+    kern.make_tf_array(free_vars)
+    with kern.tf_mode(), GPflow.settings.temp_settings(config):
+        total = kern.sum_exKxz(tf.constant(Z), tf.constant(Xmu), tf.constant(Xcov))
+    options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+    run_metadata = tf.RunMetadata()
+    feed_dict = {free_vars: kern.get_free_state()}
+    with tf.Session() as session:
+        try:
+            session.run(total, feed_dict=feed_dict)  # warm up
+            t0 = timeit.default_timer()
+            session.run(total, feed_dict=feed_dict, options=options, run_metadata=run_metadata)
+            time = timeit.default_timer() - t0
+        except tf.errors.ResourceExhaustedError:
+            return dict(T=T, memory=memory, time=float('nan'), peak='OOM')
+    return dict(T=T, memory=memory, time=time, peak='%.1f' % (peak_bytes(run_metadata) / 2 ** 20))
+
+
+def run(lengths=LENGTHS, M=50, D=3, budgets=(0, 64)):
+    return [measure(T, M, D, memory) for T in lengths for memory in budgets]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--lengths', type=int, nargs='+', default=LENGTHS)
+    parser.add_argument('--num-inducing', type=int, default=50)
+    parser.add_argument('--input-dim', type=int, default=3)
+    parser.add_argument('--budgets', type=float, nargs='+', default=[0, 64],
+                        help='values of ekern_chunk_memory (MB) to compare; 0 is a single chunk')
+    args = parser.parse_args(argv)
+
+    print("{:>8} {:>10} {:>10} {:>12}".format('T', 'budget/MB', 'time/s', 'peak/MB'))
+    for r in run(args.lengths, args.num_inducing, args.input_dim, args.budgets):
+        print("{T:>8} {memory:>10} {time:>10.4f} {peak:>12}".format(**r))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
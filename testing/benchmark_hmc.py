@@ -0,0 +1,105 @@
+"""
+Micro-benchmarks for the Python overhead of GPflow.hmc.sample_HMC.
+
+The energy function used here is as cheap as possible, so the timings are
+dominated by the bookkeeping done by the sampler itself (momentum draws,
+leapfrog updates, accept/reject). Run with
+
+    python -m testing.benchmark_hmc
+
+to print the per-iteration and per-leapfrog-step overhead for a range of
+dimensions. Passing --max-overhead (in microseconds per leapfrog step, after
+subtracting the cost of the energy function) makes the script exit with a
+non-zero status if any dimension exceeds it, so it can be used as a
+regression check.
+"""
+from __future__ import print_function, division
+import argparse
+import sys
+import timeit
+import numpy as np
+from GPflow.hmc import sample_HMC
+
+DIMENSIONS = [10, 100, 1000, 10000, 100000]
+
+
+class QuadraticEnergy(object):
+    """
+    E(x) = 0.5 x^T x. The gradient is written into a preallocated buffer so
+    that the cost of the energy function is a single pass over x.
+    """
+    def __init__(self, D):
+        self.grad = np.empty(D)
+        self.calls = 0
+
+    def __call__(self, x):
+        self.calls += 1
+        np.copyto(self.grad, x)
+        return 0.5 * x.dot(x), self.grad
+
+
+def time_energy(D, repeats=1000):
+    """The cost (in seconds) of a single call to the energy function."""
+    f = QuadraticEnergy(D)
+    x = np.random.RandomState(0).randn(D)
+    return min(timeit.repeat(lambda: f(x), number=repeats, repeat=3)) / repeats
+
+
+def time_sampler(D, num_samples=200, L=10, epsilon=0.05):
+    """
+    Return (seconds per iteration, seconds per leapfrog step) for the
+    sampler, with a fixed number of leapfrog steps per iteration.
+    """
+    best = np.inf
+    for _ in range(3):
+        f = QuadraticEnergy(D)
+        t0 = timeit.default_timer()
+        sample_HMC(f, num_samples, Lmin=L, Lmax=L + 1, epsilon=epsilon, x0=np.zeros(D),
+                   RNG=np.random.RandomState(0))
+        elapsed = timeit.default_timer() - t0
+        best = min(best, elapsed / f.calls)
+    return best * (L + 1), best
+
+
+def run(dimensions=DIMENSIONS, num_samples=200, L=10):
+    """
+    Benchmark the sampler for each dimension. Returns a list of dicts with the
+    timings in microseconds.
+    """
+    results = []
+    for D in dimensions:
+        per_iteration, per_step = time_sampler(D, num_samples=num_samples, L=L)
+        energy = time_energy(D)
+        results.append(dict(D=D,
+                            iteration=per_iteration * 1e6,
+                            step=per_step * 1e6,
+                            energy=energy * 1e6,
+                            overhead=(per_step - energy) * 1e6))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--dims', type=int, nargs='+', default=DIMENSIONS)
+    parser.add_argument('--num-samples', type=int, default=200)
+    parser.add_argument('--leapfrog-steps', type=int, default=10)
+    parser.add_argument('--max-overhead', type=float, default=None,
+                        help='maximum overhead per leapfrog step, in microseconds')
+    args = parser.parse_args(argv)
+
+    results = run(args.dims, args.num_samples, args.leapfrog_steps)
+    print("{:>8} {:>14} {:>12} {:>12} {:>14}".format(
+        'D', 'us/iteration', 'us/step', 'us/energy', 'us overhead'))
+    for r in results:
+        print("{D:>8} {iteration:>14.2f} {step:>12.2f} {energy:>12.2f} {overhead:>14.2f}".format(**r))
+
+    if args.max_overhead is not None:
+        failed = [r['D'] for r in results if r['overhead'] > args.max_overhead]
+        if failed:
+            print("overhead above {} us/step for D = {}".format(args.max_overhead, failed))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
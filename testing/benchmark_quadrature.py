@@ -0,0 +1,75 @@
+"""
+Accuracy and cost of the quadrature rules for kernel expectations.
+
+For each input dimension D and each rule of GPflow.quadrature, this reports
+the number of nodes, the maximum error of the quadrature estimate of
+<K_xz>_q(x) for an RBF kernel against the closed form of ekernels.RBF, and
+the time taken to evaluate it. The Gauss-Hermite grid has H**D nodes, so it
+is only run for small D. Run with
+
+    python -m testing.benchmark_quadrature
+"""
+from __future__ import print_function, division
+import argparse
+import sys
+import timeit
+import numpy as np
+import tensorflow as tf
+import GPflow
+
+DIMENSIONS = [1, 2, 3, 4, 5]
+RULES = ['gauss_hermite', 'smolyak', 'unscented', 'cubature', 'monte_carlo']
+
+
+def make_data(N, M, D, seed=0):
+    rng = np.random.RandomState(seed)
+    Xmu = rng.rand(N, D)
+    A = rng.randn(N, D, D) * 0.3
+    Xcov = np.einsum('nij,nkj->nik', A, A) + np.eye(D) * 0.05
+    Z = rng.rand(M, D)
+    return Z, Xmu, Xcov
+
+
+def run(N=500, M=50, H=5, dimensions=DIMENSIONS, rules=RULES, max_grid=10 ** 5):
+    results = []
+    for D in dimensions:
+        Z, Xmu, Xcov = make_data(N, M, D)
+        expected = GPflow.ekernels.RBF(D).compute_eKxz(Z, Xmu, Xcov)
+        for name in rules:
+            if name == 'gauss_hermite' and H ** D > max_grid:
+                continue
+            config = GPflow.settings.get_settings()
+            config.numerics.ekern_quadrature_rule = name
+            config.numerics.ekern_quadrature = 'allow'
+            with GPflow.settings.temp_settings(config):
+                num_points = len(GPflow.quadrature.rule(H, D)[1])
+                kern = GPflow.kernels.RBF(D)
+                kern.num_gauss_hermite_points = H
+                kern.compute_eKxz(Z, Xmu, Xcov)  # build the graph
+                t0 = timeit.default_timer()
+                eKxz = kern.compute_eKxz(Z, Xmu, Xcov)
+                time = timeit.default_timer() - t0
+            results.append(dict(D=D, rule=name, points=num_points,
+                                error=np.max(np.abs(eKxz - expected)), time=time))
+            tf.reset_default_graph()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--num-data', type=int, default=500)
+    parser.add_argument('--num-inducing', type=int, default=50)
+    parser.add_argument('--num-points', type=int, default=5,
+                        help='number of Gauss-Hermite points per dimension')
+    parser.add_argument('--dimensions', type=int, nargs='+', default=DIMENSIONS)
+    parser.add_argument('--rules', nargs='+', default=RULES, choices=RULES)
+    args = parser.parse_args(argv)
+
+    print("{:>4} {:>14} {:>8} {:>10} {:>10}".format('D', 'rule', 'points', 'max error', 'time/s'))
+    for r in run(args.num_data, args.num_inducing, args.num_points, args.dimensions, args.rules):
+        print("{D:>4} {rule:>14} {points:>8} {error:>10.2e} {time:>10.4f}".format(**r))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Accuracy of random Fourier feature approximations against exact GP regression.
+
+For each number of frequencies F and each sampling scheme, this reports the
+maximum error of the approximate kernel matrix, and the error of the
+predictive mean and variance of GP regression with the feature kernel (which
+is what SSGP converges to with a Gaussian likelihood) relative to exact GPR,
+along with the time taken to fit SSGP by exact Bayesian linear regression,
+which is O(N F^2). Run with
+
+    python -m testing.benchmark_rff
+"""
+from __future__ import print_function, division
+import argparse
+import sys
+import timeit
+import numpy as np
+import tensorflow as tf
+import GPflow
+
+FEATURES = [10, 50, 100, 500, 1000]
+SAMPLING = ['random', 'orthogonal', 'quasi']
+
+
+def make_data(N, D=2, seed=0):
+    rng = np.random.RandomState(seed)
+    X = rng.rand(N, D) * 5
+    Y = np.sin(X).sum(1, keepdims=True) + rng.randn(N, 1) * 0.1
+    Xtest = rng.rand(200, D) * 5
+    return X, Y, Xtest
+
+
+def make_kern(D):
+    return GPflow.kernels.Matern32(D, lengthscales=1.)
+
+
+def run(N=1000, features=FEATURES, sampling=SAMPLING):
+    tf.reset_default_graph()
+    X, Y, Xtest = make_data(N)
+    D = X.shape[1]
+    exact = GPflow.gpr.GPR(X, Y, make_kern(D))
+    exact.likelihood.variance = 0.01
+    K = exact.kern.compute_K_symm(X)
+    mu, var = exact.predict_f(Xtest)
+
+    results = []
+    for scheme in sampling:
+        for F in features:
+            rff = GPflow.kernels.RandomFourierFeatures(make_kern(D), F, scheme)
+            approx = GPflow.gpr.GPR(X, Y, rff)
+            approx.likelihood.variance = 0.01
+            mu_rff, var_rff = approx.predict_f(Xtest)
+
+            Phi = rff.compute_feature_map(X)
+            t0 = timeit.default_timer()
+            S = np.linalg.inv(np.eye(2 * F) + Phi.T.dot(Phi) / 0.01)
+            S.dot(Phi.T.dot(Y)) / 0.01
+            fit_time = timeit.default_timer() - t0
+
+            results.append(dict(sampling=scheme, F=F,
+                                K=np.max(np.abs(rff.compute_K_symm(X) - K)),
+                                mean=np.sqrt(np.mean(np.square(mu_rff - mu))),
+                                var=np.sqrt(np.mean(np.square(var_rff - var))),
+                                time=fit_time))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--num-data', type=int, default=1000)
+    parser.add_argument('--features', type=int, nargs='+', default=FEATURES)
+    parser.add_argument('--sampling', nargs='+', default=SAMPLING, choices=SAMPLING)
+    args = parser.parse_args(argv)
+
+    print("{:>12} {:>6} {:>10} {:>10} {:>10} {:>10}".format(
+        'sampling', 'F', 'max |dK|', 'rmse mean', 'rmse var', 'fit/s'))
+    for r in run(args.num_data, args.features, args.sampling):
+        print("{sampling:>12} {F:>6} {K:>10.4f} {mean:>10.4f} {var:>10.4f} {time:>10.4f}".format(**r))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import numpy as np
+from GPflow.param import Param
 
 def referenceRbfKernel( X, lengthScale, signalVariance ):
     (nDataPoints, inputDimensions ) = X.shape
@@ -18,4 +19,29 @@ def referencePeriodicKernel( X, lengthScale, signalVariance, period ):
     base = np.pi * (X[:, None, :] - X[None, :, :]) / period
     exp_dist = np.exp( -0.5* np.sum( np.square(  np.sin( base ) / lengthScale ), axis = -1 ) )
     return signalVariance * exp_dist
-    
\ No newline at end of file
+    
+
+
+def free_gradients(model):
+    """
+    The objective of a model at its current state, and its gradient for
+    each free parameter, by long name. The position of a parameter in the
+    free state depends on the ids of the objects, so the gradients of two
+    models can only be compared parameter by parameter.
+    """
+    def params(node):
+        for child in node.sorted_params:
+            if isinstance(child, Param):
+                yield child
+            else:
+                for p in params(child):
+                    yield p
+
+    model._compile()
+    f, g = model._objective(model.get_free_state())
+    gradients = {}
+    for p in params(model):
+        if not p.fixed:
+            start, _ = model.get_param_index(p)
+            gradients[p.long_name] = g[start:start + p.size]
+    return f, gradients
@@ -126,5 +126,54 @@ class TestEquivalence(unittest.TestCase):
         self.cvgp.predict_f_full_cov(X_augumented1)
 
 
+class TestICM(unittest.TestCase):
+    """
+    The ICM model must match GPR with a coregionalized kernel on the
+    augmented inputs, whether or not all the outputs are observed.
+    """
+    def setUp(self):
+        tf.reset_default_graph()
+        rng = np.random.RandomState(0)
+        self.X = rng.rand(15, 2) * 5
+        self.Y = np.hstack([np.sin(self.X[:, :1]), np.cos(self.X[:, 1:]), self.X[:, :1] * 0.2])
+        self.Y += rng.randn(*self.Y.shape) * 0.1
+        self.Xtest = rng.rand(6, 2) * 5
+        self.W = rng.randn(3, 2)
+        self.kappa = np.array([0.5, 0.3, 0.2])
+
+    def models(self, Y):
+        observed = ~np.isnan(Y)
+        label = np.tile(np.arange(3), (15, 1))
+        X_augmented = np.hstack([np.repeat(self.X, 3, 0), label.reshape(-1, 1)])[observed.flatten()]
+        coreg = GPflow.kernels.Coregion(1, output_dim=3, rank=2, active_dims=[2])
+        coreg.W, coreg.kappa = self.W, self.kappa
+        gpr = GPflow.gpr.GPR(X_augmented, Y[observed].reshape(-1, 1),
+                             GPflow.kernels.Matern32(2, active_dims=[0, 1]) * coreg)
+        icm = GPflow.kronecker.ICMGPR(self.X, Y, GPflow.kernels.Matern32(2), rank=2, num_probes=50)
+        icm.coregion.W, icm.coregion.kappa = self.W, self.kappa
+        for m in [gpr, icm]:
+            m.likelihood.variance = 0.1
+        return gpr, icm
+
+    def predictions(self, gpr, icm):
+        Xtest = np.hstack([np.repeat(self.Xtest, 3, 0), np.tile(np.arange(3), 6).reshape(-1, 1)])
+        mu1, var1 = gpr.predict_f(Xtest)
+        mu2, var2 = icm.predict_f(self.Xtest)
+        self.assertTrue(np.allclose(mu1.reshape(6, 3), mu2, atol=1e-4))
+        self.assertTrue(np.allclose(var1.reshape(6, 3), var2, atol=1e-4))
+
+    def test_complete(self):
+        gpr, icm = self.models(self.Y)
+        self.assertTrue(np.allclose(gpr.compute_log_likelihood(), icm.compute_log_likelihood()))
+        self.predictions(gpr, icm)
+
+    def test_missing(self):
+        Y = self.Y.copy()
+        Y[np.random.RandomState(1).rand(15, 3) < 0.3] = np.nan
+        gpr, icm = self.models(Y)
+        self.assertTrue(np.allclose(gpr.compute_log_likelihood(), icm.compute_log_likelihood(), rtol=0.05))
+        self.predictions(gpr, icm)
+
+
 if __name__ == '__main__':
     unittest.main()
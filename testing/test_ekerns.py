@@ -481,6 +481,240 @@ class TestAddCrossCalcs(unittest.TestCase):
         a, b = sess.run((tfa, tfb), feed_dict=feed_dict)
         _assert_pdeq(self, a, b)
 
+    def test_many_kernels(self):
+        # the pair of RBF kernels has no closed form, the pairs with the linear kernel do
+        rbf2 = ekernels.RBF(self.D, variance=0.5, lengthscales=0.8)
+        add = ekernels.Add([self.rbf, self.lin, rbf2])
+        quad = kernels.Add([kernels.RBF(self.D, self.rbf.variance.value, self.rbf.lengthscales.value, ARD=True),
+                            kernels.Linear(self.D, self.lin.variance.value),
+                            kernels.RBF(self.D, variance=0.5, lengthscales=0.8)])
+        add.num_gauss_hermite_points = quad.num_gauss_hermite_points = 30
+        a = add.compute_eKzxKxz(self.Z, self.Xmu, self.Xcov)
+        b = quad.compute_eKzxKxz(self.Z, self.Xmu, self.Xcov)
+        self.assertTrue(np.allclose(a, b))
+
+
+class TestSumEKzxKxz(unittest.TestCase):
+    """
+    The summed psi2 statistic, computed in chunks of the data and with the
+    closed form for diagonal covariances, must equal the sum of eKzxKxz.
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+        self.D = 2
+        self.Xmu = self.rng.rand(13, self.D)
+        self.Xvar = self.rng.rand(13, self.D) * 0.3
+        self.Z = self.rng.rand(4, self.D)
+        rbf = ekernels.RBF(self.D, variance=0.7, ARD=True)
+        rbf.lengthscales = [0.6, 1.3]
+        self.kernels = [rbf, ekernels.RBF(1, lengthscales=0.8, active_dims=[1]),
+                        ekernels.Linear(self.D, variance=0.4)]
+
+    def test_sum(self):
+        config = GPflow.settings.get_settings()
+        config.numerics.ekern_chunk_memory = 1e-4
+        for k in self.kernels:
+            tf.reset_default_graph()
+            free_vars = tf.placeholder(tf.float64)
+            k.make_tf_array(free_vars)
+            Z, Xmu, Xvar = tf.constant(self.Z), tf.constant(self.Xmu), tf.constant(self.Xvar)
+            with k.tf_mode(), GPflow.settings.temp_settings(config):
+                psi2s = [tf.reduce_sum(k.eKzxKxz(Z, Xmu, tf.matrix_diag(Xvar)), 0),
+                         k.sum_eKzxKxz(Z, Xmu, Xvar),
+                         k.sum_eKzxKxz(Z, Xmu, tf.matrix_diag(Xvar))]
+            psi2s = tf.Session().run(psi2s, feed_dict={free_vars: k.get_free_state()})
+            for psi2 in psi2s[1:]:
+                self.assertTrue(np.allclose(psi2s[0], psi2))
+
+
+class TestSumExKxz(unittest.TestCase):
+    """
+    exKxz summed over windows of the sequence must equal the sum of exKxz:
+    the windows overlap by one time step, and no pair is counted twice.
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+        self.D = 2
+        self.Xmu = self.rng.rand(12, self.D)
+        self.Xcov = TriDiagonalBlockRep().forward(self.rng.randn(12, 2 * self.D, self.D) * 0.3)
+        self.Z = self.rng.rand(3, self.D)
+        rbf = ekernels.RBF(self.D, variance=0.7, ARD=True)
+        rbf.lengthscales = [0.6, 1.3]
+        qrbf = kernels.RBF(self.D, variance=0.7)
+        qrbf.num_gauss_hermite_points = 4
+        self.kernels = [rbf, ekernels.Linear(self.D, variance=0.4), qrbf]
+
+    def test_sum(self):
+        config = GPflow.settings.get_settings()
+        config.numerics.ekern_chunk_memory = 1e-4
+        config.numerics.ekern_quadrature = 'allow'
+        for k in self.kernels:
+            with GPflow.settings.temp_settings(config):
+                expected = np.sum(k.compute_exKxz(self.Z, self.Xmu, self.Xcov), 0)
+                self.assertTrue(np.allclose(k.compute_sum_exKxz(self.Z, self.Xmu, self.Xcov), expected))
+
+
+class TestRBFDiagonal(unittest.TestCase):
+    """
+    The closed forms of the RBF expectations for diagonal covariances must
+    agree with those for full covariances.
+    """
+
+    def setUp(self):
+        tf.reset_default_graph()
+        self.rng = np.random.RandomState(1)
+        self.Xmu = self.rng.rand(6, 3)
+        self.Xvar = self.rng.rand(6, 3) * 0.5
+        self.Z = self.rng.rand(5, 3)
+        self.kernels = [ekernels.RBF(3, variance=0.8, lengthscales=[0.5, 1.0, 2.0], ARD=True),
+                        ekernels.RBF(2, lengthscales=0.7, active_dims=[0, 2])]
+
+    def test_static(self):
+        for k in self.kernels:
+            free_vars = tf.placeholder(tf.float64)
+            k.make_tf_array(free_vars)
+            Z, Xmu, Xvar = tf.constant(self.Z), tf.constant(self.Xmu), tf.constant(self.Xvar)
+            with k.tf_mode():
+                psis = [k.eKxz(Z, Xmu, Xvar), k.eKxz(Z, Xmu, tf.matrix_diag(Xvar)),
+                        k.eKzxKxz(Z, Xmu, Xvar), k.eKzxKxz(Z, Xmu, tf.matrix_diag(Xvar))]
+            psis = tf.Session().run(psis, feed_dict={free_vars: k.get_free_state()})
+            self.assertTrue(np.allclose(psis[0], psis[1]))
+            self.assertTrue(np.allclose(psis[2], psis[3]))
+
+    def test_dynamic(self):
+        for k in self.kernels:
+            self.assertTrue(np.allclose(k.compute_eKxz(self.Z, self.Xmu, self.Xvar),
+                                        k.compute_eKxz(self.Z, self.Xmu, np.array([np.diag(v) for v in self.Xvar]))))
+
+
+def _matern_expectations(order, variance, lengthscale, mu, var, Z):
+    """
+    The expectations of a one-dimensional Matern kernel for N(mu, var), by
+    the trapezium rule on a fine grid: psi1 (M) and psi2 (MxM).
+    """
+    x = np.linspace(mu - 12 * np.sqrt(var), mu + 12 * np.sqrt(var), 200001)
+    density = np.exp(-0.5 * (x - mu) ** 2 / var) / np.sqrt(2 * np.pi * var)
+    t = np.sqrt(2 * order) * np.abs(x[None, :] - Z[:, None]) / lengthscale
+    poly = 1 + t if order == 1.5 else 1 + t + t ** 2 / 3
+    K = variance * poly * np.exp(-t)  # MxG
+    return (np.trapz(K * density, x),
+            np.trapz(K[:, None, :] * K[None, :, :] * density, x))
+
+
+class TestMaternPeriodic(unittest.TestCase):
+    """
+    The closed forms of the one-dimensional Matern expectations, and their
+    products in Prod, must agree with numerical integration, and the
+    factorised quadrature of the periodic kernel with that of Kern.
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(2)
+        self.Xmu = self.rng.randn(4, 2)
+        self.Xvar = self.rng.rand(4, 2) * 0.5 + 0.01
+        self.Z = self.rng.randn(3, 2)
+        self.Z[1] = self.Z[0]  # coinciding inducing inputs
+
+    def matern_reference(self, kerns):
+        psi1 = np.ones((4, 3))
+        psi2 = np.ones((4, 3, 3))
+        for d, order, variance, lengthscale in kerns:
+            for n in range(4):
+                a, b = _matern_expectations(order, variance, lengthscale, self.Xmu[n, d], self.Xvar[n, d], self.Z[:, d])
+                psi1[n] *= a
+                psi2[n] *= b
+        return psi1, psi2
+
+    def test_matern(self):
+        for order, cls in [(1.5, ekernels.Matern32), (2.5, ekernels.Matern52)]:
+            k = cls(1, variance=0.7, lengthscales=0.6, active_dims=[1])
+            psi1, psi2 = self.matern_reference([(1, order, 0.7, 0.6)])
+            self.assertTrue(np.allclose(k.compute_eKxz(self.Z, self.Xmu, self.Xvar), psi1))
+            self.assertTrue(np.allclose(k.compute_eKzxKxz(self.Z, self.Xmu, self.Xvar), psi2))
+            self.assertTrue(np.allclose(k.compute_eKdiag(self.Xmu, self.Xvar), 0.7))
+
+    def test_far(self):
+        # inputs hundreds of standard deviations away from the inducing inputs
+        Xmu, Xvar = np.array([[4.], [-3.]]), np.array([[1e-4], [1e-2]])
+        Z = np.array([[0.], [0.5], [1.2]])
+        for order, cls in [(1.5, ekernels.Matern32), (2.5, ekernels.Matern52)]:
+            k = cls(1, lengthscales=1.)
+            for n in range(2):
+                psi1, psi2 = _matern_expectations(order, 1., 1., Xmu[n, 0], Xvar[n, 0], Z[:, 0])
+                self.assertTrue(np.allclose(k.compute_eKxz(Z, Xmu[n:n + 1], Xvar[n:n + 1])[0], psi1, rtol=1e-4, atol=0))
+                self.assertTrue(np.allclose(k.compute_eKzxKxz(Z, Xmu[n:n + 1], Xvar[n:n + 1])[0], psi2,
+                                            rtol=1e-4, atol=0))
+
+            tf.reset_default_graph()
+            free_vars = tf.placeholder(tf.float64)
+            k.make_tf_array(free_vars)
+            X = tf.placeholder(tf.float64, [None, 1])
+            with k.tf_mode():
+                psi = tf.reduce_sum(k.eKxz(tf.constant(Z), X, tf.constant(Xvar))) + \
+                    tf.reduce_sum(k.eKzxKxz(tf.constant(Z), X, tf.constant(Xvar)))
+            gradients = tf.gradients(psi, [free_vars, X])
+            session = tf.Session()
+            feed_dict = {free_vars: k.get_free_state()}
+
+            def value(Xmu):
+                feed_dict[X] = Xmu
+                return session.run(psi, feed_dict=feed_dict)
+
+            grad_free, grad_X = session.run(gradients, feed_dict=dict(feed_dict, **{X: Xmu}))
+            self.assertTrue(np.all(np.isfinite(grad_free)))
+            for n in range(2):
+                h = np.zeros_like(Xmu)
+                h[n] = 1e-6
+                self.assertTrue(np.allclose(grad_X[n, 0], (value(Xmu + h) - value(Xmu - h)) / 2e-6, rtol=1e-4))
+
+    def test_prod(self):
+        k = ekernels.Prod([ekernels.Matern32(1, variance=0.7, lengthscales=0.6, active_dims=[0]),
+                           ekernels.Matern52(1, lengthscales=1.3, active_dims=[1])])
+        psi1, psi2 = self.matern_reference([(0, 1.5, 0.7, 0.6), (1, 2.5, 1., 1.3)])
+        self.assertTrue(np.allclose(k.compute_eKxz(self.Z, self.Xmu, self.Xvar), psi1))
+        self.assertTrue(np.allclose(k.compute_eKzxKxz(self.Z, self.Xmu, self.Xvar), psi2))
+
+    def test_periodic(self):
+        k = kernels.PeriodicKernel(2, period=1.5, variance=0.8, lengthscales=0.9)
+        ek = ekernels.PeriodicKernel(2, period=1.5, variance=0.8, lengthscales=0.9)
+        k.num_gauss_hermite_points = ek.num_gauss_hermite_points = 30
+        Xcov = np.array([np.diag(v) for v in self.Xvar])
+        self.assertTrue(np.allclose(k.compute_eKxz(self.Z, self.Xmu, Xcov),
+                                    ek.compute_eKxz(self.Z, self.Xmu, self.Xvar)))
+        self.assertTrue(np.allclose(k.compute_eKzxKxz(self.Z, self.Xmu, Xcov),
+                                    ek.compute_eKzxKxz(self.Z, self.Xmu, self.Xvar)))
+
+    def full_covariance_kernels(self):
+        return [(kernels.PeriodicKernel(2, period=1.5, variance=0.8, lengthscales=0.9),
+                 ekernels.PeriodicKernel(2, period=1.5, variance=0.8, lengthscales=0.9)),
+                (kernels.Prod([kernels.Matern32(1, lengthscales=0.6, active_dims=[0]),
+                               kernels.Matern52(1, lengthscales=1.3, active_dims=[1])]),
+                 ekernels.Prod([ekernels.Matern32(1, lengthscales=0.6, active_dims=[0]),
+                                ekernels.Matern52(1, lengthscales=1.3, active_dims=[1])]))]
+
+    def test_full_covariance(self):
+        # the placeholders of compute_eKxz have an unknown rank, so the full
+        # covariances are only told apart from the diagonal ones at run time
+        A = self.rng.randn(4, 2, 2) * 0.3
+        Xcov = np.einsum('nij,nkj->nik', A, A) + np.eye(2) * 0.05
+        config = GPflow.settings.get_settings()
+        config.numerics.ekern_quadrature = 'allow'
+        with GPflow.settings.temp_settings(config):
+            for k, ek in self.full_covariance_kernels():
+                self.assertTrue(np.allclose(k.compute_eKxz(self.Z, self.Xmu, Xcov),
+                                            ek.compute_eKxz(self.Z, self.Xmu, Xcov)))
+                self.assertTrue(np.allclose(k.compute_eKzxKxz(self.Z, self.Xmu, Xcov),
+                                            ek.compute_eKzxKxz(self.Z, self.Xmu, Xcov)))
+
+        # diagonal covariances do not use quadrature, even when it is not allowed
+        config.numerics.ekern_quadrature = 'error'
+        with GPflow.settings.temp_settings(config):
+            for _, ek in self.full_covariance_kernels():
+                self.assertTrue(np.all(np.isfinite(ek.compute_eKxz(self.Z, self.Xmu, self.Xvar))))
+                with self.assertRaises(tf.errors.InvalidArgumentError):
+                    ek.compute_eKzxKxz(self.Z, self.Xmu, Xcov)
 
 if __name__ == '__main__':
     unittest.main()
@@ -2,6 +2,7 @@ from __future__ import print_function
 import GPflow
 import numpy as np
 import unittest
+import tensorflow as tf
 from GPflow import ekernels
 from GPflow import kernels
 np.random.seed(0)
@@ -111,5 +112,49 @@ class TestBayesianGPLVM(unittest.TestCase):
             self.assertTrue(np.allclose(mu_f_a, mu_f_q, atol=1e-4), ('Posterior vars different', var_f_a-var_f_q))
 
 
+class TestStochasticBayesianGPLVM(unittest.TestCase):
+    def setUp(self):
+        self.N, self.D, self.M, self.Q = 20, 3, 5, 2
+        self.rng = np.random.RandomState(1)
+        self.Y = self.rng.randn(self.N, self.D)
+        self.X_mean = GPflow.gplvm.PCA_reduce(self.Y, self.Q)
+        self.X_var = self.rng.rand(self.N, self.Q) * 0.5 + 0.1
+        self.Z = self.X_mean[:self.M] + 0.01
+
+    def model(self, minibatch_size=None):
+        return GPflow.gplvm.StochasticBayesianGPLVM(self.X_mean, self.X_var, self.Y, ekernels.RBF(self.Q, ARD=True),
+                                                    self.M, Z=self.Z, minibatch_size=minibatch_size)
+
+    def test_optimal_bound(self):
+        # at the optimal q(v), the bound on the full data is that of BayesianGPLVM
+        m1 = GPflow.gplvm.BayesianGPLVM(self.X_mean, self.X_var, self.Y, ekernels.RBF(self.Q, ARD=True),
+                                        self.M, Z=self.Z)
+        m2 = self.model()
+        k = ekernels.RBF(self.Q, ARD=True)
+        psi1 = k.compute_eKxz(self.Z, self.X_mean, self.X_var)
+        psi2 = k.compute_eKzxKxz(self.Z, self.X_mean, self.X_var).sum(0)
+        L = np.linalg.cholesky(k.compute_K_symm(self.Z) + np.eye(self.M) * 1e-6)
+        A = np.linalg.solve(L, psi1.T)
+        P = np.linalg.solve(L, np.linalg.solve(L, psi2).T)
+        S = np.linalg.inv(np.eye(self.M) + P / m2.likelihood.variance.value)
+        m2.q_mu = S.dot(A).dot(self.Y) / m2.likelihood.variance.value
+        m2.q_sqrt = np.array([np.linalg.cholesky(S)] * self.D).swapaxes(0, 2)
+        self.assertTrue(np.allclose(m1.compute_log_likelihood(), m2.compute_log_likelihood()))
+
+    def test_minibatch(self):
+        # the minibatch bounds are unbiased estimates of the full bound
+        m = self.model(minibatch_size=5)
+        bounds = [m.compute_log_likelihood() for _ in range(400)]
+        full = self.model().compute_log_likelihood()
+        self.assertTrue(np.abs(np.mean(bounds) - full) < 3 * np.std(bounds) / np.sqrt(len(bounds)) + 1e-6)
+
+    def test_optimise(self):
+        m = self.model(minibatch_size=10)
+        m.optimize(tf.train.AdamOptimizer(0.01), maxiter=10)
+        Xtest = self.rng.randn(4, self.Q)
+        mu, var = m.predict_f(Xtest)
+        self.assertTrue(mu.shape == (4, self.D) and np.all(var > 0))
+
+
 if __name__ == "__main__":
     unittest.main()
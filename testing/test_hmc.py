@@ -49,8 +49,125 @@ class SampleGaussianTest(unittest.TestCase):
         s, logps = GPflow.hmc.sample_HMC(self.f, num_samples=100, Lmin=10, Lmax=20, epsilon=0.05,
                                          x0=self.x0, verbose=False, thin=1, burn=10,
                                          RNG=np.random.RandomState(11), return_logprobs=True)
+        self.assertTrue(np.allclose(logps, -0.5 * np.sum(np.square(s), 1)))
 
+    def test_buffers_not_shared(self):
+        """
+        The sampler works in-place on its own buffers: the starting point must
+        not be modified, and the samples must not alias each other.
+        """
+        x0 = np.ones(3)
+        samples = GPflow.hmc.sample_HMC(self.f, num_samples=50, Lmin=10, Lmax=20, epsilon=0.05,
+                                        x0=x0, verbose=False, thin=2, burn=5,
+                                        RNG=np.random.RandomState(11))
+        self.assertTrue(np.all(x0 == 1.))
+        self.assertTrue(samples.shape == (50, 3))
+        self.assertTrue(len(np.unique(samples[:, 0])) > 1)
+
+
+
+
+class TraceTest(unittest.TestCase):
+    def setUp(self):
+        self.f = lambda x: (0.5*np.sum(np.square(x)), x)
+        self.x0 = np.zeros(3)
+
+    def test_trace(self):
+        trace = GPflow.hmc.HMCTrace()
+        records = []
+        samples1 = GPflow.hmc.sample_HMC(self.f, num_samples=50, Lmin=10, Lmax=20, epsilon=0.05,
+                                         x0=self.x0, thin=2, burn=5, RNG=np.random.RandomState(3),
+                                         trace=trace, callback=lambda t, x, r: records.append(r))
+        samples2 = GPflow.hmc.sample_HMC(self.f, num_samples=50, Lmin=10, Lmax=20, epsilon=0.05,
+                                         x0=self.x0, thin=2, burn=5, RNG=np.random.RandomState(3))
+        # instrumentation must not change the chain
+        self.assertTrue(np.all(samples1 == samples2))
 
+        summary = trace.summary()
+        self.assertTrue(summary['iterations'] == 5 + 50 * 2 - 1)
+        self.assertTrue(len(records) == summary['iterations'])
+        self.assertTrue(summary['accepted'] + summary['rejected'] == summary['iterations'])
+        self.assertTrue(np.all(trace.leapfrog_steps >= 10) and np.all(trace.leapfrog_steps < 20))
+        self.assertTrue(summary['objective_evaluations'] == np.sum(trace.leapfrog_steps))
+        self.assertTrue(np.all(trace.overhead_time >= 0.))
+        counts, _ = trace.histogram('iteration_time', bins=5)
+        self.assertTrue(np.sum(counts) == summary['iterations'])
+        self.assertTrue(all('logprob' in r for r in records))
+
+    def test_callback_state(self):
+        # the states passed to the callback may be kept after the call
+        states = {}
+        samples = GPflow.hmc.sample_HMC(self.f, num_samples=50, Lmin=10, Lmax=20, epsilon=0.05,
+                                        x0=self.x0, thin=2, burn=5, RNG=np.random.RandomState(3),
+                                        callback=lambda t, x, r: states.update({t: x}))
+        self.assertTrue(np.all(np.array([states[5 + 2 * i] for i in range(50)]) == samples))
+
+
+class EllipticalSliceTest(unittest.TestCase):
+    def test_gaussian_posterior(self):
+        """
+        With a N(0, I) prior and a N(x|1, I) likelihood, the posterior is
+        N(0.5, 0.5 I).
+        """
+        rng = np.random.RandomState(1)
+        loglik = lambda x: -0.5 * np.sum(np.square(x - 1.))
+        x = np.zeros(2)
+        cur = loglik(x)
+        samples = []
+        for _ in range(5000):
+            x, cur = GPflow.hmc.elliptical_slice(x, loglik, cur, rng)
+            samples.append(x)
+        samples = np.array(samples)
+        self.assertTrue(np.allclose(samples.mean(0), 0.5, atol=0.05))
+        self.assertTrue(np.allclose(samples.var(0), 0.5, atol=0.05))
+
+    def test_gibbs(self):
+        """
+        v ~ N(0, I), h ~ N(0, 1), and a Gaussian factor N(v|h, I). The latent
+        block v is updated by elliptical slice sampling, h by HMC.
+        """
+        def f(x):
+            v, h = x[:2], x[2]
+            E = 0.5 * np.sum(np.square(v)) + 0.5 * np.sum(np.square(v - h)) + 0.5 * h ** 2
+            return E, np.hstack([2 * v - h, h - np.sum(v - h)])
+
+        loglik = lambda x: -f(x)[0] + 0.5 * np.sum(np.square(x[:2]))
+        samples = GPflow.hmc.sample_ESS_HMC(f, loglik, 3000, Lmin=5, Lmax=10, epsilon=0.2,
+                                            x0=np.zeros(3), latent=[0, 1], burn=10,
+                                            RNG=np.random.RandomState(3))
+        cov = np.linalg.inv(np.array([[2., 0., -1.], [0., 2., -1.], [-1., -1., 3.]]))
+        self.assertTrue(samples.shape == (3000, 3))
+        self.assertTrue(np.allclose(samples.mean(0), np.zeros(3), atol=0.1))
+        self.assertTrue(np.allclose(np.cov(samples.T), cov, atol=0.1))
+
+
+class StochasticGradientTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+        # a noisy gradient of a standard Gaussian energy
+        self.f = lambda x: (0.5 * np.sum(np.square(x)), x + 0.3 * self.rng.randn(x.size))
+        self.x0 = np.zeros(2)
+
+    def test_sgld(self):
+        samples = GPflow.hmc.sample_SGLD(self.f, num_samples=3000, epsilon=0.05, x0=self.x0,
+                                         thin=5, burn=100, RNG=np.random.RandomState(1))
+        self.assertTrue(samples.shape == (3000, 2))
+        self.assertTrue(np.allclose(samples.mean(0), np.zeros(2), atol=0.2))
+        self.assertTrue(np.allclose(samples.var(0), np.ones(2), atol=0.2))
+
+    def test_sghmc(self):
+        samples = GPflow.hmc.sample_SGHMC(self.f, num_samples=3000, epsilon=0.01, x0=self.x0,
+                                          friction=0.1, thin=5, burn=100, RNG=np.random.RandomState(1))
+        self.assertTrue(samples.shape == (3000, 2))
+        self.assertTrue(np.allclose(samples.mean(0), np.zeros(2), atol=0.2))
+        self.assertTrue(np.allclose(samples.var(0), np.ones(2), atol=0.2))
+
+    def test_schedule(self):
+        schedule = GPflow.hmc.polynomial_decay(0.1, 10., 0.55)
+        self.assertTrue(np.allclose(schedule(0), 0.1 * 10. ** -0.55))
+        s, logps = GPflow.hmc.sample_SGLD(self.f, num_samples=50, epsilon=schedule, x0=self.x0,
+                                          return_logprobs=True)
+        self.assertTrue(np.allclose(logps, -0.5 * np.sum(np.square(s), 1)))
 
 
 class SampleModelTest(unittest.TestCase):
@@ -101,6 +218,74 @@ class SamplesDictTest(unittest.TestCase):
         ls_trace = sample_dict['model.kern.lengthscales']
         assert np.all([np.all(v == ls_trace[0]) for v in ls_trace])
 
+    def test_elliptical(self):
+        samples = self.m.sample(num_samples=20, Lmax=10, epsilon=0.05, elliptical=self.m.V)
+        sample_df = self.m.get_samples_df(samples)
+        self.assertTrue(samples.shape == (20, self.m.get_free_state().size))
+        self.assertFalse(np.all(sample_df['model.V'][19] == sample_df['model.V'][0]))
+
+    def test_elliptical_needs_standard_normal(self):
+        with self.assertRaises(ValueError):
+            self.m.sample(num_samples=2, elliptical=self.m.kern.lengthscales)
+
+
+class SampleMinibatchTest(unittest.TestCase):
+    def setUp(self):
+        tf.reset_default_graph()
+        rng = np.random.RandomState(0)
+        X = rng.randn(100, 1)
+        Y = np.sin(X) + 0.1 * rng.randn(100, 1)
+        self.m = GPflow.svgp.SVGP(X, Y, GPflow.kernels.RBF(1), GPflow.likelihoods.Gaussian(),
+                                  Z=X[:5].copy(), minibatch_size=10)
+        self.m.Z.fixed = True
+
+    def test_sgld(self):
+        samples = self.m.sample(num_samples=20, epsilon=1e-4, method='sgld', thin=2)
+        self.assertTrue(samples.shape == (20, self.m.get_free_state().size))
+        self.assertTrue(np.all(np.isfinite(samples)))
+
+    def test_sghmc(self):
+        samples = self.m.sample(num_samples=20, epsilon=GPflow.hmc.polynomial_decay(1e-4),
+                                method='sghmc', friction=0.5)
+        self.assertTrue(samples.shape == (20, self.m.get_free_state().size))
+        self.assertTrue(np.all(np.isfinite(samples)))
+
+    def test_bad_method(self):
+        with self.assertRaises(ValueError):
+            self.m.sample(num_samples=2, method='foo')
+
+
+class PredictOverPosteriorTest(unittest.TestCase):
+    def setUp(self):
+        tf.reset_default_graph()
+        rng = np.random.RandomState(0)
+        X, Y = rng.randn(2, 10, 1)
+        self.Xnew = rng.randn(5, 1)
+        self.m = GPflow.gpmc.GPMC(X, Y, kern=GPflow.kernels.Matern32(1), likelihood=GPflow.likelihoods.StudentT())
+        self.m.kern.variance.fixed = True
+        self.samples = self.m.sample(num_samples=7, Lmax=10, epsilon=0.05)
+
+    def test_matches_loop(self):
+        mus, variances = [], []
+        x0 = self.m.get_free_state()
+        for s in self.samples:
+            self.m.set_state(s)
+            mu, var = self.m.predict_f(self.Xnew)
+            mus.append(mu)
+            variances.append(var)
+        self.m.set_state(x0)
+
+        mu_b, var_b = self.m.predict_f_samples_over_posterior(self.samples, self.Xnew, chunk_size=3,
+                                                              return_mixture=True)
+        self.assertTrue(mu_b.shape == (7, 5, 1))
+        self.assertTrue(np.allclose(mu_b, np.array(mus)))
+        self.assertTrue(np.allclose(var_b, np.array(variances)))
+
+        mean, var = self.m.predict_f_samples_over_posterior(self.samples, self.Xnew)
+        self.assertTrue(np.allclose(mean, np.mean(mus, 0)))
+        self.assertTrue(np.allclose(var, np.mean(np.array(variances) + np.square(mus), 0) - np.square(mean)))
+        self.assertTrue(np.all(self.m.get_free_state() == x0))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,58 @@
+from __future__ import print_function
+import GPflow
+import numpy as np
+import unittest
+import tensorflow as tf
+from .reference import free_gradients
+
+
+class TestIterativeGPR(unittest.TestCase):
+    """
+    The iterative GPR model must agree with GPR, up to the accuracy of the
+    stochastic log determinant.
+    """
+    def setUp(self):
+        tf.reset_default_graph()
+        rng = np.random.RandomState(0)
+        self.X = rng.rand(80, 2) * 5
+        self.Y = np.sin(self.X[:, :1]) * np.cos(self.X[:, 1:]) + rng.randn(80, 2) * 0.1
+        self.Xtest = rng.rand(10, 2) * 5
+
+        def kern():
+            return GPflow.kernels.Matern52(2, lengthscales=1.2) + GPflow.kernels.Linear(2, variance=0.1)
+
+        self.m1 = GPflow.gpr.GPR(self.X, self.Y, kern())
+        self.m2 = GPflow.gpr.IterativeGPR(self.X, self.Y, kern(), block_size=30, tolerance=1e-10,
+                                          num_probes=50, preconditioner_rank=15)
+        for m in [self.m1, self.m2]:
+            m.likelihood.variance = 0.05
+
+    def test_likelihood(self):
+        self.assertTrue(np.allclose(self.m1.compute_log_likelihood(), self.m2.compute_log_likelihood(), rtol=0.02))
+
+    def test_gradients(self):
+        # the probes are fixed, so the error of the stochastic trace is too:
+        # about 20% for the variance of the Linear kernel, whose gradient has
+        # the largest variance, and a few percent for the other parameters
+        _, g1 = free_gradients(self.m1)
+        _, g2 = free_gradients(self.m2)
+        self.assertTrue(sorted(g1) == sorted(g2))
+        for name in g1:
+            self.assertTrue(np.all(np.abs(g2[name] - g1[name]) < 0.3 * np.abs(g1[name])), msg=name)
+
+    def test_predict(self):
+        for predict in ['predict_f', 'predict_f_full_cov']:
+            mu1, var1 = getattr(self.m1, predict)(self.Xtest)
+            mu2, var2 = getattr(self.m2, predict)(self.Xtest)
+            self.assertTrue(np.allclose(mu1, mu2))
+            self.assertTrue(np.allclose(var1, var2))
+
+    def test_no_preconditioner(self):
+        m = GPflow.gpr.IterativeGPR(self.X, self.Y, GPflow.kernels.Matern52(2, lengthscales=1.2) +
+                                    GPflow.kernels.Linear(2, variance=0.1), num_probes=50, preconditioner_rank=0)
+        m.likelihood.variance = 0.05
+        self.assertTrue(np.allclose(self.m1.compute_log_likelihood(), m.compute_log_likelihood(), rtol=0.02))
+
+
+if __name__ == "__main__":
+    unittest.main()
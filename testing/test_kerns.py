@@ -3,6 +3,7 @@ import GPflow
 import tensorflow as tf
 import numpy as np
 import unittest
+from functools import reduce
 from .reference import referenceRbfKernel, referencePeriodicKernel
 
 
@@ -124,6 +125,25 @@ class TestKernSymmetry(unittest.TestCase):
                                           feed_dict={x_free: k.get_free_state(), X: X_data})
                 self.assertTrue(np.allclose(Errors, 0))
 
+    def test_lower_triangle(self):
+        # K(X) is assembled from halves of X, which must work for any depth and N
+        X = tf.placeholder('float64')
+        for depth in [0, 1, 3]:
+            config = GPflow.settings.get_settings()
+            config.numerics.kern_symmetric_depth = depth
+            for N in [1, 2, 7]:
+                X_data = self.rng.randn(N, 3)
+                combinations = [lambda D: GPflow.kernels.RBF(D) + GPflow.kernels.Matern32(D, lengthscales=0.7),
+                                lambda D: GPflow.kernels.RBF(D) * GPflow.kernels.Matern52(D, lengthscales=1.3)]
+                for K in self.kernels + [GPflow.kernels.PeriodicKernel] + combinations:
+                    k = K(3)
+                    x_free = tf.placeholder('float64')
+                    k.make_tf_array(x_free)
+                    with k.tf_mode(), GPflow.settings.temp_settings(config):
+                        Errors = tf.Session().run(k.K(X) - k.K(X, X),
+                                                  feed_dict={x_free: k.get_free_state(), X: X_data})
+                    self.assertTrue(np.allclose(Errors, 0))
+
 
 class TestKernDiags(unittest.TestCase):
     def setUp(self):
@@ -191,6 +211,97 @@ class TestAdd(unittest.TestCase):
         self.assertTrue(np.allclose(self.rbf._K + self.lin._K, self.k._K))
 
 
+class TestSharedDistances(unittest.TestCase):
+    """
+    Stationary kernels on the same dimensions share their distance
+    computation when combined: make sure the result is the same as combining
+    the kernels computed separately.
+    """
+
+    def setUp(self):
+        tf.reset_default_graph()
+        self.kerns = [GPflow.kernels.RBF(2, lengthscales=0.5),
+                      GPflow.kernels.Matern12(2, lengthscales=1.5),
+                      GPflow.kernels.Matern32(2, lengthscales=0.8),
+                      GPflow.kernels.Matern52(2, lengthscales=1.2),
+                      GPflow.kernels.Cosine(2, lengthscales=2.),
+                      GPflow.kernels.RBF(2, ARD=True, lengthscales=[0.3, 1.1]),
+                      GPflow.kernels.Matern32(1, active_dims=[1], lengthscales=0.4),
+                      GPflow.kernels.Linear(2)]
+        self.rng = np.random.RandomState(0)
+        self.X_data = self.rng.randn(10, 2)
+        self.Z_data = self.rng.randn(12, 2)
+
+    def compute(self, k, X2=True):
+        x_free = tf.placeholder('float64')
+        X = tf.placeholder('float64')
+        Z = tf.placeholder('float64')
+        k.make_tf_array(x_free)
+        with k.tf_mode():
+            K = k.K(X, Z if X2 else None)
+            return tf.Session().run(K, feed_dict={x_free: k.get_free_state(),
+                                                  X: self.X_data, Z: self.Z_data})
+
+    def test_add(self):
+        for X2 in [True, False]:
+            Ks = [self.compute(k, X2) for k in self.kerns]
+            K = self.compute(GPflow.kernels.Add(self.kerns), X2)
+            self.assertTrue(np.allclose(reduce(np.add, Ks), K))
+
+    def test_prod(self):
+        for X2 in [True, False]:
+            Ks = [self.compute(k, X2) for k in self.kerns]
+            K = self.compute(GPflow.kernels.Prod(self.kerns), X2)
+            self.assertTrue(np.allclose(reduce(np.multiply, Ks), K))
+
+
+class TestBlocked(unittest.TestCase):
+    """
+    Computing K in tiles must give the same result as computing it in one go.
+    """
+
+    def setUp(self):
+        tf.reset_default_graph()
+        self.kerns = [GPflow.kernels.RBF(2, lengthscales=0.5),
+                      GPflow.kernels.PeriodicKernel(2, period=0.7),
+                      GPflow.kernels.White(2) + GPflow.kernels.Matern32(2)]
+        self.rng = np.random.RandomState(0)
+        self.X_data = self.rng.randn(10, 2)
+        self.Z_data = self.rng.randn(7, 2)
+
+    def test_blocks(self):
+        x_free = tf.placeholder('float64')
+        X = tf.placeholder('float64')
+        Z = tf.placeholder('float64')
+        for k in self.kerns:
+            k.make_tf_array(x_free)
+            with k.tf_mode():
+                Ks = [k.K(X), k.K_blocked(X, block_size=3), k.K(X, Z), k.K_blocked(X, Z, block_size=3)]
+                Ks = tf.Session().run(Ks, feed_dict={x_free: k.get_free_state(),
+                                                     X: self.X_data, Z: self.Z_data})
+            self.assertTrue(np.allclose(Ks[0], Ks[1]))
+            self.assertTrue(np.allclose(Ks[2], Ks[3]))
+
+    def test_matmul(self):
+        x_free = tf.placeholder('float64')
+        X = tf.placeholder('float64')
+        V = self.rng.randn(10, 3)
+        for k in self.kerns:
+            k.make_tf_array(x_free)
+            with k.tf_mode():
+                KV = [tf.matmul(k.K(X), V), k.K_matmul(X, tf.constant(V), block_size=3)]
+                KV = tf.Session().run(KV, feed_dict={x_free: k.get_free_state(), X: self.X_data})
+            self.assertTrue(np.allclose(KV[0], KV[1]))
+
+    def test_settings(self):
+        config = GPflow.settings.get_settings()
+        config.numerics.kern_block_memory = 1e-4
+        k, k_blocked = GPflow.kernels.Matern52(2), GPflow.kernels.Matern52(2)
+        with GPflow.settings.temp_settings(config):
+            K_blocked = k_blocked.compute_K(self.X_data, self.Z_data)
+        self.assertTrue(np.allclose(k.compute_K(self.X_data, self.Z_data), K_blocked))
+
+
 class TestWhite(unittest.TestCase):
     """
     The white kernel should not give the same result when called with k(X) and
@@ -0,0 +1,65 @@
+from __future__ import print_function
+import GPflow
+import numpy as np
+import unittest
+import tensorflow as tf
+from .reference import free_gradients
+
+
+class TestKroneckerGPR(unittest.TestCase):
+    """
+    On a grid, the Kronecker GPR model must give the same results as GPR.
+    """
+    def setUp(self):
+        tf.reset_default_graph()
+        rng = np.random.RandomState(0)
+        space = rng.rand(6, 2) * 5
+        time = np.linspace(0, 3, 5)
+        X = np.array([[s[0], t, s[1]] for s in space for t in time])
+        X = X[rng.permutation(len(X))]
+        Y = np.sin(X.sum(1, keepdims=True)) + rng.randn(len(X), 2) * 0.1
+        self.Xtest = rng.rand(7, 3) * 3
+
+        def kern():
+            return GPflow.kernels.RBF(2, active_dims=[0, 2], lengthscales=1.3) * \
+                GPflow.kernels.Matern32(1, active_dims=[1], variance=0.6)
+
+        self.m1 = GPflow.gpr.GPR(X, Y, kern(), mean_function=GPflow.mean_functions.Constant(0.3))
+        self.m2 = GPflow.kronecker.KroneckerGPR(X, Y, kern(), mean_function=GPflow.mean_functions.Constant(0.3))
+        for m in [self.m1, self.m2]:
+            m.likelihood.variance = 0.05
+
+    def test_likelihood(self):
+        self.assertTrue(np.allclose(self.m1.compute_log_likelihood(), self.m2.compute_log_likelihood()))
+
+    def test_gradients(self):
+        f1, g1 = free_gradients(self.m1)
+        f2, g2 = free_gradients(self.m2)
+        self.assertTrue(np.allclose(f1, f2))
+        self.assertTrue(sorted(g1) == sorted(g2))
+        for name in g1:
+            self.assertTrue(np.allclose(g1[name], g2[name]), msg=name)
+
+    def test_predict(self):
+        mu1, var1 = self.m1.predict_f(self.Xtest)
+        mu2, var2 = self.m2.predict_f(self.Xtest)
+        self.assertTrue(np.allclose(mu1, mu2))
+        self.assertTrue(np.allclose(var1, var2))
+
+        mu1, var1 = self.m1.predict_f_full_cov(self.Xtest)
+        mu2, var2 = self.m2.predict_f_full_cov(self.Xtest)
+        self.assertTrue(np.allclose(mu1, mu2))
+        self.assertTrue(np.allclose(var1, var2))
+
+    def test_not_a_grid(self):
+        X, Y = self.m1.X.value, self.m1.Y.value
+        with self.assertRaises(ValueError):
+            GPflow.kronecker.KroneckerGPR(X[1:], Y[1:], GPflow.kernels.RBF(2, active_dims=[0, 2]) *
+                                          GPflow.kernels.RBF(1, active_dims=[1]))
+        with self.assertRaises(ValueError):
+            GPflow.kronecker.KroneckerGPR(X, Y, GPflow.kernels.RBF(2, active_dims=[0, 1]) *
+                                          GPflow.kernels.RBF(2, active_dims=[1, 2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+from __future__ import print_function
+import GPflow
+from GPflow import linear_operators as lo
+import numpy as np
+import unittest
+import tensorflow as tf
+from .reference import free_gradients
+
+float_type = GPflow.settings.dtypes.float_type
+np_float_type = np.float32 if float_type is tf.float32 else np.float64
+
+
+class TestOperators(unittest.TestCase):
+    """
+    Each operator must agree with the dense computation on its matrix.
+    """
+    def setUp(self):
+        tf.reset_default_graph()
+        self.rng = np.random.RandomState(0)
+        self.session = tf.Session()
+
+    def tensor(self, A):
+        return tf.constant(np.asarray(A, dtype=np_float_type))
+
+    def spd(self, n):
+        A = self.rng.randn(n, n)
+        return A.dot(A.T) + n * np.eye(n)
+
+    def check(self, op, K):
+        B = self.rng.randn(K.shape[0], 3)
+        Y = self.rng.randn(K.shape[0], 2)
+        dense, KB, diag, solve, logdet, logp = self.session.run(
+            [op.to_dense(), op.matmul(self.tensor(B)), op.diag(), op.solve(self.tensor(B)),
+             op.logdet(), op.log_density(self.tensor(Y))])
+        _, expected_logdet = np.linalg.slogdet(K)
+        expected_logp = -0.5 * Y.size * np.log(2 * np.pi) - Y.shape[1] * 0.5 * expected_logdet - \
+            0.5 * np.sum(Y * np.linalg.solve(K, Y))
+        self.assertTrue(np.allclose(dense, K))
+        self.assertTrue(np.allclose(KB, K.dot(B)))
+        self.assertTrue(np.allclose(diag, np.diag(K)))
+        self.assertTrue(np.allclose(solve, np.linalg.solve(K, B)))
+        self.assertTrue(np.allclose(logdet, expected_logdet))
+        self.assertTrue(np.allclose(logp, expected_logp))
+
+    def test_dense(self):
+        K = self.spd(5)
+        self.check(lo.Dense(self.tensor(K)), K)
+
+    def test_diagonal(self):
+        d = self.rng.rand(5) + 0.1
+        self.check(lo.Diagonal(self.tensor(d)), np.diag(d))
+        self.check(lo.Diagonal(self.tensor(0.3), 5), 0.3 * np.eye(5))
+
+    def test_kronecker(self):
+        factors = [self.spd(2), self.spd(3), self.spd(2)]
+        K = np.kron(np.kron(factors[0], factors[1]), factors[2])
+        self.check(lo.Kronecker([self.tensor(A) for A in factors]), K)
+
+    def test_low_rank_plus_diagonal(self):
+        U1, U2 = self.rng.randn(6, 2), self.rng.randn(6, 1)
+        d = self.rng.rand(6) + 0.1
+        op = lo.LowRank(self.tensor(U1)) + lo.Diagonal(self.tensor(d)) + \
+            lo.LowRank(self.tensor(U2)) + lo.Diagonal(self.tensor(0.2), 6)
+        self.assertTrue(isinstance(op.solver(), lo._LowRankPlusDiagonal))
+        self.check(op, U1.dot(U1.T) + U2.dot(U2.T) + np.diag(d) + 0.2 * np.eye(6))
+
+    def test_kronecker_plus_isotropic(self):
+        factors = [self.spd(3), self.spd(2)]
+        op = lo.Kronecker([self.tensor(A) for A in factors]) + lo.Diagonal(self.tensor(0.5), 6)
+        self.assertTrue(isinstance(op.solver(), lo._KroneckerPlusIsotropic))
+        self.check(op, np.kron(factors[0], factors[1]) + 0.5 * np.eye(6))
+
+    def test_dense_sum(self):
+        K, U = self.spd(4), self.rng.randn(4, 2)
+        op = lo.Dense(self.tensor(K)) + lo.LowRank(self.tensor(U)) + lo.Diagonal(self.tensor(0.1), 4)
+        self.assertTrue(isinstance(op.solver(), lo.Dense))
+        self.check(op, K + U.dot(U.T) + 0.1 * np.eye(4))
+
+
+class TestKernOperators(unittest.TestCase):
+    """
+    The operators returned by the kernels must represent K(X).
+    """
+    def setUp(self):
+        tf.reset_default_graph()
+        self.X = np.random.RandomState(0).randn(6, 3)
+
+    def test_K_operator(self):
+        for k, expected in [(GPflow.kernels.White(3, variance=0.3), lo.Diagonal),
+                            (GPflow.kernels.Constant(3, variance=0.7), lo.LowRank),
+                            (GPflow.kernels.Linear(3, variance=[0.4, 0.5, 0.6], ARD=True), lo.LowRank),
+                            (GPflow.kernels.Polynomial(3), lo.Dense),
+                            (GPflow.kernels.RBF(3), lo.Dense),
+                            (GPflow.kernels.Linear(2, active_dims=[0, 2]) + GPflow.kernels.White(3), lo.Sum),
+                            (GPflow.kernels.RBF(3) + GPflow.kernels.Matern32(3), lo.Dense)]:
+            x_free = tf.placeholder('float64')
+            k.make_tf_array(x_free)
+            X = tf.placeholder('float64')
+            with k.tf_mode():
+                op = k.K_operator(X)
+                dense, reference = tf.Session().run([op.to_dense(), k.K(X)],
+                                                    feed_dict={x_free: k.get_free_state(), X: self.X})
+            self.assertTrue(isinstance(op, expected))
+            self.assertTrue(np.allclose(dense, reference))
+
+
+class TestStructuredGPR(unittest.TestCase):
+    """
+    GPR with a structured kernel must give the same results as with a
+    dense kernel of the same covariance.
+    """
+    def setUp(self):
+        tf.reset_default_graph()
+        rng = np.random.RandomState(0)
+        X = rng.randn(20, 4)
+        Y = X.dot(rng.randn(4, 2)) + rng.randn(20, 2) * 0.1
+        self.Xtest = rng.randn(5, 4)
+
+        class DenseLinear(GPflow.kernels.Linear):
+            def K_operator(self, X):
+                return GPflow.kernels.Kern.K_operator(self, X)
+
+        self.m1 = GPflow.gpr.GPR(X, Y, GPflow.kernels.Linear(4, ARD=True) + GPflow.kernels.Constant(4))
+        self.m2 = GPflow.gpr.GPR(X, Y, DenseLinear(4, ARD=True) + GPflow.kernels.Constant(4))
+        for m in [self.m1, self.m2]:
+            m.kern.kern_list[0].variance = [0.5, 1.0, 1.5, 2.0]
+            m.likelihood.variance = 0.05
+
+    def test_likelihood(self):
+        f1, g1 = free_gradients(self.m1)
+        f2, g2 = free_gradients(self.m2)
+        self.assertTrue(np.allclose(f1, f2))
+        self.assertTrue(sorted(g1) == sorted(g2))
+        for name in g1:
+            self.assertTrue(np.allclose(g1[name], g2[name]), msg=name)
+
+    def test_predict(self):
+        for predict in ['predict_f', 'predict_f_full_cov']:
+            mu1, var1 = getattr(self.m1, predict)(self.Xtest)
+            mu2, var2 = getattr(self.m2, predict)(self.Xtest)
+            self.assertTrue(np.allclose(mu1, mu2))
+            self.assertTrue(np.allclose(var1, var2))
+
+
+if __name__ == "__main__":
+    unittest.main()
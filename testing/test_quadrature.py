@@ -0,0 +1,153 @@
+import unittest
+import itertools
+import numpy as np
+import tensorflow as tf
+import GPflow
+from GPflow import kernels, ekernels, quadrature
+
+
+def _gaussian_moment(powers):
+    # E[prod_d x_d^p_d] for x ~ N(0, I): the double factorial (p - 1)!! for even p
+    moment = 1.
+    for p in powers:
+        if p % 2:
+            return 0.
+        moment *= np.prod(np.arange(p - 1, 0, -2)) if p > 0 else 1.
+    return moment
+
+
+class TestRules(unittest.TestCase):
+    """
+    Each rule must integrate the polynomials of the degree it is exact for.
+    """
+
+    def check_exact(self, xn, wn, D, degree):
+        self.assertTrue(np.allclose(np.sum(wn), 1.))
+        for powers in itertools.product(range(degree + 1), repeat=D):
+            if sum(powers) > degree:
+                continue
+            approx = np.sum(wn * np.prod(xn ** np.array(powers), 1))
+            self.assertTrue(np.allclose(approx, _gaussian_moment(powers)), msg=str(powers))
+
+    def test_gauss_hermite(self):
+        xn, wn = quadrature.gauss_hermite(3, 2)
+        self.assertTrue(xn.shape == (9, 2))
+        self.check_exact(xn, wn, 2, 5)
+
+    def test_smolyak(self):
+        for level, D in [(1, 3), (2, 3), (3, 4)]:
+            xn, wn = quadrature.smolyak(level, D)
+            self.check_exact(xn, wn, D, 2 * level - 1)
+        # far fewer points than the tensor grid of the same accuracy
+        self.assertTrue(len(quadrature.smolyak(4, 5)[1]) < 7 ** 5)
+
+    def test_unscented(self):
+        xn, wn = quadrature.unscented(3)
+        self.assertTrue(len(wn) == 7)
+        self.check_exact(xn, wn, 3, 3)
+
+    def test_cubature(self):
+        xn, wn = quadrature.cubature(3)
+        self.assertTrue(len(wn) == 6)
+        self.check_exact(xn, wn, 3, 3)
+
+    def test_monte_carlo(self):
+        xn, wn = quadrature.monte_carlo(100, 2)
+        self.assertTrue(np.allclose(np.sum(wn), 1.))
+        self.assertTrue(np.allclose(quadrature.monte_carlo(100, 2)[0], xn))
+
+    def test_unknown(self):
+        config = GPflow.settings.get_settings()
+        config.numerics.ekern_quadrature_rule = 'simpson'
+        with GPflow.settings.temp_settings(config):
+            with self.assertRaises(ValueError):
+                quadrature.rule(5, 2)
+
+
+class TestCache(unittest.TestCase):
+    """
+    The rules are computed once, and shared read-only.
+    """
+
+    def test_cache(self):
+        xn, wn = quadrature.gauss_hermite(4, 3)
+        self.assertTrue(quadrature.gauss_hermite(4, 3)[0] is xn)
+        self.assertTrue(quadrature.smolyak(2, 3)[1] is quadrature.smolyak(2, 3)[1])
+        with self.assertRaises(ValueError):
+            wn[0] = 0.
+        self.assertTrue(GPflow.likelihoods.hermgauss(7)[0] is GPflow.kernels.hermgauss(7)[0])
+
+
+class TestKernExpectations(unittest.TestCase):
+    """
+    The quadrature fallbacks of the kernel expectations must be close to the
+    closed forms with every rule.
+    """
+    _tolerances = {'gauss_hermite': 1e-4, 'smolyak': 1e-3, 'unscented': 5e-2,
+                   'cubature': 5e-2, 'monte_carlo': 5e-2}
+
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+        self.D = 3
+        self.Xmu = self.rng.rand(5, self.D)
+        A = self.rng.randn(5, self.D, self.D) * 0.2
+        self.Xcov = np.einsum('nij,nkj->nik', A, A) + np.eye(self.D) * 0.05
+        self.Z = self.rng.rand(4, self.D)
+        self.kern = kernels.RBF(self.D, variance=0.8, lengthscales=1.2)
+        self.ekern = ekernels.RBF(self.D, variance=0.8, lengthscales=1.2)
+        self.kern.num_gauss_hermite_points = 10
+
+    def test_eKxz(self):
+        expected = self.ekern.compute_eKxz(self.Z, self.Xmu, self.Xcov)
+        for name, tolerance in self._tolerances.items():
+            config = GPflow.settings.get_settings()
+            config.numerics.ekern_quadrature_rule = name
+            config.numerics.ekern_quadrature = 'allow'
+            tf.reset_default_graph()
+            free_vars = tf.placeholder(tf.float64)
+            self.kern.make_tf_array(free_vars)
+            with self.kern.tf_mode(), GPflow.settings.temp_settings(config):
+                eKxz = self.kern.eKxz(tf.constant(self.Z), tf.constant(self.Xmu), tf.constant(self.Xcov))
+            eKxz = tf.Session().run(eKxz, feed_dict={free_vars: self.kern.get_free_state()})
+            self.assertTrue(np.max(np.abs(eKxz - expected)) < tolerance, msg=name)
+
+
+class TestStreaming(unittest.TestCase):
+    """
+    Streaming the quadrature nodes in blocks must not change the expectations.
+    """
+    def setUp(self):
+        self.rng = np.random.RandomState(1)
+        self.D = 2
+        self.Xmu = self.rng.rand(6, self.D)
+        A = self.rng.randn(6, self.D, self.D) * 0.2
+        self.Xcov = np.einsum('nij,nkj->nik', A, A) + np.eye(self.D) * 0.05
+        self.Z = self.rng.rand(3, self.D)
+        self.Xcov_pairs = np.array([self.Xcov, self.Xcov * 0.1])
+        self.kern = kernels.RBF(self.D, variance=0.8, lengthscales=1.2) + kernels.Linear(self.D, variance=0.5)
+        self.kern.num_gauss_hermite_points = 5
+
+    def expectations(self, memory):
+        config = GPflow.settings.get_settings()
+        config.numerics.ekern_quadrature = 'allow'
+        config.numerics.ekern_chunk_memory = memory
+        tf.reset_default_graph()
+        free_vars = tf.placeholder(tf.float64)
+        self.kern.make_tf_array(free_vars)
+        Z, Xmu, Xcov = tf.constant(self.Z), tf.constant(self.Xmu), tf.constant(self.Xcov)
+        with self.kern.tf_mode(), GPflow.settings.temp_settings(config):
+            expectations = [kernels.Kern.eKdiag(self.kern, Xmu, Xcov),
+                            kernels.Kern.eKxz(self.kern, Z, Xmu, Xcov),
+                            kernels.Kern.eKzxKxz(self.kern, Z, Xmu, Xcov),
+                            kernels.Kern.exKxz(self.kern, Z, Xmu, tf.constant(self.Xcov_pairs))]
+            gradient = tf.gradients(tf.reduce_sum(expectations[2]), free_vars)[0]
+        return tf.Session().run(expectations + [gradient], feed_dict={free_vars: self.kern.get_free_state()})
+
+    def test_blocks(self):
+        # a budget of a few floats evaluates the nodes one at a time
+        for full, streamed in zip(self.expectations(0), self.expectations(1e-5)):
+            self.assertTrue(np.allclose(full, streamed))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+from __future__ import print_function
+import GPflow
+import numpy as np
+import unittest
+import tensorflow as tf
+
+
+class TestRandomFourierFeatures(unittest.TestCase):
+    def setUp(self):
+        tf.reset_default_graph()
+        self.X = np.random.RandomState(0).randn(20, 2)
+
+    def test_approximation(self):
+        for kern in [GPflow.kernels.RBF, GPflow.kernels.Exponential, GPflow.kernels.Matern12,
+                     GPflow.kernels.Matern32, GPflow.kernels.Matern52]:
+            for sampling in ['random', 'orthogonal', 'quasi']:
+                k = kern(2, lengthscales=1.5, variance=0.7)
+                rff = GPflow.kernels.RandomFourierFeatures(kern(2, lengthscales=1.5, variance=0.7),
+                                                           5000, sampling)
+                K, K_rff = k.compute_K_symm(self.X), rff.compute_K_symm(self.X)
+                self.assertTrue(np.max(np.abs(K - K_rff)) < 0.1)
+                self.assertTrue(np.allclose(rff.compute_Kdiag(self.X), 0.7))
+
+    def test_features(self):
+        rff = GPflow.kernels.RandomFourierFeatures(GPflow.kernels.RBF(2), 30)
+        Phi = rff.compute_feature_map(self.X)
+        self.assertTrue(Phi.shape == (20, 60))
+        self.assertTrue(np.allclose(Phi.dot(Phi.T), rff.compute_K_symm(self.X)))
+
+    def test_not_stationary(self):
+        with self.assertRaises(ValueError):
+            GPflow.kernels.RandomFourierFeatures(GPflow.kernels.Linear(2), 10)
+        with self.assertRaises(ValueError):
+            GPflow.kernels.RandomFourierFeatures(GPflow.kernels.RBF(2), 10, sampling='foo')
+
+
+class TestSSGP(unittest.TestCase):
+    """
+    With a Gaussian likelihood and q(w) set to the posterior, the bound of
+    SSGP is the marginal likelihood of GPR with the feature kernel.
+    """
+    def setUp(self):
+        tf.reset_default_graph()
+        rng = np.random.RandomState(0)
+        self.X = rng.randn(30, 2)
+        self.Y = np.sin(self.X[:, :1]) + rng.randn(30, 2) * 0.1
+        self.Xtest = rng.randn(5, 2)
+        self.m = GPflow.ssgp.SSGP(self.X, self.Y, GPflow.kernels.Matern32(2), GPflow.likelihoods.Gaussian(),
+                                  num_features=10)
+        self.m.likelihood.variance = 0.1
+        self.gpr = GPflow.gpr.GPR(self.X, self.Y, GPflow.kernels.RandomFourierFeatures(
+            GPflow.kernels.Matern32(2), 10))
+        self.gpr.likelihood.variance = 0.1
+
+        Phi = self.m.kern.compute_feature_map(self.X)
+        S = np.linalg.inv(np.eye(20) + Phi.T.dot(Phi) / 0.1)
+        self.m.q_mu = S.dot(Phi.T).dot(self.Y) / 0.1
+        self.m.q_sqrt = np.dstack([np.linalg.cholesky(S)] * 2)
+
+    def test_bound(self):
+        self.assertTrue(np.allclose(self.m.compute_log_likelihood(), self.gpr.compute_log_likelihood()))
+
+    def test_predict(self):
+        mu1, var1 = self.m.predict_f(self.Xtest)
+        mu2, var2 = self.gpr.predict_f(self.Xtest)
+        self.assertTrue(np.allclose(mu1, mu2))
+        self.assertTrue(np.allclose(var1, var2))
+        mu1, var1 = self.m.predict_f_full_cov(self.Xtest)
+        mu2, var2 = self.gpr.predict_f_full_cov(self.Xtest)
+        self.assertTrue(np.allclose(var1, var2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+from __future__ import print_function
+import GPflow
+import numpy as np
+import unittest
+import tensorflow as tf
+from .reference import free_gradients
+
+
+class TestStateSpace(unittest.TestCase):
+    """
+    The state-space model must give the same results as GPR.
+    """
+    def setUp(self):
+        tf.reset_default_graph()
+        rng = np.random.RandomState(0)
+        X = rng.rand(40, 1) * 10
+        Y = np.sin(X) + 0.5 * np.cos(3 * X) + rng.randn(40, 2) * 0.2
+        self.Xtest = np.vstack([rng.rand(10, 1) * 12 - 1, X[:2]])
+
+        def kern():
+            return GPflow.kernels.Matern12(1, lengthscales=3., variance=0.3) + \
+                GPflow.kernels.Matern32(1, lengthscales=0.8) + \
+                GPflow.kernels.Matern52(1, lengthscales=1.4, variance=0.7)
+
+        self.m1 = GPflow.gpr.GPR(X, Y, kern(), mean_function=GPflow.mean_functions.Linear(np.ones((1, 2)), np.zeros(2)))
+        self.m2 = GPflow.statespace.StateSpaceGPR(X, Y, kern(),
+                                                  mean_function=GPflow.mean_functions.Linear(np.ones((1, 2)), np.zeros(2)))
+        for m in [self.m1, self.m2]:
+            m.likelihood.variance = 0.05
+
+    def test_likelihood(self):
+        f1, g1 = free_gradients(self.m1)
+        f2, g2 = free_gradients(self.m2)
+        self.assertTrue(np.allclose(f1, f2))
+        self.assertTrue(sorted(g1) == sorted(g2))
+        for name in g1:
+            self.assertTrue(np.allclose(g1[name], g2[name]), msg=name)
+
+    def test_predict(self):
+        mu1, var1 = self.m1.predict_f(self.Xtest)
+        mu2, var2 = self.m2.predict_f(self.Xtest)
+        self.assertTrue(np.allclose(mu1, mu2))
+        self.assertTrue(np.allclose(var1, var2))
+
+    def test_kernels(self):
+        X, Y = np.random.rand(5, 1), np.random.rand(5, 1)
+        for k in [GPflow.kernels.Matern12(1), GPflow.kernels.Matern32(1), GPflow.kernels.Matern52(1)]:
+            GPflow.statespace.StateSpaceGPR(X, Y, k)
+        for k in [GPflow.kernels.RBF(1), GPflow.kernels.Matern32(1) * GPflow.kernels.Matern12(1)]:
+            with self.assertRaises(ValueError):
+                GPflow.statespace.StateSpaceGPR(X, Y, k)
+
+
+if __name__ == "__main__":
+    unittest.main()
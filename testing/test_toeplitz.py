@@ -0,0 +1,78 @@
+from __future__ import print_function
+import GPflow
+import numpy as np
+import unittest
+import tensorflow as tf
+
+
+class TestIterative(unittest.TestCase):
+    def setUp(self):
+        tf.reset_default_graph()
+        rng = np.random.RandomState(0)
+        x = np.arange(100) * 0.1
+        self.K = np.exp(-0.5 * np.square(x[:, None] - x[None, :]) / 0.25) + 0.1 * np.eye(100)
+        self.B = rng.randn(100, 3)
+        self.Z = np.sign(rng.randn(100, 50))
+
+    def matvec(self, V):
+        return tf.matmul(tf.constant(self.K), V)
+
+    def test_cg(self):
+        X = GPflow.iterative.conjugate_gradient(self.matvec, tf.constant(self.B), 1000, 1e-10)
+        X = tf.Session().run(X)
+        self.assertTrue(np.allclose(X, np.linalg.solve(self.K, self.B)))
+
+    def test_logdet(self):
+        logdet = GPflow.iterative.stochastic_logdet(self.matvec, tf.constant(self.Z), 30)
+        logdet = tf.Session().run(logdet)
+        self.assertTrue(np.allclose(logdet, np.linalg.slogdet(self.K)[1], rtol=0.05))
+
+    def test_preconditioner(self):
+        L = GPflow.iterative.pivoted_cholesky(tf.constant(np.diag(self.K) - 0.1),
+                                              lambda i: tf.gather(tf.constant(self.K - 0.1 * np.eye(100)), i), 20)
+        P = GPflow.iterative.LowRankPreconditioner(L, tf.constant(0.1, 'float64'))
+        X = GPflow.iterative.conjugate_gradient(self.matvec, tf.constant(self.B), 1000, 1e-10, P.solve)
+        L, X, logdet = tf.Session().run([L, X, P.logdet()])
+        self.assertTrue(np.allclose(L.dot(L.T) + 0.1 * np.eye(100), self.K, atol=1e-3))
+        self.assertTrue(np.allclose(X, np.linalg.solve(self.K, self.B)))
+        self.assertTrue(np.allclose(logdet, np.linalg.slogdet(L.dot(L.T) + 0.1 * np.eye(100))[1]))
+
+
+class TestToeplitz(unittest.TestCase):
+    def setUp(self):
+        tf.reset_default_graph()
+        rng = np.random.RandomState(0)
+        self.X = np.linspace(0, 10, 100).reshape(-1, 1)
+        self.Y = np.sin(self.X) + rng.randn(100, 2) * 0.3
+        self.Xtest = rng.rand(10, 1) * 10
+        self.kern = GPflow.kernels.Matern32(1, lengthscales=0.8) + GPflow.kernels.PeriodicKernel(1, period=3.)
+
+    def test_matvec(self):
+        c = np.exp(-0.1 * np.arange(20))
+        T = np.array([[c[abs(i - j)] for j in range(20)] for i in range(20)])
+        V = np.random.RandomState(1).randn(20, 3)
+        TV = tf.Session().run(GPflow.toeplitz.toeplitz_matvec(tf.constant(c), tf.constant(V)))
+        self.assertTrue(np.allclose(TV, T.dot(V), atol=1e-5))
+
+    def test_gpr(self):
+        m1 = GPflow.gpr.GPR(self.X, self.Y, self.kern)
+        m2 = GPflow.toeplitz.ToeplitzGPR(self.X, self.Y, GPflow.kernels.Matern32(1, lengthscales=0.8) +
+                                         GPflow.kernels.PeriodicKernel(1, period=3.), num_probes=50)
+        for m in [m1, m2]:
+            m.likelihood.variance = 0.1
+        self.assertTrue(np.allclose(m1.compute_log_likelihood(), m2.compute_log_likelihood(), rtol=0.05))
+
+        mu1, var1 = m1.predict_f(self.Xtest)
+        mu2, var2 = m2.predict_f(self.Xtest)
+        self.assertTrue(np.allclose(mu1, mu2, atol=1e-3))
+        self.assertTrue(np.allclose(var1, var2, atol=1e-3))
+
+    def test_irregular(self):
+        with self.assertRaises(ValueError):
+            GPflow.toeplitz.ToeplitzGPR(np.sort(np.random.rand(10, 1), 0), np.zeros((10, 1)), self.kern)
+        with self.assertRaises(ValueError):
+            GPflow.toeplitz.ToeplitzGPR(self.X, self.Y, GPflow.kernels.Linear(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import numpy as np
+import tensorflow as tf
+import GPflow
+from GPflow import ekernels
+
+
+class TestUncertainInputs(unittest.TestCase):
+    """
+    The moments of the prediction at uncertain inputs must match a Monte Carlo
+    estimate over predict_f at samples of the inputs, and reduce to predict_f
+    when the inputs are certain.
+    """
+    def setUp(self):
+        tf.reset_default_graph()
+        self.rng = np.random.RandomState(0)
+        self.D = 2
+        self.X = self.rng.rand(20, self.D)
+        self.Y = np.hstack([np.sin(3 * self.X[:, :1]), np.cos(2 * self.X[:, 1:])]) + self.rng.randn(20, 2) * 0.1
+        self.Z = self.rng.rand(6, self.D)
+        self.Xmu = self.rng.rand(3, self.D)
+        self.Xvar = self.rng.rand(3, self.D) * 0.05 + 0.01
+
+    def kern(self):
+        return ekernels.RBF(self.D, variance=0.8, lengthscales=0.5, ARD=True)
+
+    def models(self):
+        m_sgpr = GPflow.sgpr.SGPR(self.X, self.Y, self.kern(), self.Z)
+        m_sgpr.likelihood.variance = 0.1
+        yield m_sgpr
+        for whiten in [True, False]:
+            for q_diag in [True, False]:
+                m = GPflow.svgp.SVGP(self.X, self.Y, self.kern(), GPflow.likelihoods.Gaussian(), self.Z,
+                                     whiten=whiten, q_diag=q_diag)
+                m.q_mu = self.rng.randn(6, 2)
+                if q_diag:
+                    m.q_sqrt = self.rng.rand(6, 2) * 0.5 + 0.1
+                else:
+                    m.q_sqrt = np.tril(self.rng.randn(2, 6, 6) * 0.2).transpose(1, 2, 0) + \
+                        np.eye(6)[:, :, None] * 0.3
+                yield m
+        m_gplvm = GPflow.gplvm.BayesianGPLVM(self.rng.rand(20, self.D), np.ones((20, self.D)) * 0.01,
+                                             self.Y, self.kern(), 6, Z=self.Z)
+        yield m_gplvm
+
+    def test_certain(self):
+        for m in self.models():
+            mu, var = m.predict_f(self.Xmu)
+            mu_u, var_u = m.predict_f_uncertain(self.Xmu, np.ones_like(self.Xmu) * 1e-10)
+            self.assertTrue(np.allclose(mu, mu_u, atol=1e-6))
+            self.assertTrue(np.allclose(var, var_u, atol=1e-6))
+
+    def test_monte_carlo(self):
+        S = 20000
+        for m in self.models():
+            mu_u, var_u = m.predict_f_uncertain(self.Xmu, self.Xvar)
+            Xcov = np.array([np.diag(v) for v in self.Xvar])
+            mu_full, var_full = m.predict_f_uncertain(self.Xmu, Xcov)
+            self.assertTrue(np.allclose(mu_u, mu_full))
+            self.assertTrue(np.allclose(var_u, var_full))
+            for n in range(len(self.Xmu)):
+                x = self.Xmu[n] + np.sqrt(self.Xvar[n]) * self.rng.randn(S, self.D)
+                mus, variances = m.predict_f(x)
+                mean = np.mean(mus, 0)
+                var = np.mean(variances + np.square(mus), 0) - np.square(mean)
+                self.assertTrue(np.allclose(mu_u[n], mean, atol=2e-2))
+                self.assertTrue(np.allclose(var_u[n], var, atol=2e-2))
+
+    def test_not_implemented(self):
+        m = GPflow.gpr.GPR(self.X, self.Y, self.kern())
+        with self.assertRaises(NotImplementedError):
+            m.predict_f_uncertain(self.Xmu, self.Xvar)
+
+
+if __name__ == "__main__":
+    unittest.main()